@@ -2,10 +2,13 @@ from flask import Flask
 from flask_login import LoginManager
 from config import Config
 from database.init_db import init_database
+from database.escalation import start_escalation_engine
 from routes import (auth_bp, main_bp, spare_parts_bp, equipment_bp, location_bp,
                     work_orders_bp, maintenance_schedules_bp, meter_readings_bp,
                     orders_bp, master_data_bp, vendors_bp, reports_bp,
-                    maintenance_reports_bp, order_reports_bp, get_user_by_id)
+                    maintenance_reports_bp, order_reports_bp, search_bp, sync_bp,
+                    work_order_templates_bp, notifications_bp,
+                    get_user_by_id)
 
 app = Flask(__name__)
 app.config.from_object(Config)
@@ -36,10 +39,17 @@ app.register_blueprint(vendors_bp)
 app.register_blueprint(reports_bp)
 app.register_blueprint(maintenance_reports_bp)
 app.register_blueprint(order_reports_bp)
+app.register_blueprint(search_bp)
+app.register_blueprint(sync_bp)
+app.register_blueprint(work_order_templates_bp)
+app.register_blueprint(notifications_bp)
 
 # Initialize database on startup
 with app.app_context():
     init_database()
 
+# Watch Emergency/High work order due dates and escalate when they pass
+start_escalation_engine(app.config['ESCALATION_LOG_PATH'])
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
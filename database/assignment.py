@@ -0,0 +1,100 @@
+import heapq
+from database.init_db import worklist_status_sql, worklist_due_sql
+
+# Minutes assumed for a work order whose schedule gives no estimated_duration
+DEFAULT_DURATION_MINUTES = 60
+# Only these roles are offered work by the optimizer
+ASSIGNABLE_ROLES = ['technician']
+
+
+def parse_skills(text):
+    """Set of lower-case skill tags from a comma-separated string"""
+    return {skill.strip().lower() for skill in (text or '').split(',') if skill.strip()}
+
+
+def load_assignment_inputs(cursor, crew=''):
+    """Read technicians with their open load and the unassigned open work orders, most urgent first"""
+    duration_sql = f'COALESCE(ms.estimated_duration, {DEFAULT_DURATION_MINUTES})'
+
+    query = f'''
+        SELECT id, username, crew, skills FROM users
+        WHERE role IN ({','.join('?' * len(ASSIGNABLE_ROLES))})
+    '''
+    params = list(ASSIGNABLE_ROLES)
+    if crew:
+        query += ' AND crew = ?'
+        params.append(crew)
+    cursor.execute(query + ' ORDER BY username', params)
+    technicians = [{'user_id': row['id'], 'username': row['username'], 'crew': row['crew'],
+                    'skills': sorted(parse_skills(row['skills'])), 'start_load': 0, 'start_count': 0}
+                   for row in cursor.fetchall()]
+
+    if technicians:
+        by_id = {tech['user_id']: tech for tech in technicians}
+        cursor.execute(f'''
+            SELECT wo.assigned_to, SUM({duration_sql}) as load, COUNT(*) as job_count
+            FROM work_orders wo
+            LEFT JOIN maintenance_schedules ms ON wo.maintenance_schedule_id = ms.id
+            WHERE {worklist_status_sql('wo.')} AND wo.assigned_to IN ({','.join('?' * len(by_id))})
+            GROUP BY wo.assigned_to
+        ''', list(by_id))
+        for row in cursor.fetchall():
+            by_id[row['assigned_to']]['start_load'] = row['load']
+            by_id[row['assigned_to']]['start_count'] = row['job_count']
+
+    cursor.execute(f'''
+        SELECT wo.id, wo.work_order_number, wo.title, wo.priority, wo.due_date, wo.required_skill,
+               e.tag_number as equipment_tag, {duration_sql} as duration
+        FROM work_orders wo
+        LEFT JOIN maintenance_schedules ms ON wo.maintenance_schedule_id = ms.id
+        LEFT JOIN equipment e ON wo.equipment_id = e.id
+        WHERE {worklist_status_sql('wo.')} AND wo.assigned_to IS NULL
+        ORDER BY wo.priority_rank, {worklist_due_sql('wo.')}, wo.id
+    ''')
+    jobs = [dict(row) for row in cursor.fetchall()]
+    return technicians, jobs
+
+
+def propose_assignments(technicians, jobs, capacity=None):
+    """Give each job to the least-loaded technician with its skill, within capacity if given"""
+    state = {tech['user_id']: [tech['start_load'], tech['start_count']] for tech in technicians}
+    heaps = {None: []}
+    for tech in technicians:
+        entry = (tech['start_load'], tech['start_count'], tech['user_id'])
+        heaps[None].append(entry)
+        for skill in tech['skills']:
+            heaps.setdefault(skill, []).append(entry)
+    for heap in heaps.values():
+        heapq.heapify(heap)
+    names = {tech['user_id']: tech['username'] for tech in technicians}
+    skills_of = {tech['user_id']: tech['skills'] for tech in technicians}
+
+    proposals = []
+    unassigned = []
+    for job in jobs:
+        skill = (job['required_skill'] or '').strip().lower() or None
+        heap = heaps.get(skill)
+        # Drop entries that no longer show the technician's current load
+        while heap and list(heap[0][:2]) != state[heap[0][2]]:
+            heapq.heappop(heap)
+        if not heap:
+            reason = f'No technician with skill "{skill}"' if skill else 'No technicians available'
+            unassigned.append(dict(job, reason=reason))
+            continue
+
+        load, count, user_id = heap[0]
+        if capacity is not None and load + job['duration'] > capacity:
+            unassigned.append(dict(job, reason='Every eligible technician is at capacity'))
+            continue
+
+        state[user_id] = [load + job['duration'], count + 1]
+        entry = (load + job['duration'], count + 1, user_id)
+        heapq.heappush(heaps[None], entry)
+        for tech_skill in skills_of[user_id]:
+            heapq.heappush(heaps[tech_skill], entry)
+        proposals.append(dict(job, user_id=user_id, username=names[user_id]))
+
+    summary = [dict(tech, load=state[tech['user_id']][0],
+                    assigned_count=state[tech['user_id']][1] - tech['start_count'])
+               for tech in technicians]
+    return proposals, unassigned, summary
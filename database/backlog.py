@@ -0,0 +1,112 @@
+from models.work_order import WorkOrder
+
+# Risk score of an open work order is a weighted sum of
+#   priority weight + age in days + days past due + equipment history,
+# where history is the equipment's other work orders and its net parts cost.
+# Overdue days weigh most: a late job is the clearest sign of backlog risk.
+PRIORITY_WEIGHTS = {'Emergency': 100, 'High': 60, 'Medium': 30, 'Low': 10}
+AGE_WEIGHT = 0.5
+OVERDUE_WEIGHT = 2.0
+HISTORY_WEIGHT = 1.5
+COST_WEIGHT = 1.0
+# History covers the last HISTORY_DAYS; work order counts and parts cost (per
+# COST_UNIT spent) are capped so one troublesome asset cannot dominate the ranking
+HISTORY_DAYS = 365
+HISTORY_CAP = 20
+COST_UNIT = 100.0
+COST_CAP = 50.0
+
+# Histogram buckets as (label, lowest day, highest day or None for open-ended)
+AGE_BUCKETS = [('0-7 days', 0, 7), ('8-30 days', 8, 30), ('31-90 days', 31, 90),
+               ('91-180 days', 91, 180), ('Over 180 days', 181, None)]
+OVERDUE_BUCKETS = [('1-7 days', 1, 7), ('8-30 days', 8, 30), ('31-90 days', 31, 90),
+                   ('Over 90 days', 91, None)]
+
+
+def backlog_score_sql():
+    """SQL expression scoring one row of the ranking query (columns from rank_backlog)"""
+    priority_case = ' '.join(f"WHEN '{priority}' THEN {weight}" for priority, weight in PRIORITY_WEIGHTS.items())
+    return f'''
+        (CASE wo.priority {priority_case} ELSE 0 END)
+        + {AGE_WEIGHT} * age_days
+        + {OVERDUE_WEIGHT} * MAX(COALESCE(days_overdue, 0), 0)
+        + {HISTORY_WEIGHT} * MIN(prior_work_orders, {HISTORY_CAP})
+        + {COST_WEIGHT} * MIN(parts_cost / {COST_UNIT}, {COST_CAP})
+    '''
+
+
+def rank_backlog(cursor):
+    """Score and rank every open work order in one query, highest risk first"""
+    statuses = WorkOrder.ACTIVE_STATUSES
+    window = f'-{HISTORY_DAYS} days'
+    placeholders = ','.join('?' * len(statuses))
+    cursor.execute(f'''
+        WITH history AS (
+            SELECT equipment_id, COUNT(*) as work_order_count
+            FROM work_orders
+            WHERE equipment_id IS NOT NULL AND created_at >= datetime('now', ?)
+            GROUP BY equipment_id
+        ),
+        costs AS (
+            SELECT h.equipment_id,
+                   SUM(CASE WHEN wop.transaction_type = 'return' THEN -1 ELSE 1 END
+                       * wop.quantity * COALESCE(wop.cost_per_unit, 0)) as parts_cost
+            FROM work_order_parts wop
+            JOIN work_orders h ON wop.work_order_id = h.id
+            WHERE h.equipment_id IS NOT NULL AND wop.transacted_at >= datetime('now', ?)
+            GROUP BY h.equipment_id
+        ),
+        open_orders AS (
+            SELECT wo.*,
+                   CAST(julianday('now') - julianday(wo.created_at) AS INTEGER) as age_days,
+                   CASE WHEN wo.due_date IS NULL THEN NULL
+                        ELSE CAST(julianday(date('now', 'localtime')) - julianday(wo.due_date) AS INTEGER)
+                   END as days_overdue,
+                   -- the work order itself is not part of its own history
+                   MAX(COALESCE(history.work_order_count, 0) - (wo.created_at >= datetime('now', ?)), 0)
+                       as prior_work_orders,
+                   MAX(COALESCE(costs.parts_cost, 0), 0) as parts_cost
+            FROM work_orders wo
+            LEFT JOIN history ON history.equipment_id = wo.equipment_id
+            LEFT JOIN costs ON costs.equipment_id = wo.equipment_id
+            WHERE wo.status IN ({placeholders})
+        )
+        SELECT wo.id, wo.work_order_number, wo.title, wo.priority, wo.status, wo.due_date,
+               wo.created_at, wo.equipment_id, wo.age_days, wo.days_overdue,
+               wo.prior_work_orders, wo.parts_cost,
+               e.tag_number as equipment_tag, u.username as assigned_to_name,
+               ROUND({backlog_score_sql()}, 1) as score
+        FROM open_orders wo
+        LEFT JOIN equipment e ON wo.equipment_id = e.id
+        LEFT JOIN users u ON wo.assigned_to = u.id
+        ORDER BY score DESC, wo.id
+    ''', [window, window, window] + statuses)
+    return [dict(row) for row in cursor.fetchall()]
+
+
+def bucket_counts(values, buckets):
+    """Count values into (label, low, high) buckets; values outside every bucket are ignored"""
+    counts = {label: 0 for label, _, _ in buckets}
+    for value in values:
+        for label, low, high in buckets:
+            if value >= low and (high is None or value <= high):
+                counts[label] += 1
+                break
+    return [{'label': label, 'count': counts[label]} for label, _, _ in buckets]
+
+
+def build_backlog(cursor):
+    """Ranked backlog plus aging histograms, as cached by the backlog view"""
+    items = rank_backlog(cursor)
+    for rank, item in enumerate(items, 1):
+        item['rank'] = rank
+    overdue = [item['days_overdue'] for item in items
+               if item['days_overdue'] is not None and item['days_overdue'] > 0]
+    return {
+        'items': items,
+        'total': len(items),
+        'overdue_count': len(overdue),
+        'no_due_date_count': sum(1 for item in items if item['due_date'] is None),
+        'age_histogram': bucket_counts((item['age_days'] or 0 for item in items), AGE_BUCKETS),
+        'overdue_histogram': bucket_counts(overdue, OVERDUE_BUCKETS),
+    }
@@ -0,0 +1,41 @@
+import threading
+import time
+from database.init_db import get_connection, get_data_versions
+
+# Per-process cache: key -> (data versions of the source tables, cached value, load time)
+_cache = {}
+CACHE_MAX_ENTRIES = 256
+_cache_lock = threading.Lock()
+
+
+def cached_query(key, tables, loader, max_age=None):
+    """Return loader(cursor), reusing this process's cached result while it is current"""
+    # Entries are checked against the data_versions of their tables, which any
+    # worker's write bumps; with max_age they are served until that age instead
+    entry = _cache.get(key)
+    if max_age is not None and entry and time.monotonic() - entry[2] < max_age:
+        return entry[1]
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        versions = get_data_versions(cursor, tables)
+        if max_age is None and entry and entry[0] == versions:
+            return entry[1]
+
+        value = loader(cursor)
+    finally:
+        conn.close()
+
+    # Requests run on several threads; evict and insert as one step
+    with _cache_lock:
+        if key not in _cache and len(_cache) >= CACHE_MAX_ENTRIES:
+            _cache.pop(next(iter(_cache)), None)
+        _cache[key] = (versions, value, time.monotonic())
+    return value
+
+
+def clear_cache():
+    """Drop every cached entry in this process"""
+    with _cache_lock:
+        _cache.clear()
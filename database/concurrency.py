@@ -0,0 +1,43 @@
+import json
+from database.init_db import ROW_VERSION_COLUMNS
+
+
+def editable_values(table, record):
+    """Values of the row-versioned columns of a model object, as sent with an edit form"""
+    return {column: getattr(record, column, None) for column in ROW_VERSION_COLUMNS[table]}
+
+
+def parse_original_values(raw):
+    """Decode the original_values an edit form or API client read; {} when missing or invalid"""
+    if isinstance(raw, dict):
+        return raw
+    try:
+        values = json.loads(raw or '{}')
+    except (TypeError, ValueError):
+        return {}
+    return values if isinstance(values, dict) else {}
+
+
+def _same(first, second):
+    """Compare a stored value with one that went through a form or JSON"""
+    first = '' if first is None else str(first)
+    second = '' if second is None else str(second)
+    return first == second
+
+
+def changed_fields(cursor, table, row_id, original):
+    """Re-read a row after a failed conditional update; returns (row or None, changed columns)"""
+    columns = ROW_VERSION_COLUMNS[table]
+    cursor.execute(f'SELECT id, row_version, {", ".join(columns)} FROM {table} WHERE id = ?', (row_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return None, []
+    return row, [column for column in columns if column in original and not _same(row[column], original[column])]
+
+
+def conflict_message(label, fields):
+    """Flash message for an edit that lost a race with another editor"""
+    names = ', '.join(field.replace('_', ' ') for field in fields)
+    changed = f' Changed: {names}.' if fields else ''
+    return (f'{label} was changed by someone else while you were editing.{changed} '
+            f'The form now shows the latest values; please re-apply your changes and save again.')
@@ -0,0 +1,224 @@
+import heapq
+import logging
+import threading
+from datetime import datetime, timedelta
+from database.init_db import get_connection
+from models.work_order import WorkOrder
+
+# Priorities whose due dates are watched, in the order passed deadlines are fired
+ESCALATION_PRIORITIES = ['Emergency', 'High']
+# Roles told about every escalation, in addition to the assignee
+ESCALATION_ROLES = ['admin', 'supervisor']
+# Longest sleep between reads of the work order change feed; create and change
+# routes wake the engine straight away, this catches every other write path
+FEED_INTERVAL_SECONDS = 30
+
+logger = logging.getLogger('escalations')
+
+
+def due_deadline(due_date):
+    """Moment a due date has passed (midnight at the end of that day), or None if unparseable"""
+    try:
+        return datetime.strptime(due_date, '%Y-%m-%d') + timedelta(days=1)
+    except (TypeError, ValueError):
+        return None
+
+
+class EscalationEngine:
+    """Escalates open Emergency and High work orders that pass their due date"""
+
+    def __init__(self):
+        self.heaps = {priority: [] for priority in ESCALATION_PRIORITIES}
+        self.watched = {}  # work order id -> (priority, due_date)
+        self.feed_version = 0
+        self.lock = threading.Lock()
+        self.wake_event = threading.Event()
+        self.thread = None
+
+    def watch(self, wo_id, priority, status, due_date):
+        """Start, update or stop watching one work order after it changed"""
+        deadline = due_deadline(due_date)
+        if priority in self.heaps and status in WorkOrder.ACTIVE_STATUSES and deadline is not None:
+            if self.watched.get(wo_id) != (priority, due_date):
+                self.watched[wo_id] = (priority, due_date)
+                heapq.heappush(self.heaps[priority], (deadline, wo_id, due_date))
+        else:
+            self.watched.pop(wo_id, None)
+
+    def rebuild(self, cursor):
+        """Load every open watched work order that has not been escalated for its due date"""
+        self.heaps = {priority: [] for priority in ESCALATION_PRIORITIES}
+        self.watched = {}
+        cursor.execute('BEGIN')
+        try:
+            cursor.execute("SELECT version FROM data_versions WHERE table_name = 'sync'")
+            self.feed_version = cursor.fetchone()['version']
+            statuses = WorkOrder.ACTIVE_STATUSES
+            cursor.execute(f'''
+                SELECT wo.id, wo.priority, wo.status, wo.due_date FROM work_orders wo
+                WHERE wo.status IN ({','.join('?' * len(statuses))})
+                  AND wo.priority IN ({','.join('?' * len(ESCALATION_PRIORITIES))})
+                  AND wo.due_date IS NOT NULL
+                  AND NOT EXISTS (SELECT 1 FROM escalations es
+                                  WHERE es.work_order_id = wo.id AND es.due_date = wo.due_date)
+            ''', statuses + ESCALATION_PRIORITIES)
+            for row in cursor.fetchall():
+                self.watch(row['id'], row['priority'], row['status'], row['due_date'])
+        finally:
+            cursor.execute('ROLLBACK')
+
+    def read_feed(self, cursor):
+        """Apply work orders created, changed or deleted since the last read"""
+        cursor.execute('BEGIN')
+        try:
+            cursor.execute("SELECT version FROM data_versions WHERE table_name = 'sync'")
+            version = cursor.fetchone()['version']
+            if version == self.feed_version:
+                return
+            cursor.execute('''
+                SELECT id, priority, status, due_date FROM work_orders
+                WHERE change_version > ? AND change_version <= ?
+            ''', (self.feed_version, version))
+            changed = cursor.fetchall()
+            cursor.execute('''
+                SELECT row_id FROM sync_deletions
+                WHERE table_name = 'work_orders' AND change_version > ? AND change_version <= ?
+            ''', (self.feed_version, version))
+            deleted = cursor.fetchall()
+        finally:
+            cursor.execute('ROLLBACK')
+
+        for row in changed:
+            self.watch(row['id'], row['priority'], row['status'], row['due_date'])
+        for row in deleted:
+            self.watched.pop(row['row_id'], None)
+        self.feed_version = version
+
+    def next_deadline(self):
+        """Earliest deadline still watched, discarding stale heap entries on the way"""
+        earliest = None
+        for priority, heap in self.heaps.items():
+            while heap and self.watched.get(heap[0][1]) != (priority, heap[0][2]):
+                heapq.heappop(heap)
+            if heap and (earliest is None or heap[0][0] < earliest):
+                earliest = heap[0][0]
+        return earliest
+
+    def fire_due(self, cursor, now):
+        """Escalate every watched work order whose deadline is at or before now. Returns the count"""
+        fired = 0
+        for priority in ESCALATION_PRIORITIES:
+            heap = self.heaps[priority]
+            while heap and heap[0][0] <= now:
+                deadline, wo_id, due_date = heapq.heappop(heap)
+                if self.watched.get(wo_id) != (priority, due_date):
+                    continue
+                del self.watched[wo_id]
+                try:
+                    if self.escalate(cursor, wo_id, priority, due_date):
+                        fired += 1
+                except Exception:
+                    # Keep watching so the next run retries it
+                    self.watched[wo_id] = (priority, due_date)
+                    heapq.heappush(heap, (deadline, wo_id, due_date))
+                    raise
+        return fired
+
+    def escalate(self, cursor, wo_id, priority, due_date):
+        """Record one escalation and notify the assignee and supervisors; returns True if recorded"""
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            cursor.execute('''
+                SELECT work_order_number, title, status, priority, due_date, assigned_to
+                FROM work_orders WHERE id = ?
+            ''', (wo_id,))
+            wo = cursor.fetchone()
+            if (wo is None or wo['status'] not in WorkOrder.ACTIVE_STATUSES
+                    or wo['priority'] != priority or wo['due_date'] != due_date):
+                cursor.execute('ROLLBACK')
+                return False
+
+            cursor.execute('''
+                INSERT OR IGNORE INTO escalations (work_order_id, priority, due_date)
+                VALUES (?, ?, ?)
+            ''', (wo_id, priority, due_date))
+            if cursor.rowcount == 0:
+                cursor.execute('ROLLBACK')
+                return False
+
+            cursor.execute(f'''
+                SELECT id FROM users WHERE role IN ({','.join('?' * len(ESCALATION_ROLES))})
+            ''', ESCALATION_ROLES)
+            recipients = {row['id'] for row in cursor.fetchall()}
+            if wo['assigned_to']:
+                recipients.add(wo['assigned_to'])
+
+            message = (f'{priority} work order {wo["work_order_number"]} "{wo["title"]}" '
+                       f'is past its due date ({due_date}) and still {wo["status"]}.')
+            cursor.executemany('''
+                INSERT INTO notifications (user_id, work_order_id, message) VALUES (?, ?, ?)
+            ''', [(user_id, wo_id, message) for user_id in sorted(recipients)])
+            cursor.execute('COMMIT')
+        except Exception:
+            cursor.execute('ROLLBACK')
+            raise
+
+        logger.warning('%s (notified %d user(s))', message, len(recipients))
+        return True
+
+    def run_once(self, now=None):
+        """Read the change feed, fire passed deadlines and return the next deadline"""
+        with self.lock:
+            conn = get_connection()
+            conn.isolation_level = None
+            cursor = conn.cursor()
+            try:
+                self.read_feed(cursor)
+                self.fire_due(cursor, now or datetime.now())
+                return self.next_deadline()
+            finally:
+                conn.close()
+
+    def wake(self):
+        """Ask the engine to read the change feed now (called after work order writes)"""
+        self.wake_event.set()
+
+    def run(self):
+        """Engine thread: sleep until the next deadline or a wake-up, whichever is first"""
+        while True:
+            try:
+                next_deadline = self.run_once()
+            except Exception:
+                logger.exception('Escalation run failed')
+                next_deadline = None
+            timeout = FEED_INTERVAL_SECONDS
+            if next_deadline is not None:
+                timeout = min(timeout, max((next_deadline - datetime.now()).total_seconds(), 0))
+            self.wake_event.wait(timeout)
+            self.wake_event.clear()
+
+    def start(self):
+        """Rebuild the heaps from the database and start the engine thread"""
+        conn = get_connection()
+        conn.isolation_level = None
+        try:
+            with self.lock:
+                self.rebuild(conn.cursor())
+        finally:
+            conn.close()
+        self.thread = threading.Thread(target=self.run, name='escalation-engine', daemon=True)
+        self.thread.start()
+
+
+escalation_engine = EscalationEngine()
+
+
+def start_escalation_engine(log_path):
+    """Log escalations to log_path and start the engine for this process"""
+    if not logger.handlers:
+        handler = logging.FileHandler(log_path)
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+    if escalation_engine.thread is None:
+        escalation_engine.start()
@@ -2,6 +2,7 @@ import sqlite3
 import os
 from werkzeug.security import generate_password_hash
 from datetime import datetime
+from models.work_order import WorkOrder
 
 def get_db_path():
     return os.path.join(os.path.dirname(os.path.abspath(__file__)), 'plant_maintenance.db')
@@ -22,6 +23,18 @@ def init_database():
         )
     ''')
 
+    # Crew (team) name; technicians in the same crew share a crew worklist
+    try:
+        cursor.execute('ALTER TABLE users ADD COLUMN crew TEXT')
+    except:
+        pass  # Column already exists
+
+    # Comma-separated skill tags (e.g. "electrical, hydraulics") used by the assignment optimizer
+    try:
+        cursor.execute('ALTER TABLE users ADD COLUMN skills TEXT')
+    except:
+        pass  # Column already exists
+
     # Create spare_parts table
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS spare_parts (
@@ -122,6 +135,51 @@ def init_database():
     except:
         pass  # Column already exists
 
+    # Add stored sort ranks used to order the work order report
+    try:
+        cursor.execute('ALTER TABLE work_orders ADD COLUMN status_rank INTEGER')
+    except:
+        pass  # Column already exists
+    try:
+        cursor.execute('ALTER TABLE work_orders ADD COLUMN priority_rank INTEGER')
+    except:
+        pass  # Column already exists
+
+    # Keep the ranks in step with status/priority on every write path
+    for statement in work_order_rank_trigger_sql():
+        cursor.execute(statement)
+    cursor.execute(f'''
+        UPDATE work_orders
+        SET status_rank = {rank_case_sql('status', WorkOrder.STATUS_RANKS)},
+            priority_rank = {rank_case_sql('priority', WorkOrder.PRIORITY_RANKS)},
+            created_at = COALESCE(created_at, CURRENT_TIMESTAMP)
+        WHERE status_rank IS NOT {rank_case_sql('status', WorkOrder.STATUS_RANKS)}
+           OR priority_rank IS NOT {rank_case_sql('priority', WorkOrder.PRIORITY_RANKS)}
+           OR created_at IS NULL
+    ''')
+
+    # Index matching the report order exactly, so pages are read in index order
+    # with no sort step. It does not cover the report's columns, so rows are
+    # fetched by rowid; with only a status filter that is one page of lookups
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_work_orders_report_order
+        ON work_orders (status_rank, priority_rank, created_at DESC, id DESC)
+    ''')
+
+    # Skill a technician needs for the work order (matched against users.skills)
+    try:
+        cursor.execute('ALTER TABLE work_orders ADD COLUMN required_skill TEXT')
+    except:
+        pass  # Column already exists
+
+    # Partial index for technician worklists: only open work orders are indexed,
+    # keyed by assignee and then in worklist order (priority, due date)
+    cursor.execute(f'''
+        CREATE INDEX IF NOT EXISTS idx_work_orders_worklist
+        ON work_orders (assigned_to, priority_rank, {worklist_due_sql()}, id)
+        WHERE {worklist_status_sql()}
+    ''')
+
     # Create work_order_parts table for tracking spare parts issued to work orders
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS work_order_parts (
@@ -145,6 +203,37 @@ def init_database():
     except:
         pass  # Column already exists
 
+    # Index for per-work-order part lookups (rollup triggers, issued parts, returns)
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_work_order_parts_work_order
+        ON work_order_parts (work_order_id, spare_part_id, transaction_type)
+    ''')
+
+    # Add parts cost rollup columns to work_orders (kept in step by triggers on work_order_parts)
+    rollup_added = False
+    try:
+        cursor.execute('ALTER TABLE work_orders ADD COLUMN total_parts_cost REAL DEFAULT 0')
+        rollup_added = True
+    except:
+        pass  # Column already exists
+    try:
+        cursor.execute('ALTER TABLE work_orders ADD COLUMN parts_count INTEGER DEFAULT 0')
+        rollup_added = True
+    except:
+        pass  # Column already exists
+    try:
+        cursor.execute('ALTER TABLE work_orders ADD COLUMN parts_quantity INTEGER DEFAULT 0')
+        rollup_added = True
+    except:
+        pass  # Column already exists
+
+    for statement in parts_rollup_trigger_sql():
+        cursor.execute(statement)
+
+    # Backfill the rollup from history when the columns are first added
+    if rollup_added:
+        verify_parts_rollup(cursor, repair=True)
+
     # Create maintenance_schedules table
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS maintenance_schedules (
@@ -193,6 +282,12 @@ def init_database():
         )
     ''')
 
+    # Index for "latest reading per equipment" lookups
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_meter_readings_equipment
+        ON meter_readings (equipment_id, recorded_at)
+    ''')
+
     # Create vendors table
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS vendors (
@@ -299,6 +394,203 @@ def init_database():
     except:
         pass  # Column already exists
 
+    # Create PM compliance rollup table (per schedule, equipment and due month)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS pm_compliance_monthly (
+            maintenance_schedule_id INTEGER NOT NULL,
+            equipment_id INTEGER NOT NULL DEFAULT 0,
+            period TEXT NOT NULL,
+            generated INTEGER NOT NULL DEFAULT 0,
+            completed_on_time INTEGER NOT NULL DEFAULT 0,
+            completed_late INTEGER NOT NULL DEFAULT 0,
+            still_open INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (maintenance_schedule_id, equipment_id, period),
+            FOREIGN KEY (maintenance_schedule_id) REFERENCES maintenance_schedules (id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_pm_compliance_period
+        ON pm_compliance_monthly (period)
+    ''')
+
+    # Keep the rollup in step with every work order write path
+    for statement in pm_compliance_trigger_sql():
+        cursor.execute(statement)
+
+    # Backfill the rollup from history the first time it is created
+    cursor.execute('SELECT COUNT(*) FROM pm_compliance_monthly')
+    if cursor.fetchone()[0] == 0:
+        rebuild_pm_compliance(cursor)
+
+    # Create data version table (bumped by triggers on every write to a tracked table)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS data_versions (
+            table_name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    for table in VERSIONED_TABLES:
+        cursor.execute('INSERT OR IGNORE INTO data_versions (table_name, version) VALUES (?, 0)', (table,))
+        for statement in data_version_trigger_sql(table):
+            cursor.execute(statement)
+
+    # Per-row change versions for offline device sync. One clock (the 'sync' row
+    # of data_versions) is bumped on every write to a synced table, and the row is
+    # stamped with the new value; deletes leave a tombstone carrying the version.
+    cursor.execute("INSERT OR IGNORE INTO data_versions (table_name, version) VALUES ('sync', 0)")
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sync_deletions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            change_version INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_sync_deletions_version
+        ON sync_deletions (change_version)
+    ''')
+    for table in SYNC_TABLES:
+        try:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN change_version INTEGER')
+        except:
+            pass  # Column already exists
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_change_version ON {table} (change_version)')
+        # Rows written before versioning existed (or stamped by the earlier
+        # backfill, which gave a whole table one shared version) each get their
+        # own version above the clock, since sync pages resume on change_version
+        unstamped = f'''
+            change_version IS NULL OR change_version IN (
+                SELECT change_version FROM {table} GROUP BY change_version HAVING COUNT(*) > 1)
+        '''
+        cursor.execute(f'SELECT MAX(id) FROM {table} WHERE {unstamped}')
+        max_id = cursor.fetchone()[0]
+        if max_id is not None:
+            cursor.execute(f'''
+                UPDATE {table}
+                SET change_version = (SELECT version FROM data_versions WHERE table_name = 'sync') + id
+                WHERE {unstamped}
+            ''')
+            cursor.execute("UPDATE data_versions SET version = version + ? WHERE table_name = 'sync'", (max_id,))
+        for statement in sync_trigger_sql(table):
+            cursor.execute(statement)
+
+    # MinHash signatures of work order title/description for the similar work
+    # orders lookup; text_hash (checksum of the signed text) tells when one is stale
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS work_order_signatures (
+            work_order_id INTEGER PRIMARY KEY,
+            text_hash INTEGER,
+            signature BLOB NOT NULL,
+            FOREIGN KEY (work_order_id) REFERENCES work_orders (id)
+        )
+    ''')
+    try:
+        cursor.execute('ALTER TABLE work_order_signatures ADD COLUMN text_hash INTEGER')
+    except:
+        pass  # Column already exists
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_work_orders_equipment
+        ON work_orders (equipment_id)
+    ''')
+
+    # Row versions for optimistic concurrency on edit forms: bumped by trigger
+    # whenever a column the edit form writes is changed, by any write path
+    for table, columns in ROW_VERSION_COLUMNS.items():
+        try:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN row_version INTEGER NOT NULL DEFAULT 1')
+        except:
+            pass  # Column already exists
+        for statement in row_version_trigger_sql(table, columns):
+            cursor.execute(statement)
+    # Receipts and reversals change a PO through its lines
+    for statement in po_line_row_version_trigger_sql():
+        cursor.execute(statement)
+
+    # Offline uploads already applied, keyed by the device's client_id, so a
+    # re-sent batch returns the original result instead of posting twice
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sync_uploads (
+            client_id TEXT PRIMARY KEY,
+            upload_type TEXT NOT NULL,
+            result TEXT NOT NULL,
+            uploaded_by INTEGER,
+            uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (uploaded_by) REFERENCES users (id)
+        )
+    ''')
+
+    # Reusable work order templates with a default parts list, instantiated in
+    # bulk across equipment
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS work_order_templates (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL,
+            title TEXT NOT NULL,
+            description TEXT,
+            priority TEXT DEFAULT 'Medium',
+            assigned_to INTEGER,
+            due_in_days INTEGER,
+            created_by INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (assigned_to) REFERENCES users (id),
+            FOREIGN KEY (created_by) REFERENCES users (id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS work_order_template_parts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            template_id INTEGER NOT NULL,
+            spare_part_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL,
+            FOREIGN KEY (template_id) REFERENCES work_order_templates (id),
+            FOREIGN KEY (spare_part_id) REFERENCES spare_parts (id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_work_order_template_parts_template
+        ON work_order_template_parts (template_id)
+    ''')
+
+    # SLA escalations fired when an open work order passes its due date; the
+    # unique key makes each (work order, due date) escalate once across workers
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS escalations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            work_order_id INTEGER NOT NULL,
+            priority TEXT NOT NULL,
+            due_date TEXT NOT NULL,
+            escalated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (work_order_id, due_date),
+            FOREIGN KEY (work_order_id) REFERENCES work_orders (id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS notifications (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            work_order_id INTEGER,
+            message TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            read_at TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            FOREIGN KEY (work_order_id) REFERENCES work_orders (id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_notifications_user
+        ON notifications (user_id, read_at)
+    ''')
+
+    # Create trigram typeahead indexes (skipped when this SQLite lacks the FTS5 trigram tokenizer)
+    for index_name, (table, columns) in TYPEAHEAD_INDEXES.items():
+        create_fts_index(cursor, index_name, table, columns, "tokenize='trigram'")
+
+    # Create global search indexes (word tokens with prefix indexes for the omnibox)
+    for index_name, (table, columns) in SEARCH_INDEXES.items():
+        create_fts_index(cursor, index_name, table, columns,
+                         "tokenize='unicode61 remove_diacritics 2', prefix='2 3'")
+
     # Check if admin user exists, if not create default admin
     cursor.execute('SELECT id FROM users WHERE username = ?', ('Admin',))
     if cursor.fetchone() is None:
@@ -324,6 +616,451 @@ def init_database():
     conn.close()
     print(f'Database initialized at: {db_path}')
 
+def _pm_compliance_terms(ref):
+    """SQL expressions for the rollup key and counters of a work order row (NEW or OLD)"""
+    return {
+        'period': f"COALESCE(substr({ref}.due_date, 1, 7), substr({ref}.created_at, 1, 7), strftime('%Y-%m', 'now'))",
+        'equipment': f"COALESCE({ref}.equipment_id, 0)",
+        'on_time': f"COALESCE({ref}.status = 'Completed' AND ({ref}.due_date IS NULL OR "
+                   f"date(COALESCE({ref}.completed_at, {ref}.created_at)) <= {ref}.due_date), 0)",
+        'late': f"COALESCE({ref}.status = 'Completed' AND "
+                f"date(COALESCE({ref}.completed_at, {ref}.created_at)) > {ref}.due_date, 0)",
+        'open': f"({ref}.status IN ('Open', 'In Progress', 'On Hold'))",
+    }
+
+
+def pm_compliance_trigger_sql():
+    """Statements that (re)create the triggers maintaining pm_compliance_monthly incrementally"""
+    new = _pm_compliance_terms('NEW')
+    old = _pm_compliance_terms('OLD')
+
+    add_new = f'''
+            INSERT INTO pm_compliance_monthly (maintenance_schedule_id, equipment_id, period,
+                                               generated, completed_on_time, completed_late, still_open)
+            SELECT NEW.maintenance_schedule_id, {new['equipment']}, {new['period']},
+                   1, {new['on_time']}, {new['late']}, {new['open']}
+            WHERE NEW.maintenance_schedule_id IS NOT NULL
+            ON CONFLICT (maintenance_schedule_id, equipment_id, period) DO UPDATE SET
+                generated = generated + 1,
+                completed_on_time = completed_on_time + excluded.completed_on_time,
+                completed_late = completed_late + excluded.completed_late,
+                still_open = still_open + excluded.still_open;
+    '''
+    remove_old = f'''
+            UPDATE pm_compliance_monthly
+            SET generated = generated - 1,
+                completed_on_time = completed_on_time - {old['on_time']},
+                completed_late = completed_late - {old['late']},
+                still_open = still_open - {old['open']}
+            WHERE maintenance_schedule_id = OLD.maintenance_schedule_id
+            AND equipment_id = {old['equipment']}
+            AND period = {old['period']};
+    '''
+
+    # Dropped first so changes to the definitions are picked up on startup
+    return [
+        'DROP TRIGGER IF EXISTS trg_pm_compliance_insert',
+        'DROP TRIGGER IF EXISTS trg_pm_compliance_update',
+        'DROP TRIGGER IF EXISTS trg_pm_compliance_delete',
+        f'''
+        CREATE TRIGGER trg_pm_compliance_insert
+        AFTER INSERT ON work_orders
+        WHEN NEW.maintenance_schedule_id IS NOT NULL
+        BEGIN
+            {add_new}
+        END
+        ''',
+        f'''
+        CREATE TRIGGER trg_pm_compliance_update
+        AFTER UPDATE OF status, completed_at, due_date, equipment_id, maintenance_schedule_id ON work_orders
+        WHEN OLD.maintenance_schedule_id IS NOT NULL OR NEW.maintenance_schedule_id IS NOT NULL
+        BEGIN
+            {remove_old}
+            {add_new}
+        END
+        ''',
+        f'''
+        CREATE TRIGGER trg_pm_compliance_delete
+        AFTER DELETE ON work_orders
+        WHEN OLD.maintenance_schedule_id IS NOT NULL
+        BEGIN
+            {remove_old}
+        END
+        ''',
+    ]
+
+
+def rebuild_pm_compliance(cursor):
+    """Recompute pm_compliance_monthly from the full work order history"""
+    terms = _pm_compliance_terms('wo')
+    cursor.execute('DELETE FROM pm_compliance_monthly')
+    cursor.execute(f'''
+        INSERT INTO pm_compliance_monthly (maintenance_schedule_id, equipment_id, period,
+                                           generated, completed_on_time, completed_late, still_open)
+        SELECT wo.maintenance_schedule_id, {terms['equipment']}, {terms['period']},
+               COUNT(*), SUM({terms['on_time']}), SUM({terms['late']}), SUM({terms['open']})
+        FROM work_orders wo
+        WHERE wo.maintenance_schedule_id IS NOT NULL
+        GROUP BY 1, 2, 3
+    ''')
+
+
+def _parts_rollup_terms(ref):
+    """SQL terms for one work_order_parts row's contribution to its work order's rollup"""
+    sign = f"(CASE WHEN {ref}.transaction_type = 'issue' THEN 1 ELSE -1 END)"
+    return {
+        'cost': f'{sign} * {ref}.quantity * COALESCE({ref}.cost_per_unit, 0)',
+        'quantity': f'{sign} * {ref}.quantity',
+        # 1 when this is the only issue of its part on the work order (distinct parts issued)
+        'first_issue': f'''({ref}.transaction_type = 'issue' AND NOT EXISTS (
+                SELECT 1 FROM work_order_parts other
+                WHERE other.work_order_id = {ref}.work_order_id
+                AND other.spare_part_id = {ref}.spare_part_id
+                AND other.transaction_type = 'issue'
+                AND other.id <> {ref}.id))'''
+    }
+
+
+def parts_rollup_trigger_sql():
+    """Statements that (re)create the triggers maintaining work_orders.total_parts_cost/parts_count/parts_quantity"""
+    new = _parts_rollup_terms('NEW')
+    old = _parts_rollup_terms('OLD')
+
+    # Costs are rounded so issues and returns that cancel out leave exactly zero
+    add_new = f'''
+            UPDATE work_orders
+            SET total_parts_cost = ROUND(COALESCE(total_parts_cost, 0) + {new['cost']}, 6),
+                parts_quantity = COALESCE(parts_quantity, 0) + {new['quantity']},
+                parts_count = COALESCE(parts_count, 0) + {new['first_issue']}
+            WHERE id = NEW.work_order_id;
+    '''
+    remove_old = f'''
+            UPDATE work_orders
+            SET total_parts_cost = ROUND(COALESCE(total_parts_cost, 0) - {old['cost']}, 6),
+                parts_quantity = COALESCE(parts_quantity, 0) - {old['quantity']},
+                parts_count = COALESCE(parts_count, 0) - {old['first_issue']}
+            WHERE id = OLD.work_order_id;
+    '''
+    return [
+        'DROP TRIGGER IF EXISTS trg_parts_rollup_insert',
+        'DROP TRIGGER IF EXISTS trg_parts_rollup_update',
+        'DROP TRIGGER IF EXISTS trg_parts_rollup_delete',
+        f'''
+        CREATE TRIGGER trg_parts_rollup_insert
+        AFTER INSERT ON work_order_parts
+        BEGIN
+            {add_new}
+        END
+        ''',
+        f'''
+        CREATE TRIGGER trg_parts_rollup_update
+        AFTER UPDATE ON work_order_parts
+        BEGIN
+            {remove_old}
+            {add_new}
+        END
+        ''',
+        f'''
+        CREATE TRIGGER trg_parts_rollup_delete
+        AFTER DELETE ON work_order_parts
+        BEGIN
+            {remove_old}
+        END
+        ''',
+    ]
+
+
+def verify_parts_rollup(cursor, repair=False):
+    """Mismatches between stored parts rollups and work_order_parts, corrected with repair=True"""
+    cursor.execute('''
+        SELECT wo.id, wo.work_order_number,
+               wo.total_parts_cost as stored_cost, wo.parts_count as stored_count,
+               wo.parts_quantity as stored_quantity,
+               actual.cost as actual_cost, actual.count as actual_count, actual.quantity as actual_quantity
+        FROM work_orders wo
+        JOIN (
+            SELECT w.id,
+                   ROUND(COALESCE(SUM(CASE WHEN wop.transaction_type = 'issue' THEN wop.quantity * wop.cost_per_unit
+                                           ELSE -wop.quantity * wop.cost_per_unit END), 0), 6) as cost,
+                   COUNT(DISTINCT CASE WHEN wop.transaction_type = 'issue' THEN wop.spare_part_id END) as count,
+                   COALESCE(SUM(CASE WHEN wop.transaction_type = 'issue' THEN wop.quantity
+                                     ELSE -wop.quantity END), 0) as quantity
+            FROM work_orders w
+            LEFT JOIN work_order_parts wop ON w.id = wop.work_order_id
+            GROUP BY w.id
+        ) actual ON actual.id = wo.id
+        WHERE wo.total_parts_cost IS NULL OR ABS(wo.total_parts_cost - actual.cost) > 0.0001
+           OR wo.parts_count IS NOT actual.count
+           OR wo.parts_quantity IS NOT actual.quantity
+        ORDER BY wo.work_order_number
+    ''')
+    columns = [description[0] for description in cursor.description]
+    mismatches = [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    if repair and mismatches:
+        cursor.executemany('''
+            UPDATE work_orders SET total_parts_cost = ?, parts_count = ?, parts_quantity = ?
+            WHERE id = ?
+        ''', [(m['actual_cost'], m['actual_count'], m['actual_quantity'], m['id']) for m in mismatches])
+
+    return mismatches
+
+
+def rank_case_sql(column, ranks):
+    """SQL CASE expression mapping a text column to its sort rank"""
+    whens = ' '.join(f"WHEN '{value}' THEN {rank}" for value, rank in ranks.items())
+    return f'(CASE {column} {whens} ELSE {len(ranks) + 1} END)'
+
+
+def worklist_due_sql(alias=''):
+    """Worklist due-date sort key of the partial worklist index; undated work orders sort last"""
+    return f"COALESCE({alias}due_date, '9999-12-31')"
+
+
+def worklist_status_sql(alias=''):
+    """Predicate of the partial worklist index, with statuses inlined so queries match it"""
+    statuses = ', '.join(f"'{status}'" for status in WorkOrder.ACTIVE_STATUSES)
+    return f'{alias}status IN ({statuses})'
+
+
+def work_order_rank_trigger_sql():
+    """Statements that (re)create the triggers maintaining work_orders.status_rank/priority_rank"""
+    status_rank = rank_case_sql('NEW.status', WorkOrder.STATUS_RANKS)
+    priority_rank = rank_case_sql('NEW.priority', WorkOrder.PRIORITY_RANKS)
+    set_ranks = f'''
+            UPDATE work_orders
+            SET status_rank = {status_rank},
+                priority_rank = {priority_rank},
+                created_at = COALESCE(NEW.created_at, CURRENT_TIMESTAMP)
+            WHERE id = NEW.id;
+    '''
+    return [
+        'DROP TRIGGER IF EXISTS trg_work_order_rank_insert',
+        'DROP TRIGGER IF EXISTS trg_work_order_rank_update',
+        f'''
+        CREATE TRIGGER trg_work_order_rank_insert
+        AFTER INSERT ON work_orders
+        BEGIN
+            {set_ranks}
+        END
+        ''',
+        f'''
+        CREATE TRIGGER trg_work_order_rank_update
+        AFTER UPDATE OF status, priority ON work_orders
+        WHEN NEW.status_rank IS NOT {status_rank} OR NEW.priority_rank IS NOT {priority_rank}
+        BEGIN
+            UPDATE work_orders
+            SET status_rank = {status_rank},
+                priority_rank = {priority_rank}
+            WHERE id = NEW.id;
+        END
+        ''',
+    ]
+
+
+# Tables whose writes bump data_versions, so cached reads can tell when they are stale
+VERSIONED_TABLES = ['maintenance_schedules', 'equipment', 'locations', 'users', 'spare_parts', 'vendors']
+
+
+def data_version_trigger_sql(table):
+    """Statements that (re)create the triggers bumping the data version of a table"""
+    statements = []
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        trigger = f'trg_{table}_version_{event.lower()}'
+        statements.append(f'DROP TRIGGER IF EXISTS {trigger}')
+        statements.append(f'''
+        CREATE TRIGGER {trigger} AFTER {event} ON {table}
+        BEGIN
+            UPDATE data_versions SET version = version + 1 WHERE table_name = '{table}';
+        END
+        ''')
+    return statements
+
+
+# Columns written by each edit form; a change to any of them bumps row_version
+ROW_VERSION_COLUMNS = {
+    'work_orders': ['work_order_number', 'title', 'description', 'equipment_id', 'location_code',
+                    'priority', 'status', 'assigned_to', 'due_date', 'completed_at', 'required_skill'],
+    'purchase_orders': ['vendor_id', 'order_date', 'expected_delivery_date', 'status',
+                        'total_amount', 'notes'],
+    'maintenance_schedules': ['name', 'description', 'equipment_id', 'schedule_type', 'frequency',
+                              'meter_interval', 'meter_unit', 'priority', 'estimated_duration',
+                              'instructions', 'status'],
+}
+
+
+def row_version_trigger_sql(table, columns):
+    """Statements that (re)create the trigger bumping row_version when an edited column changes"""
+    return [
+        f'DROP TRIGGER IF EXISTS trg_{table}_row_version',
+        # Writes that set row_version themselves are left alone
+        f'''
+        CREATE TRIGGER trg_{table}_row_version AFTER UPDATE OF {', '.join(columns)} ON {table}
+        WHEN NEW.row_version IS OLD.row_version
+        BEGIN
+            UPDATE {table} SET row_version = OLD.row_version + 1 WHERE id = NEW.id;
+        END
+        ''',
+    ]
+
+
+def po_line_row_version_trigger_sql():
+    """Statements that (re)create the trigger bumping a PO's row_version when its receipts change"""
+    return [
+        'DROP TRIGGER IF EXISTS trg_purchase_order_lines_row_version',
+        '''
+        CREATE TRIGGER trg_purchase_order_lines_row_version
+        AFTER UPDATE OF quantity_received, final_delivery ON purchase_order_lines
+        BEGIN
+            UPDATE purchase_orders SET row_version = row_version + 1 WHERE id = NEW.purchase_order_id;
+        END
+        ''',
+    ]
+
+
+# Tables whose rows carry a change_version for offline device sync
+SYNC_TABLES = ['work_orders', 'spare_parts', 'equipment']
+
+
+def sync_trigger_sql(table):
+    """Statements that (re)create the triggers stamping rows of a synced table with the sync clock"""
+    bump = "UPDATE data_versions SET version = version + 1 WHERE table_name = 'sync';"
+    clock = "(SELECT version FROM data_versions WHERE table_name = 'sync')"
+    stamp = f'UPDATE {table} SET change_version = {clock} WHERE id = NEW.id;'
+    return [
+        f'DROP TRIGGER IF EXISTS trg_{table}_sync_insert',
+        f'DROP TRIGGER IF EXISTS trg_{table}_sync_update',
+        f'DROP TRIGGER IF EXISTS trg_{table}_sync_delete',
+        f'''
+        CREATE TRIGGER trg_{table}_sync_insert AFTER INSERT ON {table}
+        BEGIN
+            {bump}
+            {stamp}
+        END
+        ''',
+        # The stamp itself changes change_version, which the WHEN clause ignores
+        f'''
+        CREATE TRIGGER trg_{table}_sync_update AFTER UPDATE ON {table}
+        WHEN NEW.change_version IS OLD.change_version
+        BEGIN
+            {bump}
+            {stamp}
+        END
+        ''',
+        f'''
+        CREATE TRIGGER trg_{table}_sync_delete AFTER DELETE ON {table}
+        BEGIN
+            {bump}
+            INSERT INTO sync_deletions (table_name, row_id, change_version)
+            VALUES ('{table}', OLD.id, {clock});
+        END
+        ''',
+    ]
+
+
+# Trigram FTS5 indexes behind the typeahead endpoints: index name -> (source table, columns)
+TYPEAHEAD_INDEXES = {
+    'typeahead_spare_parts': ('spare_parts', ['description', 'vendor_description', 'storage_bin']),
+    'typeahead_equipment': ('equipment', ['tag_number', 'description']),
+    'typeahead_users': ('users', ['username']),
+}
+
+
+# FTS5 indexes behind the global search omnibox: index name -> (source table, columns).
+# Columns are listed most significant first; search ranking weights them in that order.
+SEARCH_INDEXES = {
+    'search_work_orders': ('work_orders', ['work_order_number', 'title', 'description']),
+    'search_equipment': ('equipment', ['tag_number', 'description', 'manufacturer', 'model_number',
+                                       'serial_number', 'location']),
+    'search_spare_parts': ('spare_parts', ['description', 'vendor_description', 'storage_location',
+                                           'storage_bin']),
+    'search_vendors': ('vendors', ['vendor_id', 'name', 'contact_name', 'email', 'phone']),
+    'search_purchase_orders': ('purchase_orders', ['po_number', 'notes']),
+}
+
+
+def create_fts_index(cursor, index_name, table, columns, options):
+    """Create an FTS5 index over table with its sync triggers; returns False when unsupported"""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (index_name,))
+    exists = cursor.fetchone() is not None
+    try:
+        cursor.execute(f'''
+            CREATE VIRTUAL TABLE IF NOT EXISTS {index_name}
+            USING fts5({', '.join(columns)}, content='{table}', content_rowid='id', {options})
+        ''')
+    except sqlite3.OperationalError:
+        return False
+    for statement in fts_trigger_sql(index_name, table, columns):
+        cursor.execute(statement)
+    if not exists:
+        cursor.execute(f"INSERT INTO {index_name} ({index_name}) VALUES ('rebuild')")
+    return True
+
+
+def rebuild_search_indexes():
+    """Rebuild every FTS5 index (search and typeahead) from its source table"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    rebuilt = []
+    for index_name in list(SEARCH_INDEXES) + list(TYPEAHEAD_INDEXES):
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (index_name,))
+        if cursor.fetchone() is None:
+            continue
+        cursor.execute(f"INSERT INTO {index_name} ({index_name}) VALUES ('rebuild')")
+        cursor.execute(f"INSERT INTO {index_name} ({index_name}) VALUES ('optimize')")
+        rebuilt.append(index_name)
+    conn.commit()
+    conn.close()
+    return rebuilt
+
+
+def fts_trigger_sql(index_name, table, columns):
+    """Statements that (re)create the triggers keeping an external-content FTS5 index in sync"""
+    column_list = ', '.join(columns)
+    new_values = ', '.join(f'NEW.{column}' for column in columns)
+    old_values = ', '.join(f'OLD.{column}' for column in columns)
+    delete_old = f'''
+            INSERT INTO {index_name} ({index_name}, rowid, {column_list})
+            VALUES ('delete', OLD.id, {old_values});
+    '''
+    insert_new = f'''
+            INSERT INTO {index_name} (rowid, {column_list}) VALUES (NEW.id, {new_values});
+    '''
+    return [
+        f'DROP TRIGGER IF EXISTS trg_{index_name}_insert',
+        f'DROP TRIGGER IF EXISTS trg_{index_name}_update',
+        f'DROP TRIGGER IF EXISTS trg_{index_name}_delete',
+        f'''
+        CREATE TRIGGER trg_{index_name}_insert AFTER INSERT ON {table}
+        BEGIN
+            {insert_new}
+        END
+        ''',
+        f'''
+        CREATE TRIGGER trg_{index_name}_update AFTER UPDATE OF {column_list} ON {table}
+        BEGIN
+            {delete_old}
+            {insert_new}
+        END
+        ''',
+        f'''
+        CREATE TRIGGER trg_{index_name}_delete AFTER DELETE ON {table}
+        BEGIN
+            {delete_old}
+        END
+        ''',
+    ]
+
+
+def get_data_versions(cursor, tables):
+    """Return the current data version of each table as a tuple, in the order given"""
+    placeholders = ','.join('?' * len(tables))
+    cursor.execute(f'SELECT table_name, version FROM data_versions WHERE table_name IN ({placeholders})',
+                   list(tables))
+    versions = {row[0]: row[1] for row in cursor.fetchall()}
+    return tuple(versions.get(table, 0) for table in tables)
+
+
 def get_connection():
     db_path = get_db_path()
     conn = sqlite3.connect(db_path)
@@ -0,0 +1,118 @@
+import random
+import re
+import sqlite3
+import zlib
+from array import array
+
+# MinHash over character trigrams of a work order's title and description.
+# Each signature is SIGNATURE_SIZE 32-bit minimums, one per hash function
+# h_i(x) = (a_i * x + b_i) mod a Mersenne prime; the share of equal positions
+# between two signatures estimates the Jaccard similarity of their trigram sets.
+SIGNATURE_SIZE = 64
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20240611)
+_HASH_PARAMS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(SIGNATURE_SIZE)]
+_MAX_HASH = 0xFFFFFFFF
+
+# Only the start of long descriptions is used, so the title keeps most of the weight
+DESCRIPTION_CHARS = 200
+
+
+def work_order_text(title, description):
+    """Normalized text a work order's signature is built from"""
+    text = f"{title or ''} {(description or '')[:DESCRIPTION_CHARS]}".lower()
+    return ' '.join(re.findall(r'[a-z0-9]+', text))
+
+
+def shingles(text):
+    """Set of character trigrams of normalized text (padded so short words count)"""
+    padded = f' {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def minhash_signature(text):
+    """MinHash signature of normalized text as packed bytes, or None for empty text"""
+    grams = shingles(text) if text else set()
+    if not grams:
+        return None
+    hashes = [zlib.crc32(gram.encode()) for gram in grams]
+    signature = array('I', (
+        min((a * h + b) % _PRIME for h in hashes) & _MAX_HASH
+        for a, b in _HASH_PARAMS
+    ))
+    return signature.tobytes()
+
+
+SAVE_SIGNATURE_SQL = '''
+    INSERT INTO work_order_signatures (work_order_id, text_hash, signature)
+    VALUES (?, ?, ?)
+    ON CONFLICT (work_order_id) DO UPDATE
+    SET text_hash = excluded.text_hash, signature = excluded.signature
+'''
+
+
+def text_hash(text):
+    """Checksum of normalized text stored with a signature, to tell when it is stale"""
+    return zlib.crc32(text.encode())
+
+
+def store_signature(cursor, wo_id, title, description):
+    """Sign one work order's title/description and save it (called where they are written)"""
+    text = work_order_text(title, description)
+    signature = minhash_signature(text)
+    if signature is None:
+        cursor.execute('DELETE FROM work_order_signatures WHERE work_order_id = ?', (wo_id,))
+        return
+    cursor.execute(SAVE_SIGNATURE_SQL, (wo_id, text_hash(text), signature))
+
+
+def signature_similarity(first, second):
+    """Estimated Jaccard similarity of two packed signatures"""
+    a = array('I')
+    a.frombytes(first)
+    b = array('I')
+    b.frombytes(second)
+    return sum(1 for x, y in zip(a, b) if x == y) / SIGNATURE_SIZE
+
+
+def find_similar_work_orders(cursor, equipment_id, title, description='', exclude_id=None,
+                             limit=5, min_similarity=0.15):
+    """Top work orders on the same equipment by title/description similarity, best first"""
+    query_signature = minhash_signature(work_order_text(title, description))
+    if query_signature is None or not equipment_id:
+        return []
+
+    cursor.execute('''
+        SELECT wo.id, wo.work_order_number, wo.title, wo.description, wo.status, wo.priority,
+               wo.created_at, wo.completed_at, s.text_hash, s.signature
+        FROM work_orders wo
+        LEFT JOIN work_order_signatures s ON s.work_order_id = wo.id
+        WHERE wo.equipment_id = ? AND wo.id IS NOT ?
+    ''', (equipment_id, exclude_id))
+    rows = cursor.fetchall()
+
+    scored = []
+    refreshed = []
+    for row in rows:
+        signature = row['signature']
+        text = work_order_text(row['title'], row['description'])
+        if signature is None or row['text_hash'] != text_hash(text):
+            signature = minhash_signature(text)
+            if signature is None:
+                continue
+            refreshed.append((row['id'], text_hash(text), signature))
+        similarity = signature_similarity(query_signature, signature)
+        if similarity >= min_similarity:
+            scored.append((row, similarity))
+
+    # Saving is best-effort: if another writer holds the lock, the lookup still
+    # answers and the signatures are rebuilt next time
+    if refreshed:
+        try:
+            cursor.executemany(SAVE_SIGNATURE_SQL, refreshed)
+            cursor.connection.commit()
+        except sqlite3.OperationalError:
+            cursor.connection.rollback()
+
+    scored.sort(key=lambda item: (-item[1], -item[0]['id']))
+    return scored[:limit]
@@ -1,4 +1,4 @@
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 
 
 class MaintenanceSchedule:
@@ -17,11 +17,16 @@ class MaintenanceSchedule:
         'Annual': 365
     }
 
+    # Bit flags returned by classify_statuses
+    FLAG_OVERDUE = 1
+    FLAG_DUE_TODAY = 2
+    FLAG_DUE_SOON = 4
+
     def __init__(self, id=None, schedule_id=None, name=None, description=None, equipment_id=None,
                  schedule_type=None, frequency=None, meter_interval=None, meter_unit=None,
                  last_performed_date=None, last_meter_reading=None, next_due_date=None,
                  next_due_meter=None, priority=None, estimated_duration=None,
-                 instructions=None, status=None, created_by=None, created_at=None):
+                 instructions=None, status=None, created_by=None, created_at=None, row_version=None):
         self.id = id
         self.schedule_id = schedule_id
         self.name = name
@@ -41,6 +46,7 @@ class MaintenanceSchedule:
         self.status = status or 'Active'
         self.created_by = created_by
         self.created_at = created_at
+        self.row_version = row_version
 
     @staticmethod
     def from_row(row):
@@ -66,7 +72,8 @@ class MaintenanceSchedule:
             instructions=row['instructions'] if 'instructions' in row.keys() else None,
             status=row['status'] if 'status' in row.keys() else 'Active',
             created_by=row['created_by'] if 'created_by' in row.keys() else None,
-            created_at=row['created_at'] if 'created_at' in row.keys() else None
+            created_at=row['created_at'] if 'created_at' in row.keys() else None,
+            row_version=row['row_version'] if 'row_version' in row.keys() else None
         )
 
     def to_dict(self):
@@ -90,7 +97,8 @@ class MaintenanceSchedule:
             'instructions': self.instructions,
             'status': self.status,
             'created_by': self.created_by,
-            'created_at': self.created_at
+            'created_at': self.created_at,
+            'row_version': self.row_version
         }
 
     @staticmethod
@@ -105,6 +113,27 @@ class MaintenanceSchedule:
         next_date = from_date + timedelta(days=days)
         return next_date.strftime('%Y-%m-%d')
 
+    @staticmethod
+    def occurrences_between(next_due_date, frequency, start_date, end_date):
+        """Due dates of a time-based schedule inside [start_date, end_date]"""
+        if not next_due_date:
+            return []
+        if isinstance(next_due_date, str):
+            next_due_date = datetime.strptime(next_due_date[:10], '%Y-%m-%d').date()
+        if isinstance(start_date, str):
+            start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
+        if isinstance(end_date, str):
+            end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
+
+        step = MaintenanceSchedule.FREQUENCY_DAYS.get(frequency, 30)
+        anchor = next_due_date.toordinal()
+        start = start_date.toordinal()
+        end = end_date.toordinal()
+
+        # Nothing before the next due date is planned
+        first = anchor if anchor >= start else anchor - ((anchor - start) // step) * step
+        return [date.fromordinal(day).isoformat() for day in range(first, end + 1, step)]
+
     @staticmethod
     def calculate_next_due_meter(current_reading, interval):
         """Calculate the next due meter reading"""
@@ -154,3 +183,62 @@ class MaintenanceSchedule:
             return today <= due_date <= today + timedelta(days=days)
 
         return False
+
+    @staticmethod
+    def classify_statuses(schedule_types, statuses, next_due_dates, next_due_meters,
+                          current_meters=None, days=7, today=None):
+        """Due-status bit flags (FLAG_*) for many schedules at once, comparing ISO date strings"""
+        if today is None:
+            today = datetime.now().date()
+        elif isinstance(today, str):
+            today = datetime.strptime(today, '%Y-%m-%d').date()
+        today_str = today.strftime('%Y-%m-%d')
+        soon_str = (today + timedelta(days=days)).strftime('%Y-%m-%d')
+
+        if current_meters is None:
+            current_meters = [None] * len(statuses)
+
+        overdue = MaintenanceSchedule.FLAG_OVERDUE
+        due_today = MaintenanceSchedule.FLAG_DUE_TODAY
+        due_soon = MaintenanceSchedule.FLAG_DUE_SOON
+
+        # Time-based columns: one slice per date, then plain string comparisons
+        due_dates = [d[:10] if d else None for d in next_due_dates]
+        time_flags = [
+            0 if not d else
+            (overdue if d < today_str else
+             (due_today | due_soon) if d == today_str else
+             due_soon if d <= soon_str else 0)
+            for d in due_dates
+        ]
+
+        # Meter-based columns: overdue once the current reading reaches the due meter
+        meter_flags = [
+            overdue if due_meter and current and current >= due_meter else 0
+            for due_meter, current in zip(next_due_meters, current_meters)
+        ]
+
+        return [
+            0 if status != 'Active' else
+            time_flag if schedule_type == 'time-based' else
+            meter_flag if schedule_type == 'meter-based' else 0
+            for schedule_type, status, time_flag, meter_flag
+            in zip(schedule_types, statuses, time_flags, meter_flags)
+        ]
+
+    @staticmethod
+    def annotate_statuses(schedules, current_meters=None, days=7, today=None):
+        """Set overdue / due_today / due_soon attributes on a list of schedules in one pass"""
+        flags = MaintenanceSchedule.classify_statuses(
+            [s.schedule_type for s in schedules],
+            [s.status for s in schedules],
+            [s.next_due_date for s in schedules],
+            [s.next_due_meter for s in schedules],
+            current_meters, days=days, today=today)
+
+        for schedule, flag in zip(schedules, flags):
+            schedule.status_flags = flag
+            schedule.overdue = bool(flag & MaintenanceSchedule.FLAG_OVERDUE)
+            schedule.due_today = bool(flag & MaintenanceSchedule.FLAG_DUE_TODAY)
+            schedule.due_soon = bool(flag & MaintenanceSchedule.FLAG_DUE_SOON)
+        return flags
@@ -4,7 +4,7 @@ class PurchaseOrder:
     def __init__(self, id=None, po_number=None, vendor_id=None, order_date=None,
                  expected_delivery_date=None, status=None, total_amount=None,
                  notes=None, created_by=None, created_at=None,
-                 vendor_name=None, created_by_name=None):
+                 vendor_name=None, created_by_name=None, row_version=None):
         self.id = id
         self.po_number = po_number
         self.vendor_id = vendor_id
@@ -18,6 +18,7 @@ class PurchaseOrder:
         # Joined fields
         self.vendor_name = vendor_name
         self.created_by_name = created_by_name
+        self.row_version = row_version
 
     @staticmethod
     def from_row(row):
@@ -37,7 +38,8 @@ class PurchaseOrder:
             created_by=row['created_by'] if 'created_by' in keys else None,
             created_at=row['created_at'] if 'created_at' in keys else None,
             vendor_name=row['vendor_name'] if 'vendor_name' in keys else None,
-            created_by_name=row['created_by_name'] if 'created_by_name' in keys else None
+            created_by_name=row['created_by_name'] if 'created_by_name' in keys else None,
+            row_version=row['row_version'] if 'row_version' in keys else None
         )
 
     def to_dict(self):
@@ -54,7 +56,8 @@ class PurchaseOrder:
             'created_by': self.created_by,
             'created_at': self.created_at,
             'vendor_name': self.vendor_name,
-            'created_by_name': self.created_by_name
+            'created_by_name': self.created_by_name,
+            'row_version': self.row_version
         }
 
     def is_open(self):
@@ -2,12 +2,13 @@ from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 
 class User(UserMixin):
-    def __init__(self, id, username, password_hash, role, created_at=None):
+    def __init__(self, id, username, password_hash, role, created_at=None, crew=None):
         self.id = id
         self.username = username
         self.password_hash = password_hash
         self.role = role
         self.created_at = created_at
+        self.crew = crew
 
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
@@ -1,11 +1,25 @@
 class WorkOrder:
     PRIORITIES = ['Emergency', 'High', 'Medium', 'Low']
     STATUSES = ['Open', 'In Progress', 'On Hold', 'Completed', 'Cancelled']
+    ACTIVE_STATUSES = ['Open', 'In Progress', 'On Hold']
+
+    # Sort order used by the work order report (lower sorts first)
+    STATUS_RANKS = {status: rank for rank, status in enumerate(STATUSES, 1)}
+    PRIORITY_RANKS = {priority: rank for rank, priority in enumerate(PRIORITIES, 1)}
+
+    # Status changes allowed by mass transitions; Completed and Cancelled are closed
+    STATUS_TRANSITIONS = {
+        'Open': ['In Progress', 'On Hold', 'Completed', 'Cancelled'],
+        'In Progress': ['Open', 'On Hold', 'Completed', 'Cancelled'],
+        'On Hold': ['Open', 'In Progress', 'Completed', 'Cancelled'],
+        'Completed': [],
+        'Cancelled': [],
+    }
 
     def __init__(self, id=None, work_order_number=None, title=None, description=None,
                  equipment_id=None, location_code=None, priority=None, status=None,
                  assigned_to=None, created_by=None, due_date=None, completed_at=None,
-                 created_at=None):
+                 created_at=None, row_version=None, required_skill=None):
         self.id = id
         self.work_order_number = work_order_number
         self.title = title
@@ -19,6 +33,8 @@ class WorkOrder:
         self.due_date = due_date
         self.completed_at = completed_at
         self.created_at = created_at
+        self.row_version = row_version
+        self.required_skill = required_skill
 
     @staticmethod
     def from_row(row):
@@ -38,7 +54,9 @@ class WorkOrder:
             created_by=row['created_by'] if 'created_by' in row.keys() else None,
             due_date=row['due_date'] if 'due_date' in row.keys() else None,
             completed_at=row['completed_at'] if 'completed_at' in row.keys() else None,
-            created_at=row['created_at']
+            created_at=row['created_at'],
+            row_version=row['row_version'] if 'row_version' in row.keys() else None,
+            required_skill=row['required_skill'] if 'required_skill' in row.keys() else None
         )
 
     def to_dict(self):
@@ -56,5 +74,7 @@ class WorkOrder:
             'created_by': self.created_by,
             'due_date': self.due_date,
             'completed_at': self.completed_at,
-            'created_at': self.created_at
+            'created_at': self.created_at,
+            'row_version': self.row_version,
+            'required_skill': self.required_skill
         }
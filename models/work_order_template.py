@@ -0,0 +1,43 @@
+class WorkOrderTemplate:
+    def __init__(self, id=None, name=None, title=None, description=None, priority=None,
+                 assigned_to=None, due_in_days=None, created_by=None, created_at=None):
+        self.id = id
+        self.name = name
+        self.title = title
+        self.description = description
+        self.priority = priority or 'Medium'
+        self.assigned_to = assigned_to
+        self.due_in_days = due_in_days
+        self.created_by = created_by
+        self.created_at = created_at
+
+    @staticmethod
+    def from_row(row):
+        """Create a WorkOrderTemplate object from a database row"""
+        if row is None:
+            return None
+        return WorkOrderTemplate(
+            id=row['id'],
+            name=row['name'],
+            title=row['title'],
+            description=row['description'] if 'description' in row.keys() else None,
+            priority=row['priority'] if 'priority' in row.keys() else 'Medium',
+            assigned_to=row['assigned_to'] if 'assigned_to' in row.keys() else None,
+            due_in_days=row['due_in_days'] if 'due_in_days' in row.keys() else None,
+            created_by=row['created_by'] if 'created_by' in row.keys() else None,
+            created_at=row['created_at'] if 'created_at' in row.keys() else None
+        )
+
+    def to_dict(self):
+        """Convert to dictionary"""
+        return {
+            'id': self.id,
+            'name': self.name,
+            'title': self.title,
+            'description': self.description,
+            'priority': self.priority,
+            'assigned_to': self.assigned_to,
+            'due_in_days': self.due_in_days,
+            'created_by': self.created_by,
+            'created_at': self.created_at
+        }
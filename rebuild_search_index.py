@@ -0,0 +1,15 @@
+"""Rebuild the full-text search and typeahead indexes from their source tables.
+
+The indexes are kept in sync by triggers; run this after bulk-loading data with
+triggers bypassed, restoring a backup, or if search results look stale.
+"""
+
+from database.init_db import init_database, rebuild_search_indexes
+
+if __name__ == '__main__':
+    init_database()
+    print('Rebuilding search indexes...\n')
+    rebuilt = rebuild_search_indexes()
+    for index_name in rebuilt:
+        print(f'  Rebuilt: {index_name}')
+    print(f'\nSearch index rebuild complete! ({len(rebuilt)} indexes)')
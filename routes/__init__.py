@@ -12,3 +12,7 @@ from .vendors import vendors_bp
 from .reports import reports_bp
 from .maintenance_reports import maintenance_reports_bp
 from .order_reports import order_reports_bp
+from .search import search_bp
+from .sync import sync_bp
+from .work_order_templates import work_order_templates_bp
+from .notifications import notifications_bp
@@ -17,7 +17,8 @@ def get_user_by_username(username):
             username=row['username'],
             password_hash=row['password_hash'],
             role=row['role'],
-            created_at=row['created_at']
+            created_at=row['created_at'],
+            crew=row['crew']
         )
     return None
 
@@ -33,7 +34,8 @@ def get_user_by_id(user_id):
             username=row['username'],
             password_hash=row['password_hash'],
             role=row['role'],
-            created_at=row['created_at']
+            created_at=row['created_at'],
+            crew=row['crew']
         )
     return None
 
@@ -1,20 +1,20 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required
 from database.init_db import get_connection
+from database.cache import cached_query
 from models.equipment import Equipment
 from models.location import Location
+from models.work_order import WorkOrder
 
 equipment_bp = Blueprint('equipment', __name__, url_prefix='/equipment')
 
 
 def get_active_locations():
     """Fetch all active locations for dropdown"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM locations WHERE status = 'Active' ORDER BY location_code")
-    rows = cursor.fetchall()
-    conn.close()
-    return [Location.from_row(row) for row in rows]
+    def load(cursor):
+        cursor.execute("SELECT * FROM locations WHERE status = 'Active' ORDER BY location_code")
+        return [Location.from_row(row) for row in cursor.fetchall()]
+    return list(cached_query('locations:active', ['locations'], load))
 
 
 def validate_location_code(location_code):
@@ -186,9 +186,18 @@ def change(equip_id):
                 WHERE id = ?
             ''', (tag_number, description, manufacturer or None, model_number or None,
                   serial_number or None, location or None, installation_date or None, status, equip_id))
+
+            # Decommissioned equipment must stop generating PM work orders; open
+            # work orders are left for the bulk decommission page to cancel or reassign
+            schedules_deactivated = 0
+            if status == 'Decommissioned':
+                schedules_deactivated, _ = decommission_cascade(cursor, [equip_id])
             conn.commit()
             conn.close()
-            flash(f'Equipment "{description}" updated successfully.', 'success')
+            msg = f'Equipment "{description}" updated successfully.'
+            if schedules_deactivated:
+                msg += f' {schedules_deactivated} maintenance schedule(s) deactivated.'
+            flash(msg, 'success')
             return redirect(url_for('equipment.master_data'))
         except Exception as e:
             conn.close()
@@ -197,3 +206,186 @@ def change(equip_id):
 
     conn.close()
     return render_template('modules/equipment/change.html', equipment=equip, statuses=Equipment.STATUSES, locations=locations)
+
+
+# What happens to open work orders of decommissioned equipment:
+# cancel them, hand them to another user, or leave them untouched
+DECOMMISSION_POLICIES = ['cancel', 'reassign', 'keep']
+
+
+def decommission_cascade(cursor, equipment_ids, policy='keep', reassign_to=None):
+    """Deactivate schedules and apply the open work order policy for decommissioned equipment"""
+    if not equipment_ids:
+        return 0, []
+    placeholders = ','.join('?' * len(equipment_ids))
+
+    cursor.execute(f'''
+        UPDATE maintenance_schedules SET status = 'Inactive'
+        WHERE equipment_id IN ({placeholders}) AND status = 'Active'
+    ''', list(equipment_ids))
+    schedules_deactivated = cursor.rowcount
+
+    if policy == 'keep':
+        return schedules_deactivated, []
+
+    open_placeholders = ','.join('?' * len(WorkOrder.ACTIVE_STATUSES))
+    cursor.execute(f'''
+        SELECT id, work_order_number, equipment_id FROM work_orders
+        WHERE equipment_id IN ({placeholders}) AND status IN ({open_placeholders})
+        ORDER BY work_order_number
+    ''', list(equipment_ids) + WorkOrder.ACTIVE_STATUSES)
+    work_orders = [(row['id'], row['work_order_number'], row['equipment_id']) for row in cursor.fetchall()]
+    if not work_orders:
+        return schedules_deactivated, []
+
+    wo_placeholders = ','.join('?' * len(work_orders))
+    wo_ids = [wo[0] for wo in work_orders]
+    if policy == 'cancel':
+        cursor.execute(f"UPDATE work_orders SET status = 'Cancelled' WHERE id IN ({wo_placeholders})", wo_ids)
+    else:
+        cursor.execute(f'UPDATE work_orders SET assigned_to = ? WHERE id IN ({wo_placeholders})',
+                       [reassign_to] + wo_ids)
+    return schedules_deactivated, work_orders
+
+
+def decommission_equipment(tag_numbers, policy, reassign_to=None):
+    """Decommission many equipment by tag number in one transaction"""
+    summary = {'policy': policy, 'equipment': [], 'not_found': [], 'schedules_deactivated': 0,
+               'work_orders_affected': 0}
+    if not tag_numbers:
+        return summary
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute('BEGIN IMMEDIATE')
+
+        placeholders = ','.join('?' * len(tag_numbers))
+        cursor.execute(f'''
+            SELECT id, tag_number, status FROM equipment
+            WHERE tag_number IN ({placeholders})
+            ORDER BY tag_number
+        ''', list(tag_numbers))
+        rows = cursor.fetchall()
+        found = {row['tag_number'] for row in rows}
+        summary['not_found'] = [tag for tag in tag_numbers if tag not in found]
+        equipment_ids = [row['id'] for row in rows]
+
+        if equipment_ids:
+            cursor.execute(f'''
+                UPDATE equipment SET status = 'Decommissioned'
+                WHERE id IN ({','.join('?' * len(equipment_ids))}) AND status != 'Decommissioned'
+            ''', equipment_ids)
+
+            cursor.execute(f'''
+                SELECT equipment_id, COUNT(*) as schedule_count FROM maintenance_schedules
+                WHERE equipment_id IN ({','.join('?' * len(equipment_ids))}) AND status = 'Active'
+                GROUP BY equipment_id
+            ''', equipment_ids)
+            schedule_counts = {row['equipment_id']: row['schedule_count'] for row in cursor.fetchall()}
+
+            schedules_deactivated, work_orders = decommission_cascade(cursor, equipment_ids, policy, reassign_to)
+            summary['schedules_deactivated'] = schedules_deactivated
+            summary['work_orders_affected'] = len(work_orders)
+
+            work_orders_by_equipment = {}
+            for wo_id, wo_number, equip_id in work_orders:
+                work_orders_by_equipment.setdefault(equip_id, []).append(wo_number)
+            for row in rows:
+                summary['equipment'].append({
+                    'tag_number': row['tag_number'],
+                    'previous_status': row['status'],
+                    'schedules_deactivated': schedule_counts.get(row['id'], 0),
+                    'work_orders': work_orders_by_equipment.get(row['id'], [])
+                })
+
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    return summary
+
+
+def parse_decommission_request(tag_numbers, policy, reassign_to):
+    """Validate decommission inputs from a form or JSON body. Returns (tags, policy, reassign_to, error)"""
+    if isinstance(tag_numbers, str):
+        tag_numbers = tag_numbers.replace(',', '\n').splitlines()
+    if not isinstance(tag_numbers, list):
+        return None, None, None, 'tag_numbers must be a list'
+    tags = []
+    for tag in tag_numbers:
+        tag = str(tag).strip()
+        if tag and tag not in tags:
+            tags.append(tag)
+    if not tags:
+        return None, None, None, 'Enter at least one tag number.'
+
+    policy = str(policy or '').strip()
+    if policy not in DECOMMISSION_POLICIES:
+        return None, None, None, f'Policy must be one of: {", ".join(DECOMMISSION_POLICIES)}'
+
+    if policy == 'reassign':
+        try:
+            reassign_to = int(reassign_to)
+        except (TypeError, ValueError):
+            return None, None, None, 'Select a user to reassign open work orders to.'
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT id FROM users WHERE id = ?', (reassign_to,))
+        user_row = cursor.fetchone()
+        conn.close()
+        if user_row is None:
+            return None, None, None, 'Reassign user not found.'
+    else:
+        reassign_to = None
+
+    return tags, policy, reassign_to, None
+
+
+@equipment_bp.route('/decommission', methods=['GET', 'POST'])
+@login_required
+def decommission():
+    """Decommission many equipment at once and clean up their schedules and work orders"""
+    summary = None
+
+    if request.method == 'POST':
+        tags, policy, reassign_to, error = parse_decommission_request(
+            request.form.get('tag_numbers', ''), request.form.get('policy'), request.form.get('reassign_to'))
+        if error:
+            flash(error, 'error')
+        else:
+            try:
+                summary = decommission_equipment(tags, policy, reassign_to)
+                action = {'cancel': 'cancelled', 'reassign': 'reassigned', 'keep': 'left open'}[policy]
+                flash(f'{len(summary["equipment"])} equipment decommissioned, '
+                      f'{summary["schedules_deactivated"]} schedule(s) deactivated, '
+                      f'{summary["work_orders_affected"]} open work order(s) {action}.', 'success')
+                if summary['not_found']:
+                    flash(f'Unknown tag number(s): {", ".join(summary["not_found"])}', 'error')
+            except Exception as e:
+                flash(f'Error decommissioning equipment: {str(e)}', 'error')
+
+    return render_template('modules/equipment/decommission.html',
+                           summary=summary, policies=DECOMMISSION_POLICIES)
+
+
+@equipment_bp.route('/api/decommission', methods=['POST'])
+@login_required
+def api_decommission():
+    """API endpoint to decommission many equipment in one transaction"""
+    # Body: {"tag_numbers": [...], "policy": "cancel" | "reassign" | "keep", "reassign_to": <user id>}
+    data = request.get_json(silent=True) or {}
+    tags, policy, reassign_to, error = parse_decommission_request(
+        data.get('tag_numbers'), data.get('policy'), data.get('reassign_to'))
+    if error:
+        return jsonify({'error': error}), 400
+
+    try:
+        summary = decommission_equipment(tags, policy, reassign_to)
+    except Exception as e:
+        return jsonify({'error': f'Error decommissioning equipment: {str(e)}'}), 500
+
+    return jsonify(summary)
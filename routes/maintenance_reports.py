@@ -186,21 +186,36 @@ def equipment_cost():
         period = 'all_time'
 
     # Query equipment costs
-    query = f'''
-        SELECT e.id, e.tag_number, e.description, e.manufacturer, e.model_number,
-               COUNT(DISTINCT wo.id) as work_order_count,
-               COALESCE(SUM(CASE WHEN wop.transaction_type = 'issue' THEN wop.quantity
-                                 ELSE -wop.quantity END), 0) as parts_issued_count,
-               SUM(CASE WHEN wop.transaction_type = 'issue' THEN wop.quantity * wop.cost_per_unit
-                        ELSE -wop.quantity * wop.cost_per_unit END) as total_parts_cost
-        FROM equipment e
-        LEFT JOIN work_orders wo ON e.id = wo.equipment_id
-        LEFT JOIN work_order_parts wop ON wo.id = wop.work_order_id
-        WHERE 1=1 {date_filter}
-        GROUP BY e.id
-        HAVING total_parts_cost > 0
-        ORDER BY total_parts_cost DESC
-    '''
+    if date_filter:
+        # Costs within a period need the individual parts transactions
+        query = f'''
+            SELECT e.id, e.tag_number, e.description, e.manufacturer, e.model_number,
+                   COUNT(DISTINCT wo.id) as work_order_count,
+                   COALESCE(SUM(CASE WHEN wop.transaction_type = 'issue' THEN wop.quantity
+                                     ELSE -wop.quantity END), 0) as parts_issued_count,
+                   SUM(CASE WHEN wop.transaction_type = 'issue' THEN wop.quantity * wop.cost_per_unit
+                            ELSE -wop.quantity * wop.cost_per_unit END) as total_parts_cost
+            FROM equipment e
+            LEFT JOIN work_orders wo ON e.id = wo.equipment_id
+            LEFT JOIN work_order_parts wop ON wo.id = wop.work_order_id
+            WHERE 1=1 {date_filter}
+            GROUP BY e.id
+            HAVING total_parts_cost > 0
+            ORDER BY total_parts_cost DESC
+        '''
+    else:
+        # All-time costs come from the rollup stored on each work order
+        query = '''
+            SELECT e.id, e.tag_number, e.description, e.manufacturer, e.model_number,
+                   COUNT(wo.id) as work_order_count,
+                   COALESCE(SUM(wo.parts_quantity), 0) as parts_issued_count,
+                   SUM(wo.total_parts_cost) as total_parts_cost
+            FROM equipment e
+            JOIN work_orders wo ON e.id = wo.equipment_id
+            GROUP BY e.id
+            HAVING total_parts_cost > 0
+            ORDER BY total_parts_cost DESC
+        '''
 
     cursor.execute(query, date_params)
     equipment_data = cursor.fetchall()
@@ -283,18 +298,29 @@ def equipment_work_orders(equipment_id):
         date_params.extend([start_date.isoformat(), end_date.isoformat()])
 
     # Query work orders with parts breakdown
-    query = f'''
-        SELECT wo.id, wo.work_order_number, wo.title,
-               DATE(MIN(wop.transacted_at)) as first_transaction_date,
-               SUM(CASE WHEN wop.transaction_type = 'issue' THEN wop.quantity * wop.cost_per_unit
-                        ELSE -wop.quantity * wop.cost_per_unit END) as total_cost
-        FROM work_orders wo
-        JOIN work_order_parts wop ON wo.id = wop.work_order_id
-        WHERE wo.equipment_id = ? {date_filter}
-        GROUP BY wo.id
-        HAVING total_cost > 0
-        ORDER BY first_transaction_date DESC
-    '''
+    if date_filter:
+        query = f'''
+            SELECT wo.id, wo.work_order_number, wo.title,
+                   DATE(MIN(wop.transacted_at)) as first_transaction_date,
+                   SUM(CASE WHEN wop.transaction_type = 'issue' THEN wop.quantity * wop.cost_per_unit
+                            ELSE -wop.quantity * wop.cost_per_unit END) as total_cost
+            FROM work_orders wo
+            JOIN work_order_parts wop ON wo.id = wop.work_order_id
+            WHERE wo.equipment_id = ? {date_filter}
+            GROUP BY wo.id
+            HAVING total_cost > 0
+            ORDER BY first_transaction_date DESC
+        '''
+    else:
+        query = '''
+            SELECT wo.id, wo.work_order_number, wo.title,
+                   (SELECT DATE(MIN(wop.transacted_at)) FROM work_order_parts wop
+                    WHERE wop.work_order_id = wo.id) as first_transaction_date,
+                   wo.total_parts_cost as total_cost
+            FROM work_orders wo
+            WHERE wo.equipment_id = ? AND wo.total_parts_cost > 0
+            ORDER BY first_transaction_date DESC
+        '''
 
     cursor.execute(query, date_params)
     work_orders = cursor.fetchall()
@@ -421,18 +447,15 @@ def work_order_details():
                u2.username as created_by_name,
                ms.schedule_id as maintenance_schedule_id,
                ms.name as maintenance_schedule_name,
-               COALESCE(SUM(CASE WHEN wop.transaction_type = 'issue' THEN wop.quantity * wop.cost_per_unit
-                                 ELSE -wop.quantity * wop.cost_per_unit END), 0) as total_parts_cost,
-               COUNT(DISTINCT CASE WHEN wop.transaction_type = 'issue' THEN wop.spare_part_id END) as parts_count
+               COALESCE(wo.total_parts_cost, 0) as total_parts_cost,
+               COALESCE(wo.parts_count, 0) as parts_count
         FROM work_orders wo
         LEFT JOIN equipment e ON wo.equipment_id = e.id
         LEFT JOIN locations l ON wo.location_code = l.location_code
         LEFT JOIN users u1 ON wo.assigned_to = u1.id
         LEFT JOIN users u2 ON wo.created_by = u2.id
         LEFT JOIN maintenance_schedules ms ON wo.maintenance_schedule_id = ms.id
-        LEFT JOIN work_order_parts wop ON wo.id = wop.work_order_id
         WHERE 1=1 {date_filter} {schedule_filter_clause}
-        GROUP BY wo.id
         ORDER BY wo.created_at DESC
     '''
 
@@ -598,18 +621,15 @@ def work_order_details_export():
                u2.username as created_by,
                COALESCE(ms.schedule_id || ' - ' || ms.name, 'N/A') as maintenance_schedule,
                wo.created_at, wo.due_date, wo.completed_at,
-               COALESCE(SUM(CASE WHEN wop.transaction_type = 'issue' THEN wop.quantity * wop.cost_per_unit
-                                 ELSE -wop.quantity * wop.cost_per_unit END), 0) as total_parts_cost,
-               COUNT(DISTINCT CASE WHEN wop.transaction_type = 'issue' THEN wop.spare_part_id END) as parts_count
+               COALESCE(wo.total_parts_cost, 0) as total_parts_cost,
+               COALESCE(wo.parts_count, 0) as parts_count
         FROM work_orders wo
         LEFT JOIN equipment e ON wo.equipment_id = e.id
         LEFT JOIN locations l ON wo.location_code = l.location_code
         LEFT JOIN users u1 ON wo.assigned_to = u1.id
         LEFT JOIN users u2 ON wo.created_by = u2.id
         LEFT JOIN maintenance_schedules ms ON wo.maintenance_schedule_id = ms.id
-        LEFT JOIN work_order_parts wop ON wo.id = wop.work_order_id
         WHERE 1=1 {date_filter} {schedule_filter_clause}
-        GROUP BY wo.id
         ORDER BY wo.created_at DESC
     '''
 
@@ -658,3 +678,106 @@ def work_order_details_export():
         mimetype='text/csv',
         headers={'Content-Disposition': f'attachment; filename={filename}'}
     )
+
+
+def get_pm_compliance(start_period, end_period, group_by='schedule'):
+    """Read PM compliance counts from the monthly rollup; returns (rows, totals)"""
+    if group_by == 'equipment':
+        select = "e.id as key_id, e.tag_number as label, e.description as detail"
+        joins = "LEFT JOIN equipment e ON pc.equipment_id = e.id"
+        group = "pc.equipment_id"
+        order = "e.tag_number"
+    elif group_by == 'month':
+        select = "pc.period as key_id, pc.period as label, NULL as detail"
+        joins = ""
+        group = "pc.period"
+        order = "pc.period"
+    else:
+        select = "ms.id as key_id, ms.schedule_id as label, ms.name as detail"
+        joins = "LEFT JOIN maintenance_schedules ms ON pc.maintenance_schedule_id = ms.id"
+        group = "pc.maintenance_schedule_id"
+        order = "ms.schedule_id"
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT {select},
+               SUM(pc.generated) as generated,
+               SUM(pc.completed_on_time) as completed_on_time,
+               SUM(pc.completed_late) as completed_late,
+               SUM(pc.still_open) as still_open
+        FROM pm_compliance_monthly pc
+        {joins}
+        WHERE pc.period BETWEEN ? AND ?
+        GROUP BY {group}
+        HAVING SUM(pc.generated) > 0
+        ORDER BY {order}
+    ''', (start_period, end_period))
+    rows = cursor.fetchall()
+    conn.close()
+
+    def compliance(generated, on_time):
+        return round(on_time / generated * 100, 1) if generated else 0
+
+    report_rows = []
+    totals = {'generated': 0, 'completed_on_time': 0, 'completed_late': 0, 'still_open': 0}
+    for row in rows:
+        item = {
+            'key': row['key_id'],
+            'label': row['label'] or 'N/A',
+            'detail': row['detail'] or '',
+            'generated': row['generated'],
+            'completed_on_time': row['completed_on_time'],
+            'completed_late': row['completed_late'],
+            'still_open': row['still_open'],
+            'compliance': compliance(row['generated'], row['completed_on_time'])
+        }
+        for key in totals:
+            totals[key] += item[key]
+        report_rows.append(item)
+
+    totals['compliance'] = compliance(totals['generated'], totals['completed_on_time'])
+    return report_rows, totals
+
+
+def get_compliance_periods():
+    """Parse start/end month and grouping from request args (defaults to the last 12 months)"""
+    today = datetime.now().date()
+    default_start = (today.replace(day=1) - timedelta(days=335)).strftime('%Y-%m')
+    start_period = request.args.get('start_month', '') or default_start
+    end_period = request.args.get('end_month', '') or today.strftime('%Y-%m')
+    group_by = request.args.get('group_by', 'schedule')
+    if group_by not in ['schedule', 'equipment', 'month']:
+        group_by = 'schedule'
+    return start_period, end_period, group_by
+
+
+@maintenance_reports_bp.route('/pm-compliance')
+@login_required
+def pm_compliance():
+    """PM Compliance Report backed by the monthly rollup table"""
+    start_period, end_period, group_by = get_compliance_periods()
+    rows, totals = get_pm_compliance(start_period, end_period, group_by)
+
+    return render_template('modules/reports/maintenance/pm_compliance.html',
+                          rows=rows,
+                          summary=totals,
+                          start_month=start_period,
+                          end_month=end_period,
+                          group_by=group_by)
+
+
+@maintenance_reports_bp.route('/api/pm-compliance')
+@login_required
+def api_pm_compliance():
+    """API endpoint: PM compliance KPI and breakdown for a month range"""
+    start_period, end_period, group_by = get_compliance_periods()
+    rows, totals = get_pm_compliance(start_period, end_period, group_by)
+
+    return {
+        'start_month': start_period,
+        'end_month': end_period,
+        'group_by': group_by,
+        'summary': totals,
+        'rows': rows
+    }
@@ -1,21 +1,30 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required, current_user
 from database.init_db import get_connection
+from database.cache import cached_query
+from database.concurrency import editable_values, parse_original_values, changed_fields, conflict_message
 from models.maintenance_schedule import MaintenanceSchedule
 from models.equipment import Equipment
-from datetime import datetime, timedelta
+from models.location import Location
+from datetime import datetime
 
 maintenance_schedules_bp = Blueprint('maintenance_schedules', __name__, url_prefix='/maintenance-schedules')
 
 
 def get_all_equipment():
     """Fetch all active equipment for dropdown"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM equipment WHERE status = 'Active' ORDER BY tag_number")
-    rows = cursor.fetchall()
-    conn.close()
-    return [Equipment.from_row(row) for row in rows]
+    def load(cursor):
+        cursor.execute("SELECT * FROM equipment WHERE status = 'Active' ORDER BY tag_number")
+        return [Equipment.from_row(row) for row in cursor.fetchall()]
+    return list(cached_query('equipment:active', ['equipment'], load))
+
+
+def get_active_locations():
+    """Fetch all active locations for dropdown"""
+    def load(cursor):
+        cursor.execute("SELECT * FROM locations WHERE status = 'Active' ORDER BY location_code")
+        return [Location.from_row(row) for row in cursor.fetchall()]
+    return list(cached_query('locations:active', ['locations'], load))
 
 
 def get_latest_meter_reading(equipment_id):
@@ -53,6 +62,173 @@ def generate_schedule_id():
         return f'SCH-{datetime.now().strftime("%Y%m%d%H%M%S")}'
 
 
+def allocate_schedule_ids(cursor, count):
+    """Reserve a block of consecutive schedule IDs inside the caller's transaction"""
+    cursor.execute("SELECT schedule_id FROM maintenance_schedules ORDER BY id DESC LIMIT 1")
+    row = cursor.fetchone()
+
+    if row is None or row['schedule_id'] is None:
+        start = 1
+    else:
+        try:
+            start = int(row['schedule_id'].split('-')[1]) + 1
+        except:
+            stamp = datetime.now().strftime("%Y%m%d%H%M%S")
+            return [f'SCH-{stamp}-{i + 1:04d}' for i in range(count)]
+
+    return [f'SCH-{num:04d}' for num in range(start, start + count)]
+
+
+def find_equipment_for_bulk(cursor, location='', search=''):
+    """Fetch active equipment matching a location and tag/description filter"""
+    query = "SELECT * FROM equipment WHERE status = 'Active'"
+    params = []
+    if location:
+        query += " AND location = ?"
+        params.append(location)
+    if search:
+        query += " AND (tag_number LIKE ? OR description LIKE ?)"
+        params.extend([f'%{search}%', f'%{search}%'])
+    query += " ORDER BY tag_number"
+    cursor.execute(query, params)
+    return cursor.fetchall()
+
+
+def parse_schedule_template(data):
+    """Validate schedule template fields from a form or JSON body. Returns (template, error)"""
+    def text(key, default=''):
+        value = data.get(key, default)
+        return str(value).strip() if value is not None else ''
+
+    template = {
+        'name': text('name'),
+        'description': text('description'),
+        'schedule_type': text('schedule_type', 'time-based') or 'time-based',
+        'frequency': text('frequency'),
+        'initial_due_date': text('initial_due_date'),
+        'meter_interval': text('meter_interval'),
+        'meter_unit': text('meter_unit'),
+        'priority': text('priority', 'Medium') or 'Medium',
+        'estimated_duration': text('estimated_duration'),
+        'instructions': text('instructions'),
+    }
+
+    if not template['name']:
+        return None, 'Schedule name is required.'
+    if template['schedule_type'] not in MaintenanceSchedule.SCHEDULE_TYPES:
+        return None, 'Invalid schedule type.'
+    if template['priority'] not in MaintenanceSchedule.PRIORITIES:
+        return None, 'Invalid priority.'
+
+    if template['schedule_type'] == 'time-based':
+        if template['frequency'] not in MaintenanceSchedule.FREQUENCIES:
+            return None, 'Frequency is required for time-based schedules.'
+        if template['initial_due_date']:
+            try:
+                datetime.strptime(template['initial_due_date'], '%Y-%m-%d')
+            except ValueError:
+                return None, 'Initial due date must be YYYY-MM-DD.'
+        template['meter_interval'] = None
+    else:
+        if not template['meter_interval'].isdigit() or int(template['meter_interval']) <= 0:
+            return None, 'Meter interval is required for meter-based schedules.'
+        template['meter_interval'] = int(template['meter_interval'])
+        template['frequency'] = ''
+        template['initial_due_date'] = ''
+
+    if template['estimated_duration']:
+        if not template['estimated_duration'].isdigit():
+            return None, 'Estimated duration must be a whole number of minutes.'
+        template['estimated_duration'] = int(template['estimated_duration'])
+    else:
+        template['estimated_duration'] = None
+
+    return template, None
+
+
+def bulk_create_schedules(template, equipment_ids, user_id):
+    """Apply a schedule template to many equipment in one transaction, skipping ineligible ones"""
+    equipment_ids = list(dict.fromkeys(equipment_ids))
+    summary = {'requested': len(equipment_ids), 'created': [], 'skipped': []}
+    if not equipment_ids:
+        return summary
+
+    schedule_type = template['schedule_type']
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        # Take the write lock up front so the ID block cannot be handed out twice
+        cursor.execute('BEGIN IMMEDIATE')
+
+        placeholders = ','.join('?' * len(equipment_ids))
+        cursor.execute(f'''
+            SELECT e.id, e.tag_number, e.status,
+                   EXISTS (SELECT 1 FROM maintenance_schedules ms
+                           WHERE ms.equipment_id = e.id AND ms.name = ?) as has_schedule,
+                   (SELECT reading_value FROM meter_readings mr
+                    WHERE mr.equipment_id = e.id
+                    ORDER BY mr.recorded_at DESC LIMIT 1) as current_reading
+            FROM equipment e
+            WHERE e.id IN ({placeholders})
+            ORDER BY e.tag_number
+        ''', [template['name']] + list(equipment_ids))
+
+        targets = []
+        found = set()
+        for row in cursor.fetchall():
+            found.add(row['id'])
+            if row['status'] != 'Active':
+                summary['skipped'].append({'equipment_id': row['id'], 'tag_number': row['tag_number'],
+                                           'reason': f'Equipment is {row["status"]}'})
+            elif row['has_schedule']:
+                summary['skipped'].append({'equipment_id': row['id'], 'tag_number': row['tag_number'],
+                                           'reason': 'Schedule already exists'})
+            else:
+                targets.append(row)
+        summary['skipped'].extend({'equipment_id': equip_id, 'tag_number': None, 'reason': 'Equipment not found'}
+                                  for equip_id in equipment_ids if equip_id not in found)
+
+        schedule_ids = allocate_schedule_ids(cursor, len(targets))
+
+        next_due_date = None
+        if schedule_type == 'time-based':
+            next_due_date = (template['initial_due_date'] or
+                             MaintenanceSchedule.calculate_next_due_date(template['frequency']))
+
+        insert_rows = []
+        for schedule_id, target in zip(schedule_ids, targets):
+            last_meter_reading = None
+            next_due_meter = None
+            if schedule_type == 'meter-based':
+                last_meter_reading = target['current_reading'] or 0
+                next_due_meter = MaintenanceSchedule.calculate_next_due_meter(
+                    last_meter_reading, template['meter_interval'])
+
+            insert_rows.append((schedule_id, template['name'], template['description'] or None,
+                                target['id'], schedule_type, template['frequency'] or None,
+                                template['meter_interval'], template['meter_unit'] or None,
+                                last_meter_reading, next_due_date, next_due_meter,
+                                template['priority'], template['estimated_duration'],
+                                template['instructions'] or None, user_id))
+            summary['created'].append({'schedule_id': schedule_id, 'tag_number': target['tag_number']})
+
+        cursor.executemany('''
+            INSERT INTO maintenance_schedules (schedule_id, name, description, equipment_id, schedule_type,
+                frequency, meter_interval, meter_unit, last_meter_reading, next_due_date,
+                next_due_meter, priority, estimated_duration, instructions, created_by)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', insert_rows)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    return summary
+
+
 def generate_pm_work_order_number():
     """Generate next PM work order number for scheduled maintenance"""
     conn = get_connection()
@@ -87,12 +263,14 @@ def dashboard():
     cursor = conn.cursor()
 
     today = datetime.now().strftime('%Y-%m-%d')
-    week_ahead = (datetime.now() + timedelta(days=7)).strftime('%Y-%m-%d')
 
     # Get all active schedules with equipment info and open work order status
     # Only consider work orders due today or earlier for Due Today display
     cursor.execute('''
         SELECT ms.*, e.tag_number, e.description as equipment_desc,
+               (SELECT reading_value FROM meter_readings mr
+                WHERE mr.equipment_id = ms.equipment_id
+                ORDER BY mr.recorded_at DESC LIMIT 1) as current_reading,
                wo.id as open_wo_id,
                wo.work_order_number as open_wo_number,
                wo.status as open_wo_status,
@@ -115,6 +293,7 @@ def dashboard():
             schedule = MaintenanceSchedule.from_row(row)
             schedule.equipment_tag = row['tag_number']
             schedule.equipment_desc = row['equipment_desc']
+            schedule.current_meter = row['current_reading']
             schedule.open_work_orders = []
             schedule_dict[schedule_id] = schedule
 
@@ -131,18 +310,20 @@ def dashboard():
     due_today = []
     upcoming = []
 
-    for schedule_id, schedule in schedule_dict.items():
+    # Classify every schedule in one pass instead of per-object date parsing
+    schedules = list(schedule_dict.values())
+    MaintenanceSchedule.annotate_statuses(schedules, [s.current_meter for s in schedules])
+
+    for schedule in schedules:
         # Check if any open work orders are overdue or due today
         has_overdue_wo = any(wo['due_date'] < today for wo in schedule.open_work_orders)
         has_due_today_wo = any(wo['due_date'] == today for wo in schedule.open_work_orders)
 
-        # Get latest meter reading for meter-based schedules
+        # Meter-based schedules are only shown once a meter reading exists
         if schedule.is_meter_based():
-            meter = get_latest_meter_reading(schedule.equipment_id)
-            if meter:
-                schedule.current_meter = meter['value']
+            if schedule.current_meter is not None:
                 # Check for overdue by meter or work order
-                if (schedule.next_due_meter and meter['value'] >= schedule.next_due_meter) or has_overdue_wo:
+                if schedule.overdue or has_overdue_wo:
                     overdue.append(schedule)
                 # Check for due today by work order
                 elif has_due_today_wo:
@@ -168,15 +349,15 @@ def dashboard():
             # Check next_due_date for additional categorization
             if schedule.next_due_date:
                 # Overdue by date (only if not already in overdue)
-                if schedule.next_due_date < today and not added_to_overdue:
+                if schedule.overdue and not added_to_overdue:
                     overdue.append(schedule)
                 # Due today by date - only if no open work orders exist
                 # (if open WOs exist, schedule shows in Overdue/Due Today by WO, not by date)
-                elif schedule.next_due_date == today and not added_to_due_today and not schedule.open_work_orders:
+                elif schedule.due_today and not added_to_due_today and not schedule.open_work_orders:
                     due_today.append(schedule)
                 # Upcoming - show if next_due_date is in the future within 7 days
                 # (only if no open work orders, otherwise handled by next_occurrence calculation)
-                elif today < schedule.next_due_date <= week_ahead and not schedule.open_work_orders:
+                elif schedule.due_soon and not schedule.due_today and not schedule.open_work_orders:
                     upcoming.append(schedule)
                     added_to_upcoming = True
 
@@ -194,7 +375,12 @@ def schedule_list():
     conn = get_connection()
     cursor = conn.cursor()
     cursor.execute('''
-        SELECT ms.*, e.tag_number, e.description as equipment_desc
+        SELECT ms.*, e.tag_number, e.description as equipment_desc,
+               CASE WHEN ms.schedule_type = 'meter-based' THEN
+                   (SELECT reading_value FROM meter_readings mr
+                    WHERE mr.equipment_id = ms.equipment_id
+                    ORDER BY mr.recorded_at DESC LIMIT 1)
+               END as current_reading
         FROM maintenance_schedules ms
         JOIN equipment e ON ms.equipment_id = e.id
         ORDER BY ms.status ASC, ms.name ASC
@@ -207,11 +393,152 @@ def schedule_list():
         schedule = MaintenanceSchedule.from_row(row)
         schedule.equipment_tag = row['tag_number']
         schedule.equipment_desc = row['equipment_desc']
+        schedule.current_meter = row['current_reading']
         schedules.append(schedule)
 
+    MaintenanceSchedule.annotate_statuses(schedules, [row['current_reading'] for row in rows])
+
     return render_template('modules/maintenance_schedule/list.html', schedules=schedules)
 
 
+@maintenance_schedules_bp.route('/api/status')
+@login_required
+def api_status():
+    """API endpoint returning due-status flags for all schedules as parallel ids/flags lists"""
+    days = request.args.get('days', 7, type=int)
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT ms.id, ms.schedule_type, ms.status, ms.next_due_date, ms.next_due_meter,
+               CASE WHEN ms.schedule_type = 'meter-based' THEN
+                   (SELECT reading_value FROM meter_readings mr
+                    WHERE mr.equipment_id = ms.equipment_id
+                    ORDER BY mr.recorded_at DESC LIMIT 1)
+               END as current_reading
+        FROM maintenance_schedules ms
+        ORDER BY ms.id
+    ''')
+    rows = cursor.fetchall()
+    conn.close()
+
+    flags = MaintenanceSchedule.classify_statuses(
+        [row['schedule_type'] for row in rows],
+        [row['status'] for row in rows],
+        [row['next_due_date'] for row in rows],
+        [row['next_due_meter'] for row in rows],
+        [row['current_reading'] for row in rows],
+        days=days)
+
+    return jsonify({
+        'ids': [row['id'] for row in rows],
+        'flags': flags,
+        'legend': {
+            'overdue': MaintenanceSchedule.FLAG_OVERDUE,
+            'due_today': MaintenanceSchedule.FLAG_DUE_TODAY,
+            'due_soon': MaintenanceSchedule.FLAG_DUE_SOON
+        }
+    })
+
+
+CALENDAR_MAX_DAYS = 366
+
+
+def get_calendar_occurrences(start_date, end_date, location='', equipment_id=None, priority=''):
+    """Occurrences of active time-based schedules between two dates, grouped by day and cached"""
+    return cached_query(('calendar', start_date, end_date, location, equipment_id, priority),
+                        ['maintenance_schedules', 'equipment'],
+                        lambda cursor: load_calendar_occurrences(cursor, start_date, end_date,
+                                                                 location, equipment_id, priority))
+
+
+def load_calendar_occurrences(cursor, start_date, end_date, location, equipment_id, priority):
+    """Query the schedules matching the filters and expand their occurrences in the window"""
+    query = '''
+        SELECT ms.id, ms.schedule_id, ms.name, ms.frequency, ms.priority, ms.next_due_date,
+               ms.equipment_id, e.tag_number as equipment_tag, e.location
+        FROM maintenance_schedules ms
+        LEFT JOIN equipment e ON ms.equipment_id = e.id
+        WHERE ms.status = 'Active' AND ms.schedule_type = 'time-based'
+          AND ms.next_due_date IS NOT NULL AND ms.next_due_date <= ?
+    '''
+    params = [end_date]
+    if location:
+        query += ' AND e.location = ?'
+        params.append(location)
+    if equipment_id:
+        query += ' AND ms.equipment_id = ?'
+        params.append(equipment_id)
+    if priority:
+        query += ' AND ms.priority = ?'
+        params.append(priority)
+    query += ' ORDER BY ms.next_due_date, ms.schedule_id'
+
+    cursor.execute(query, params)
+    rows = cursor.fetchall()
+
+    schedules = {}
+    days = {}
+    count = 0
+    for row in rows:
+        occurrences = MaintenanceSchedule.occurrences_between(
+            row['next_due_date'], row['frequency'], start_date, end_date)
+        if not occurrences:
+            continue
+        schedules[row['id']] = {
+            'schedule_id': row['schedule_id'],
+            'name': row['name'],
+            'frequency': row['frequency'],
+            'priority': row['priority'],
+            'equipment_id': row['equipment_id'],
+            'equipment_tag': row['equipment_tag'],
+            'location': row['location']
+        }
+        for day in occurrences:
+            days.setdefault(day, []).append(row['id'])
+        count += len(occurrences)
+
+    return {
+        'start': start_date,
+        'end': end_date,
+        'count': count,
+        'schedules': schedules,
+        'days': dict(sorted(days.items()))
+    }
+
+
+@maintenance_schedules_bp.route('/calendar')
+@login_required
+def calendar():
+    """Month/week calendar of planned preventive maintenance"""
+    return render_template('modules/maintenance_schedule/calendar.html',
+                           locations=get_active_locations(),
+                           equipment_list=get_all_equipment(),
+                           priorities=MaintenanceSchedule.PRIORITIES)
+
+
+@maintenance_schedules_bp.route('/api/calendar')
+@login_required
+def api_calendar():
+    """API endpoint listing schedule occurrences between start and end (YYYY-MM-DD)"""
+    try:
+        start = datetime.strptime(request.args.get('start', ''), '%Y-%m-%d').date()
+        end = datetime.strptime(request.args.get('end', ''), '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'error': 'start and end must be dates in YYYY-MM-DD format'}), 400
+
+    if end < start:
+        return jsonify({'error': 'end must not be before start'}), 400
+    if (end - start).days >= CALENDAR_MAX_DAYS:
+        return jsonify({'error': f'Window cannot exceed {CALENDAR_MAX_DAYS} days'}), 400
+
+    result = get_calendar_occurrences(start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d'),
+                                      location=request.args.get('location', '').strip(),
+                                      equipment_id=request.args.get('equipment_id', type=int),
+                                      priority=request.args.get('priority', '').strip())
+    return jsonify(result)
+
+
 @maintenance_schedules_bp.route('/add', methods=['GET', 'POST'])
 @login_required
 def add():
@@ -309,6 +636,84 @@ def add():
                            priorities=MaintenanceSchedule.PRIORITIES)
 
 
+@maintenance_schedules_bp.route('/bulk-create', methods=['GET', 'POST'])
+@login_required
+def bulk_create():
+    """Apply a schedule template to every equipment matching a filter"""
+    locations = get_active_locations()
+    summary = None
+
+    if request.method == 'POST':
+        location = request.form.get('location', '').strip()
+        search = request.form.get('search', '').strip()
+        template, error = parse_schedule_template(request.form)
+
+        if error:
+            flash(error, 'error')
+        else:
+            conn = get_connection()
+            cursor = conn.cursor()
+            equipment_rows = find_equipment_for_bulk(cursor, location, search)
+            conn.close()
+
+            if not equipment_rows:
+                flash('No active equipment matches the selected filter.', 'error')
+            else:
+                try:
+                    summary = bulk_create_schedules(template, [row['id'] for row in equipment_rows],
+                                                    current_user.id)
+                    flash(f'{len(summary["created"])} schedule(s) created, '
+                          f'{len(summary["skipped"])} equipment skipped.', 'success')
+                except Exception as e:
+                    flash(f'Error creating schedules: {str(e)}', 'error')
+
+    return render_template('modules/maintenance_schedule/bulk_create.html',
+                           locations=locations, summary=summary,
+                           schedule_types=MaintenanceSchedule.SCHEDULE_TYPES,
+                           frequencies=MaintenanceSchedule.FREQUENCIES,
+                           priorities=MaintenanceSchedule.PRIORITIES)
+
+
+@maintenance_schedules_bp.route('/api/bulk-create', methods=['POST'])
+@login_required
+def api_bulk_create():
+    """API endpoint to apply a schedule template to many equipment"""
+    # Body: {"template": {...}, "equipment_ids": [...]} or {"template": {...}, "filter": {"location", "search"}}
+    data = request.get_json(silent=True) or {}
+    template, error = parse_schedule_template(data.get('template') or {})
+    if error:
+        return jsonify({'error': error}), 400
+
+    equipment_ids = data.get('equipment_ids')
+    if equipment_ids is None:
+        equipment_filter = data.get('filter') or {}
+        conn = get_connection()
+        cursor = conn.cursor()
+        equipment_rows = find_equipment_for_bulk(cursor,
+                                                 str(equipment_filter.get('location', '')).strip(),
+                                                 str(equipment_filter.get('search', '')).strip())
+        conn.close()
+        equipment_ids = [row['id'] for row in equipment_rows]
+    else:
+        try:
+            equipment_ids = [int(equip_id) for equip_id in equipment_ids]
+        except (TypeError, ValueError):
+            return jsonify({'error': 'equipment_ids must be a list of integers'}), 400
+
+    try:
+        summary = bulk_create_schedules(template, equipment_ids, current_user.id)
+    except Exception as e:
+        return jsonify({'error': f'Error creating schedules: {str(e)}'}), 500
+
+    return jsonify({
+        'requested': summary['requested'],
+        'created_count': len(summary['created']),
+        'skipped_count': len(summary['skipped']),
+        'created': summary['created'],
+        'skipped': summary['skipped']
+    })
+
+
 @maintenance_schedules_bp.route('/view/<int:schedule_id>')
 @login_required
 def view_detail(schedule_id):
@@ -395,6 +800,8 @@ def change(schedule_id):
         estimated_duration = request.form.get('estimated_duration', '').strip()
         instructions = request.form.get('instructions', '').strip()
         status = request.form.get('status', 'Active').strip()
+        row_version = request.form.get('row_version', type=int)
+        original_values = parse_original_values(request.form.get('original_values'))
 
         # Validation
         if not name:
@@ -405,7 +812,8 @@ def change(schedule_id):
                                    schedule_types=MaintenanceSchedule.SCHEDULE_TYPES,
                                    frequencies=MaintenanceSchedule.FREQUENCIES,
                                    priorities=MaintenanceSchedule.PRIORITIES,
-                                   statuses=MaintenanceSchedule.STATUSES)
+                                   statuses=MaintenanceSchedule.STATUSES,
+                                   original_values=editable_values('maintenance_schedules', schedule))
 
         equipment_id = int(equipment_id) if equipment_id else schedule.equipment_id
         estimated_duration = int(estimated_duration) if estimated_duration else None
@@ -417,10 +825,19 @@ def change(schedule_id):
                 SET name = ?, description = ?, equipment_id = ?, schedule_type = ?,
                     frequency = ?, meter_interval = ?, meter_unit = ?, priority = ?,
                     estimated_duration = ?, instructions = ?, status = ?
-                WHERE id = ?
+                WHERE id = ? AND row_version = ?
             ''', (name, description or None, equipment_id, schedule_type,
                   frequency or None, meter_interval, meter_unit or None,
-                  priority, estimated_duration, instructions or None, status, schedule_id))
+                  priority, estimated_duration, instructions or None, status, schedule_id, row_version))
+
+            # Another edit saved first: nothing was written
+            if cursor.rowcount == 0:
+                conn.rollback()
+                _, fields = changed_fields(cursor, 'maintenance_schedules', schedule_id, original_values)
+                conn.close()
+                flash(conflict_message(f'Schedule "{schedule.name}"', fields), 'error')
+                return redirect(url_for('maintenance_schedules.change', schedule_id=schedule_id))
+
             conn.commit()
             conn.close()
             flash(f'Schedule "{name}" updated successfully.', 'success')
@@ -435,7 +852,8 @@ def change(schedule_id):
                            schedule_types=MaintenanceSchedule.SCHEDULE_TYPES,
                            frequencies=MaintenanceSchedule.FREQUENCIES,
                            priorities=MaintenanceSchedule.PRIORITIES,
-                           statuses=MaintenanceSchedule.STATUSES)
+                           statuses=MaintenanceSchedule.STATUSES,
+                           original_values=editable_values('maintenance_schedules', schedule))
 
 
 @maintenance_schedules_bp.route('/create-work-order/<int:schedule_id>', methods=['POST'])
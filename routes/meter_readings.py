@@ -1,6 +1,7 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required, current_user
 from database.init_db import get_connection
+from database.cache import cached_query
 from models.meter_reading import MeterReading
 from models.equipment import Equipment
 
@@ -9,12 +10,10 @@ meter_readings_bp = Blueprint('meter_readings', __name__, url_prefix='/meter-rea
 
 def get_all_equipment():
     """Fetch all active equipment for dropdown"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM equipment WHERE status = 'Active' ORDER BY tag_number")
-    rows = cursor.fetchall()
-    conn.close()
-    return [Equipment.from_row(row) for row in rows]
+    def load(cursor):
+        cursor.execute("SELECT * FROM equipment WHERE status = 'Active' ORDER BY tag_number")
+        return [Equipment.from_row(row) for row in cursor.fetchall()]
+    return list(cached_query('equipment:active', ['equipment'], load))
 
 
 @meter_readings_bp.route('/add', methods=['GET', 'POST'])
@@ -0,0 +1,92 @@
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask_login import login_required, current_user
+from database.init_db import get_connection
+
+notifications_bp = Blueprint('notifications', __name__, url_prefix='/notifications')
+
+NOTIFICATIONS_LIMIT = 100
+
+
+def fetch_notifications(user_id, unread_only=False, limit=NOTIFICATIONS_LIMIT):
+    """Latest notifications for a user, newest first"""
+    query = '''
+        SELECT n.*, wo.work_order_number FROM notifications n
+        LEFT JOIN work_orders wo ON n.work_order_id = wo.id
+        WHERE n.user_id = ?
+    '''
+    if unread_only:
+        query += ' AND n.read_at IS NULL'
+    query += ' ORDER BY n.id DESC LIMIT ?'
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(query, (user_id, limit))
+    rows = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return rows
+
+
+def count_unread(user_id):
+    """Number of unread notifications for a user (served by the user/read_at index)"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT COUNT(*) FROM notifications WHERE user_id = ? AND read_at IS NULL', (user_id,))
+    count = cursor.fetchone()[0]
+    conn.close()
+    return count
+
+
+@notifications_bp.app_context_processor
+def inject_unread_notifications():
+    """Unread count for the header bell on every page"""
+    if current_user.is_authenticated:
+        return {'unread_notifications': count_unread(current_user.id)}
+    return {'unread_notifications': 0}
+
+
+@notifications_bp.route('/')
+@login_required
+def index():
+    """In-app notifications for the current user"""
+    notifications = fetch_notifications(current_user.id)
+    return render_template('modules/notifications/index.html', notifications=notifications)
+
+
+@notifications_bp.route('/mark-read', methods=['POST'])
+@login_required
+def mark_read():
+    """Mark one notification (notification_id) or, when none is given, all of the user's notifications as read"""
+    notification_id = request.form.get('notification_id')
+    if notification_id is not None and not notification_id.strip().isdigit():
+        flash('Invalid notification.', 'error')
+        return redirect(url_for('notifications.index'))
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    if notification_id is not None:
+        cursor.execute('''
+            UPDATE notifications SET read_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND user_id = ? AND read_at IS NULL
+        ''', (int(notification_id), current_user.id))
+    else:
+        cursor.execute('''
+            UPDATE notifications SET read_at = CURRENT_TIMESTAMP
+            WHERE user_id = ? AND read_at IS NULL
+        ''', (current_user.id,))
+    conn.commit()
+    conn.close()
+
+    if notification_id is None:
+        flash('All notifications marked as read.', 'success')
+    return redirect(url_for('notifications.index'))
+
+
+@notifications_bp.route('/api')
+@login_required
+def api_notifications():
+    """API endpoint for the current user's notifications (unread=1 for unread only)"""
+    unread_only = request.args.get('unread') in ('1', 'true')
+    return jsonify({
+        'unread_count': count_unread(current_user.id),
+        'notifications': fetch_notifications(current_user.id, unread_only)
+    })
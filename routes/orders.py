@@ -1,6 +1,8 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required, current_user
 from database.init_db import get_connection
+from database.cache import cached_query
+from database.concurrency import editable_values, parse_original_values, changed_fields, conflict_message
 from models.vendor import Vendor
 from models.purchase_order import PurchaseOrder
 from models.purchase_order_line import PurchaseOrderLine
@@ -13,22 +15,10 @@ orders_bp = Blueprint('orders', __name__, url_prefix='/orders')
 
 def get_all_vendors():
     """Get all active vendors"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM vendors WHERE status = 'Active' ORDER BY name")
-    rows = cursor.fetchall()
-    conn.close()
-    return [Vendor.from_row(row) for row in rows]
-
-
-def get_all_spare_parts():
-    """Get all spare parts for dropdown"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM spare_parts ORDER BY id")
-    rows = cursor.fetchall()
-    conn.close()
-    return [SparePart.from_row(row) for row in rows]
+    def load(cursor):
+        cursor.execute("SELECT * FROM vendors WHERE status = 'Active' ORDER BY name")
+        return [Vendor.from_row(row) for row in cursor.fetchall()]
+    return list(cached_query('vendors:active', ['vendors'], load))
 
 
 def generate_po_number():
@@ -60,7 +50,6 @@ def index():
 def create():
     """Create a new purchase order"""
     vendors = get_all_vendors()
-    spare_parts = get_all_spare_parts()
     po_number = generate_po_number()
     today = datetime.now().strftime('%Y-%m-%d')
 
@@ -75,8 +64,7 @@ def create():
         if not vendor_id:
             flash('Please select a vendor.', 'error')
             return render_template('modules/orders/create.html',
-                                   vendors=vendors, spare_parts=spare_parts,
-                                   po_number=po_number, today=today)
+                                   vendors=vendors, po_number=po_number, today=today)
 
         try:
             line_items = json.loads(line_items_json)
@@ -86,8 +74,7 @@ def create():
         if len(line_items) == 0:
             flash('Please add at least one line item.', 'error')
             return render_template('modules/orders/create.html',
-                                   vendors=vendors, spare_parts=spare_parts,
-                                   po_number=po_number, today=today)
+                                   vendors=vendors, po_number=po_number, today=today)
 
         # Calculate total
         total_amount = sum(float(item.get('line_total', 0)) for item in line_items)
@@ -131,12 +118,10 @@ def create():
         except Exception as e:
             flash(f'Error creating purchase order: {str(e)}', 'error')
             return render_template('modules/orders/create.html',
-                                   vendors=vendors, spare_parts=spare_parts,
-                                   po_number=po_number, today=today)
+                                   vendors=vendors, po_number=po_number, today=today)
 
     return render_template('modules/orders/create.html',
-                           vendors=vendors, spare_parts=spare_parts,
-                           po_number=po_number, today=today,
+                           vendors=vendors, po_number=po_number, today=today,
                            ordering_units=PurchaseOrderLine.ORDERING_UNITS)
 
 
@@ -229,7 +214,6 @@ def change(po_id):
         return redirect(url_for('orders.view_detail', po_id=po_id))
 
     vendors = get_all_vendors()
-    spare_parts = get_all_spare_parts()
 
     if request.method == 'POST':
         vendor_id = request.form.get('vendor_id', '').strip()
@@ -237,6 +221,8 @@ def change(po_id):
         expected_delivery_date = request.form.get('expected_delivery_date', '').strip()
         notes = request.form.get('notes', '').strip()
         line_items_json = request.form.get('line_items', '[]')
+        row_version = request.form.get('row_version', type=int)
+        original_values = parse_original_values(request.form.get('original_values'))
 
         if not vendor_id:
             flash('Please select a vendor.', 'error')
@@ -253,8 +239,9 @@ def change(po_id):
             line_items = [PurchaseOrderLine.from_row(row) for row in line_rows]
             return render_template('modules/orders/change.html',
                                    po=purchase_order, vendors=vendors,
-                                   spare_parts=spare_parts, line_items=line_items,
-                                   ordering_units=PurchaseOrderLine.ORDERING_UNITS)
+                                   line_items=line_items,
+                                   ordering_units=PurchaseOrderLine.ORDERING_UNITS,
+                                   original_values=editable_values('purchase_orders', purchase_order))
 
         try:
             line_items = json.loads(line_items_json)
@@ -275,21 +262,29 @@ def change(po_id):
             existing_lines = [PurchaseOrderLine.from_row(row) for row in line_rows]
             return render_template('modules/orders/change.html',
                                    po=purchase_order, vendors=vendors,
-                                   spare_parts=spare_parts, line_items=existing_lines,
-                                   ordering_units=PurchaseOrderLine.ORDERING_UNITS)
+                                   line_items=existing_lines,
+                                   ordering_units=PurchaseOrderLine.ORDERING_UNITS,
+                                   original_values=editable_values('purchase_orders', purchase_order))
 
         # Calculate total
         total_amount = sum(float(item.get('line_total', 0)) for item in line_items)
 
         try:
-            # Update purchase order header
+            # Update purchase order header, only over the version the editor loaded
             cursor.execute('''
                 UPDATE purchase_orders
                 SET vendor_id = ?, order_date = ?, expected_delivery_date = ?,
                     total_amount = ?, notes = ?
-                WHERE id = ?
+                WHERE id = ? AND row_version = ?
             ''', (vendor_id, order_date, expected_delivery_date or None,
-                  total_amount, notes or None, po_id))
+                  total_amount, notes or None, po_id, row_version))
+
+            if cursor.rowcount == 0:
+                conn.rollback()
+                _, fields = changed_fields(cursor, 'purchase_orders', po_id, original_values)
+                conn.close()
+                flash(conflict_message(f'Purchase Order {purchase_order.po_number}', fields), 'error')
+                return redirect(url_for('orders.change', po_id=po_id))
 
             # Delete existing line items
             cursor.execute('DELETE FROM purchase_order_lines WHERE purchase_order_id = ?', (po_id,))
@@ -335,8 +330,9 @@ def change(po_id):
 
     return render_template('modules/orders/change.html',
                            po=purchase_order, vendors=vendors,
-                           spare_parts=spare_parts, line_items=line_items,
-                           ordering_units=PurchaseOrderLine.ORDERING_UNITS)
+                           line_items=line_items,
+                           ordering_units=PurchaseOrderLine.ORDERING_UNITS,
+                           original_values=editable_values('purchase_orders', purchase_order))
 
 
 @orders_bp.route('/api/spare-part/<int:part_id>')
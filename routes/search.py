@@ -0,0 +1,341 @@
+from flask import Blueprint, render_template, request, jsonify, url_for
+from flask_login import login_required
+from markupsafe import Markup, escape
+from database.init_db import get_connection, TYPEAHEAD_INDEXES, SEARCH_INDEXES
+import re
+
+search_bp = Blueprint('search', __name__, url_prefix='/search')
+
+TYPEAHEAD_LIMIT = 15
+TYPEAHEAD_MAX_LIMIT = 50
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+
+# Omnibox entities: FTS index, bm25 column weights, columns shown as the title,
+# a detail line from the source row, and the detail page for a hit
+SEARCH_ENTITIES = {
+    'work_orders': {
+        'label': 'Work Orders',
+        'index': 'search_work_orders',
+        'weights': (10.0, 5.0, 1.0),
+        'title_columns': [0, 1],
+        'detail': "t.status || ' / ' || t.priority",
+        'endpoint': 'work_orders.view_detail',
+        'id_arg': 'wo_id'
+    },
+    'equipment': {
+        'label': 'Equipment',
+        'index': 'search_equipment',
+        'weights': (10.0, 5.0, 2.0, 2.0, 2.0, 1.0),
+        'title_columns': [0, 1],
+        'detail': "COALESCE(t.location, '') || ' / ' || COALESCE(t.status, '')",
+        'endpoint': 'equipment.view_detail',
+        'id_arg': 'equip_id'
+    },
+    'spare_parts': {
+        'label': 'Spare Parts',
+        'index': 'search_spare_parts',
+        'weights': (10.0, 5.0, 1.0, 1.0),
+        'title_columns': [0],
+        'detail': "'Available: ' || COALESCE(t.quantity_available, 0)",
+        'endpoint': 'spare_parts.view_detail',
+        'id_arg': 'part_id'
+    },
+    'vendors': {
+        'label': 'Vendors',
+        'index': 'search_vendors',
+        'weights': (10.0, 10.0, 2.0, 1.0, 1.0),
+        'title_columns': [0, 1],
+        'detail': "COALESCE(t.status, '')",
+        'endpoint': 'vendors.view_detail',
+        'id_arg': 'vendor_id'
+    },
+    'purchase_orders': {
+        'label': 'Purchase Orders',
+        'index': 'search_purchase_orders',
+        'weights': (10.0, 1.0),
+        'title_columns': [0],
+        'detail': "t.status || COALESCE(' / ' || t.order_date, '')",
+        'endpoint': 'orders.view_detail',
+        'id_arg': 'po_id'
+    },
+}
+
+
+def spare_part_result(row):
+    """Typeahead entry for a spare part"""
+    return {
+        'id': row['id'],
+        'label': f"{row['description']} (Available: {row['quantity_available'] or 0})",
+        'detail': ' / '.join(value for value in [row['vendor_description'], row['storage_bin']] if value),
+        'data': {
+            'desc': row['description'],
+            'vendorDesc': row['vendor_description'] or '',
+            'avail': row['quantity_available'] or 0
+        }
+    }
+
+
+def equipment_result(row):
+    """Typeahead entry for a piece of equipment"""
+    return {
+        'id': row['id'],
+        'label': f"{row['tag_number']} - {row['description']}",
+        'detail': row['location'] or '',
+        'data': {'location': row['location'] or ''}
+    }
+
+
+def user_result(row):
+    """Typeahead entry for a user"""
+    return {
+        'id': row['id'],
+        'label': f"{row['username']} ({row['role']})",
+        'detail': '',
+        'data': {}
+    }
+
+
+# Endpoint name -> index, source table, selected columns, prefix-ranked column, result builder
+TYPEAHEAD_SOURCES = {
+    'spare-parts': {
+        'index': 'typeahead_spare_parts',
+        'select': 't.id, t.description, t.vendor_description, t.storage_bin, t.quantity_available',
+        'prefix_column': 't.description',
+        'build': spare_part_result
+    },
+    'equipment': {
+        'index': 'typeahead_equipment',
+        'select': 't.id, t.tag_number, t.description, t.location, t.status',
+        'prefix_column': 't.tag_number',
+        'build': equipment_result
+    },
+    'users': {
+        'index': 'typeahead_users',
+        'select': 't.id, t.username, t.role',
+        'prefix_column': 't.username',
+        'build': user_result
+    },
+}
+
+
+def typeahead_index_exists(cursor, index_name):
+    """Check whether the trigram index was created (needs FTS5 with the trigram tokenizer)"""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (index_name,))
+    return cursor.fetchone() is not None
+
+
+def typeahead_search(source_name, term, limit=TYPEAHEAD_LIMIT, extra_where='', extra_params=()):
+    """Top matches for a typeahead box, from the trigram index or a LIKE search for short terms"""
+    source = TYPEAHEAD_SOURCES[source_name]
+    index_name = source['index']
+    table, columns = TYPEAHEAD_INDEXES[index_name]
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    if len(term) >= 3 and typeahead_index_exists(cursor, index_name):
+        cursor.execute(f'''
+            SELECT {source['select']}
+            FROM {index_name}
+            JOIN {table} t ON t.id = {index_name}.rowid
+            WHERE {index_name} MATCH ? {extra_where}
+            ORDER BY {source['prefix_column']} LIKE ? ESCAPE '\\' DESC, {index_name}.rank
+            LIMIT ?
+        ''', ['"' + term.replace('"', '""') + '"', *extra_params, f'{escaped}%', limit])
+    else:
+        matches = ' OR '.join(f"t.{column} LIKE ? ESCAPE '\\'" for column in columns)
+        cursor.execute(f'''
+            SELECT {source['select']}
+            FROM {table} t
+            WHERE ({matches}) {extra_where}
+            ORDER BY {source['prefix_column']} LIKE ? ESCAPE '\\' DESC, {source['prefix_column']}
+            LIMIT ?
+        ''', [f'%{escaped}%'] * len(columns) + [*extra_params, f'{escaped}%', limit])
+
+    rows = cursor.fetchall()
+    conn.close()
+    return [source['build'](row) for row in rows]
+
+
+def typeahead_args():
+    """Read the search term and result limit from request args"""
+    term = request.args.get('q', '').strip()
+    limit = request.args.get('limit', TYPEAHEAD_LIMIT, type=int)
+    return term, max(1, min(limit, TYPEAHEAD_MAX_LIMIT))
+
+
+@search_bp.route('/api/spare-parts')
+@login_required
+def api_spare_parts():
+    """Typeahead over spare part description, vendor description and storage bin"""
+    term, limit = typeahead_args()
+    if not term:
+        return jsonify({'results': []})
+    return jsonify({'results': typeahead_search('spare-parts', term, limit)})
+
+
+@search_bp.route('/api/equipment')
+@login_required
+def api_equipment():
+    """Typeahead over equipment tag number and description (active=1 limits to active equipment)"""
+    term, limit = typeahead_args()
+    if not term:
+        return jsonify({'results': []})
+    if request.args.get('active'):
+        results = typeahead_search('equipment', term, limit, "AND t.status = 'Active'")
+    else:
+        results = typeahead_search('equipment', term, limit)
+    return jsonify({'results': results})
+
+
+@search_bp.route('/api/users')
+@login_required
+def api_users():
+    """Typeahead over usernames"""
+    term, limit = typeahead_args()
+    if not term:
+        return jsonify({'results': []})
+    return jsonify({'results': typeahead_search('users', term, limit)})
+
+
+def build_match_query(term):
+    """Turn free text into an FTS5 query: every word quoted and required, the last as a prefix"""
+    words = [word for word in re.findall(r'[^\s"]+', term) if re.search(r'\w', word)]
+    if not words:
+        return None
+    quoted = [f'"{word}"' for word in words]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def highlighted(text):
+    """Escape FTS highlight() output and turn its match markers into <mark> tags"""
+    return Markup(str(escape(text or '')).replace('\x02', '<mark>').replace('\x03', '</mark>'))
+
+
+def available_search_entities(cursor, entity=None):
+    """Entities whose search index exists, optionally narrowed to one entity"""
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name IN ({})".format(
+        ','.join('?' * len(SEARCH_INDEXES))), list(SEARCH_INDEXES))
+    existing = {row['name'] for row in cursor.fetchall()}
+    return [name for name, config in SEARCH_ENTITIES.items()
+            if config['index'] in existing and (entity is None or name == entity)]
+
+
+def global_search(term, entity=None, page=1, per_page=SEARCH_PAGE_SIZE):
+    """Rank matches across every search index and return one page of hits with facets"""
+    match = build_match_query(term)
+    result = {'query': term, 'entity': entity, 'page': page, 'per_page': per_page,
+              'total': 0, 'facets': [], 'results': []}
+    if match is None:
+        return result
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    names = available_search_entities(cursor)
+
+    # Facets: hit counts per entity, always over every entity
+    facet_counts = {}
+    if names:
+        cursor.execute(' UNION ALL '.join(
+            f"SELECT '{name}' as entity, COUNT(*) as hits FROM {SEARCH_ENTITIES[name]['index']} "
+            f"WHERE {SEARCH_ENTITIES[name]['index']} MATCH ?" for name in names
+        ), [match] * len(names))
+        facet_counts = {row['entity']: row['hits'] for row in cursor.fetchall()}
+    result['facets'] = [{'entity': name, 'label': SEARCH_ENTITIES[name]['label'],
+                         'count': facet_counts[name]}
+                        for name in names if facet_counts[name]]
+
+    selected = [name for name in names if entity is None or name == entity]
+    result['total'] = sum(facet_counts.get(name, 0) for name in selected)
+    if not result['total']:
+        conn.close()
+        return result
+
+    # Page of hits ranked by bm25 (lower is better) across the selected entities
+    ranked = []
+    for name in selected:
+        config = SEARCH_ENTITIES[name]
+        weights = ', '.join(str(weight) for weight in config['weights'])
+        ranked.append(f"SELECT '{name}' as entity, rowid as id, bm25({config['index']}, {weights}) as score "
+                      f"FROM {config['index']} WHERE {config['index']} MATCH ?")
+    cursor.execute(f'''
+        SELECT entity, id, score FROM ({' UNION ALL '.join(ranked)})
+        ORDER BY score, entity, id
+        LIMIT ? OFFSET ?
+    ''', [match] * len(selected) + [per_page, (page - 1) * per_page])
+    page_rows = cursor.fetchall()
+
+    # Highlight and describe only the hits on this page
+    details = {}
+    for name in {row['entity'] for row in page_rows}:
+        config = SEARCH_ENTITIES[name]
+        index_name = config['index']
+        table, columns = SEARCH_INDEXES[index_name]
+        ids = [row['id'] for row in page_rows if row['entity'] == name]
+        titles = " || ' - ' || ".join(f'highlight({index_name}, {column}, char(2), char(3))'
+                                      for column in config['title_columns'])
+        cursor.execute(f'''
+            SELECT t.id, {titles} as title,
+                   snippet({index_name}, -1, char(2), char(3), '...', 16) as snippet,
+                   {config['detail']} as detail
+            FROM {index_name}
+            JOIN {table} t ON t.id = {index_name}.rowid
+            WHERE {index_name} MATCH ? AND {index_name}.rowid IN ({','.join('?' * len(ids))})
+        ''', [match] + ids)
+        for row in cursor.fetchall():
+            details[(name, row['id'])] = row
+
+    conn.close()
+
+    for row in page_rows:
+        detail = details.get((row['entity'], row['id']))
+        if detail is None:
+            continue
+        config = SEARCH_ENTITIES[row['entity']]
+        result['results'].append({
+            'entity': row['entity'],
+            'entity_label': config['label'],
+            'id': row['id'],
+            'title': highlighted(detail['title']),
+            'snippet': highlighted(detail['snippet']),
+            'detail': detail['detail'] or '',
+            'url': url_for(config['endpoint'], **{config['id_arg']: row['id']}),
+            'score': row['score']
+        })
+    return result
+
+
+def search_args():
+    """Read the omnibox query, entity facet and page from request args"""
+    term = request.args.get('q', '').strip()
+    entity = request.args.get('entity', '').strip() or None
+    if entity not in SEARCH_ENTITIES:
+        entity = None
+    page = max(1, request.args.get('page', 1, type=int))
+    per_page = request.args.get('per_page', SEARCH_PAGE_SIZE, type=int)
+    return term, entity, page, max(1, min(per_page, SEARCH_MAX_PAGE_SIZE))
+
+
+@search_bp.route('/')
+@login_required
+def index():
+    """Global search results page"""
+    term, entity, page, per_page = search_args()
+    result = global_search(term, entity, page, per_page)
+    return render_template('modules/search/index.html', result=result,
+                           entities=SEARCH_ENTITIES)
+
+
+@search_bp.route('/api')
+@login_required
+def api_search():
+    """Global search: ranked hits with per-entity facets and highlighted matches"""
+    term, entity, page, per_page = search_args()
+    result = global_search(term, entity, page, per_page)
+    for item in result['results']:
+        item['title'] = str(item['title'])
+        item['snippet'] = str(item['snippet'])
+    return jsonify(result)
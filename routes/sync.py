@@ -0,0 +1,258 @@
+from flask import Blueprint, request, jsonify
+from flask_login import login_required, current_user
+from database.init_db import get_connection, SYNC_TABLES
+from models.work_order import WorkOrder
+from models.spare_part import SparePart
+from models.equipment import Equipment
+from routes.work_orders import issue_stock
+from datetime import datetime
+import json
+
+sync_bp = Blueprint('sync', __name__, url_prefix='/sync')
+
+SYNC_PAGE_SIZE = 500
+SYNC_MAX_PAGE_SIZE = 2000
+SYNC_MAX_UPLOAD = 500
+
+SYNC_MODELS = {
+    'work_orders': WorkOrder,
+    'spare_parts': SparePart,
+    'equipment': Equipment,
+}
+
+
+def fetch_changes(since, limit):
+    """Read synced rows and tombstones changed after since; returns (version, has_more, changes, deleted)"""
+    # A cut-short page resumes at the lowest version reached, so some rows may be sent twice (devices upsert)
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute('BEGIN')
+        cursor.execute("SELECT version FROM data_versions WHERE table_name = 'sync'")
+        version = cursor.fetchone()['version']
+
+        changes = {}
+        resume_at = []
+        for table in SYNC_TABLES:
+            cursor.execute(f'''
+                SELECT * FROM {table}
+                WHERE change_version > ? AND change_version <= ?
+                ORDER BY change_version
+                LIMIT ?
+            ''', (since, version, limit + 1))
+            rows = cursor.fetchall()
+            if len(rows) > limit:
+                rows = rows[:limit]
+                resume_at.append(rows[-1]['change_version'])
+            items = []
+            for row in rows:
+                item = SYNC_MODELS[table].from_row(row).to_dict()
+                item['change_version'] = row['change_version']
+                items.append(item)
+            changes[table] = items
+
+        cursor.execute('''
+            SELECT table_name, row_id, change_version FROM sync_deletions
+            WHERE change_version > ? AND change_version <= ?
+            ORDER BY change_version
+            LIMIT ?
+        ''', (since, version, limit + 1))
+        rows = cursor.fetchall()
+        if len(rows) > limit:
+            rows = rows[:limit]
+            resume_at.append(rows[-1]['change_version'])
+        deleted = {table: [] for table in SYNC_TABLES}
+        for row in rows:
+            deleted[row['table_name']].append(row['row_id'])
+    finally:
+        conn.rollback()
+        conn.close()
+
+    if resume_at:
+        return min(resume_at), True, changes, deleted
+    return version, False, changes, deleted
+
+
+@sync_bp.route('/api/changes')
+@login_required
+def api_changes():
+    """API endpoint for device delta sync: changes since a version (0 for a full sync)"""
+    since = request.args.get('since', 0, type=int)
+    limit = max(1, min(request.args.get('limit', SYNC_PAGE_SIZE, type=int), SYNC_MAX_PAGE_SIZE))
+
+    version, has_more, changes, deleted = fetch_changes(max(since, 0), limit)
+
+    response = {'since': since, 'version': version, 'has_more': has_more, 'deleted': deleted}
+    response.update(changes)
+    return jsonify(response)
+
+
+def parse_offline_timestamp(value):
+    """Normalize a device timestamp to 'YYYY-MM-DD HH:MM:SS'; None when absent, ValueError when invalid"""
+    if value in (None, ''):
+        return None
+    return datetime.fromisoformat(str(value).replace('Z', '')).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def parse_upload_lines(raw_lines, fields):
+    """Validate one list of offline operations; raises ValueError naming the bad line"""
+    if raw_lines is None:
+        return []
+    if not isinstance(raw_lines, list):
+        raise ValueError('must be a list')
+
+    lines = []
+    for index, raw in enumerate(raw_lines):
+        if not isinstance(raw, dict):
+            raise ValueError(f'line {index} must be an object')
+        client_id = str(raw.get('client_id') or '').strip()
+        if not client_id or len(client_id) > 100:
+            raise ValueError(f'line {index}: client_id is required (max 100 characters)')
+        line = {'client_id': client_id, 'notes': str(raw.get('notes') or '').strip()}
+        for field, positive in fields.items():
+            try:
+                line[field] = int(raw.get(field))
+            except (TypeError, ValueError):
+                raise ValueError(f'line {index}: {field} must be an integer')
+            if line[field] < (1 if positive else 0):
+                raise ValueError(f'line {index}: {field} must be {"positive" if positive else "zero or more"}')
+        try:
+            line['recorded_at'] = parse_offline_timestamp(raw.get('recorded_at'))
+        except ValueError:
+            raise ValueError(f'line {index}: recorded_at must be an ISO date/time')
+        line['reading_unit'] = str(raw.get('reading_unit') or '').strip()
+        lines.append(line)
+    return lines
+
+
+def apply_offline_uploads(goods_issues, meter_readings, user_id):
+    """Apply goods issues and meter readings recorded offline in one transaction, once per client_id"""
+    client_ids = [line['client_id'] for line in goods_issues + meter_readings]
+    wo_ids = sorted({line['work_order_id'] for line in goods_issues})
+    equipment_ids = sorted({line['equipment_id'] for line in meter_readings})
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute('BEGIN IMMEDIATE')
+
+        applied = {}
+        if client_ids:
+            cursor.execute(f'''
+                SELECT client_id, result FROM sync_uploads
+                WHERE client_id IN ({','.join('?' * len(client_ids))})
+            ''', client_ids)
+            applied = {row['client_id']: json.loads(row['result']) for row in cursor.fetchall()}
+
+        wo_status = {}
+        if wo_ids:
+            cursor.execute(f'''
+                SELECT id, status FROM work_orders WHERE id IN ({','.join('?' * len(wo_ids))})
+            ''', wo_ids)
+            wo_status = {row['id']: row['status'] for row in cursor.fetchall()}
+
+        known_equipment = set()
+        if equipment_ids:
+            cursor.execute(f'''
+                SELECT id FROM equipment WHERE id IN ({','.join('?' * len(equipment_ids))})
+            ''', equipment_ids)
+            known_equipment = {row['id'] for row in cursor.fetchall()}
+
+        def record(line, upload_type, result):
+            applied[line['client_id']] = result
+            cursor.execute('''
+                INSERT INTO sync_uploads (client_id, upload_type, result, uploaded_by)
+                VALUES (?, ?, ?, ?)
+            ''', (line['client_id'], upload_type, json.dumps(result), user_id))
+
+        issue_results = []
+        for line in goods_issues:
+            if line['client_id'] in applied:
+                issue_results.append(dict(applied[line['client_id']], status='duplicate'))
+                continue
+            status = wo_status.get(line['work_order_id'])
+            if status is None:
+                issue_results.append({'client_id': line['client_id'], 'status': 'error',
+                                      'error': 'Work Order not found.'})
+                continue
+            if status in ['Completed', 'Cancelled']:
+                issue_results.append({'client_id': line['client_id'], 'status': 'error',
+                                      'error': f'Cannot issue parts to a {status} work order.'})
+                continue
+            cost_per_unit = issue_stock(cursor, line['spare_part_id'], line['quantity'])
+            if cost_per_unit is None:
+                issue_results.append({'client_id': line['client_id'], 'status': 'error',
+                                      'error': 'Spare part not found or insufficient stock.'})
+                continue
+            cursor.execute('''
+                INSERT INTO work_order_parts (work_order_id, spare_part_id, quantity, transaction_type,
+                                              transacted_by, transacted_at, notes, cost_per_unit)
+                VALUES (?, ?, ?, 'issue', ?, COALESCE(?, CURRENT_TIMESTAMP), ?, ?)
+            ''', (line['work_order_id'], line['spare_part_id'], line['quantity'], user_id,
+                  line['recorded_at'], line['notes'] or None, cost_per_unit))
+            result = {'client_id': line['client_id'], 'status': 'applied',
+                      'work_order_part_id': cursor.lastrowid, 'cost_per_unit': cost_per_unit}
+            record(line, 'goods_issue', result)
+            issue_results.append(result)
+
+        reading_results = []
+        for line in meter_readings:
+            if line['client_id'] in applied:
+                reading_results.append(dict(applied[line['client_id']], status='duplicate'))
+                continue
+            if line['equipment_id'] not in known_equipment:
+                reading_results.append({'client_id': line['client_id'], 'status': 'error',
+                                        'error': 'Equipment not found.'})
+                continue
+            cursor.execute('''
+                INSERT INTO meter_readings (equipment_id, reading_value, reading_unit, recorded_by,
+                                            recorded_at, notes)
+                VALUES (?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP), ?)
+            ''', (line['equipment_id'], line['reading_value'], line['reading_unit'] or None, user_id,
+                  line['recorded_at'], line['notes'] or None))
+            result = {'client_id': line['client_id'], 'status': 'applied', 'meter_reading_id': cursor.lastrowid}
+            record(line, 'meter_reading', result)
+            reading_results.append(result)
+
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    return issue_results, reading_results
+
+
+@sync_bp.route('/api/upload', methods=['POST'])
+@login_required
+def api_upload():
+    """API endpoint for uploading work recorded offline"""
+    # Body: {"goods_issues": [{client_id, work_order_id, spare_part_id, quantity, notes, recorded_at}],
+    #        "meter_readings": [{client_id, equipment_id, reading_value, reading_unit, notes, recorded_at}]}
+    data = request.get_json(silent=True) or {}
+    try:
+        goods_issues = parse_upload_lines(data.get('goods_issues'),
+                                          {'work_order_id': True, 'spare_part_id': True, 'quantity': True})
+    except ValueError as e:
+        return jsonify({'error': f'goods_issues: {e}'}), 400
+    try:
+        meter_readings = parse_upload_lines(data.get('meter_readings'),
+                                            {'equipment_id': True, 'reading_value': False})
+    except ValueError as e:
+        return jsonify({'error': f'meter_readings: {e}'}), 400
+
+    if not goods_issues and not meter_readings:
+        return jsonify({'error': 'Nothing to upload'}), 400
+    if len(goods_issues) + len(meter_readings) > SYNC_MAX_UPLOAD:
+        return jsonify({'error': f'At most {SYNC_MAX_UPLOAD} operations per upload'}), 400
+
+    try:
+        issue_results, reading_results = apply_offline_uploads(goods_issues, meter_readings, current_user.id)
+    except Exception as e:
+        return jsonify({'error': f'Error applying upload: {str(e)}'}), 500
+
+    return jsonify({
+        'goods_issues': issue_results,
+        'meter_readings': reading_results
+    })
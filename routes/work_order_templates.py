@@ -0,0 +1,391 @@
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask_login import login_required, current_user
+from database.init_db import get_connection
+from models.work_order import WorkOrder
+from models.work_order_template import WorkOrderTemplate
+from routes.work_orders import get_active_locations, allocate_work_order_numbers, issue_stock
+from routes.maintenance_schedules import find_equipment_for_bulk
+from database.escalation import escalation_engine
+from datetime import datetime, timedelta
+
+work_order_templates_bp = Blueprint('work_order_templates', __name__, url_prefix='/work-orders/templates')
+
+# Blank part rows offered on the template form
+TEMPLATE_PART_ROWS = 3
+
+
+def load_template(cursor, template_id):
+    """Fetch a template with its assignee name and default parts. Returns (template, parts)"""
+    cursor.execute('''
+        SELECT t.*, u.username as assigned_to_name
+        FROM work_order_templates t
+        LEFT JOIN users u ON t.assigned_to = u.id
+        WHERE t.id = ?
+    ''', (template_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return None, []
+    template = WorkOrderTemplate.from_row(row)
+    template.assigned_to_name = row['assigned_to_name']
+
+    cursor.execute('''
+        SELECT tp.spare_part_id, tp.quantity, sp.description, sp.quantity_available
+        FROM work_order_template_parts tp
+        JOIN spare_parts sp ON tp.spare_part_id = sp.id
+        WHERE tp.template_id = ?
+        ORDER BY tp.id
+    ''', (template_id,))
+    parts = [dict(row) for row in cursor.fetchall()]
+    return template, parts
+
+
+def parse_template_form(form):
+    """Validate template fields and default parts from a form. Returns (template, parts, error)"""
+    template = {
+        'name': form.get('name', '').strip(),
+        'title': form.get('title', '').strip(),
+        'description': form.get('description', '').strip(),
+        'priority': form.get('priority', 'Medium').strip() or 'Medium',
+        'assigned_to': form.get('assigned_to', '').strip(),
+        'due_in_days': form.get('due_in_days', '').strip(),
+    }
+
+    if not template['name']:
+        return None, None, 'Template name is required.'
+    if not template['title']:
+        return None, None, 'Work order title is required.'
+    if template['priority'] not in WorkOrder.PRIORITIES:
+        return None, None, 'Invalid priority.'
+    template['assigned_to'] = int(template['assigned_to']) if template['assigned_to'].isdigit() else None
+    if template['due_in_days']:
+        if not template['due_in_days'].isdigit():
+            return None, None, 'Due in days must be a whole number.'
+        template['due_in_days'] = int(template['due_in_days'])
+    else:
+        template['due_in_days'] = None
+
+    # Quantities of a part listed twice are added together
+    parts = {}
+    for part_id, qty in zip(form.getlist('part_id'), form.getlist('part_qty')):
+        part_id = part_id.strip()
+        qty = qty.strip()
+        if not part_id:
+            continue
+        if not part_id.isdigit() or not qty.isdigit() or int(qty) <= 0:
+            return None, None, 'Each default part needs a positive whole quantity.'
+        parts[int(part_id)] = parts.get(int(part_id), 0) + int(qty)
+
+    return template, list(parts.items()), None
+
+
+def save_template(cursor, template_id, template, parts, user_id):
+    """Insert or update a template and replace its default parts. Returns the template id"""
+    if template_id is None:
+        cursor.execute('''
+            INSERT INTO work_order_templates (name, title, description, priority, assigned_to,
+                                              due_in_days, created_by)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (template['name'], template['title'], template['description'] or None, template['priority'],
+              template['assigned_to'], template['due_in_days'], user_id))
+        template_id = cursor.lastrowid
+    else:
+        cursor.execute('''
+            UPDATE work_order_templates
+            SET name = ?, title = ?, description = ?, priority = ?, assigned_to = ?, due_in_days = ?
+            WHERE id = ?
+        ''', (template['name'], template['title'], template['description'] or None, template['priority'],
+              template['assigned_to'], template['due_in_days'], template_id))
+        cursor.execute('DELETE FROM work_order_template_parts WHERE template_id = ?', (template_id,))
+
+    cursor.executemany('''
+        INSERT INTO work_order_template_parts (template_id, spare_part_id, quantity)
+        VALUES (?, ?, ?)
+    ''', [(template_id, part_id, qty) for part_id, qty in parts])
+    return template_id
+
+
+def instantiate_template(template_id, equipment_ids, user_id, due_date=None, issue_parts=False):
+    """Create one work order from a template per Active equipment in one transaction"""
+    summary = {'requested': len(equipment_ids), 'created': [], 'skipped': [], 'parts_issued': 0}
+    if not equipment_ids:
+        return summary
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        # Take the write lock up front so the number block cannot be handed out twice
+        cursor.execute('BEGIN IMMEDIATE')
+
+        template, parts = load_template(cursor, template_id)
+        if template is None:
+            raise ValueError('Template not found.')
+
+        placeholders = ','.join('?' * len(equipment_ids))
+        cursor.execute(f'''
+            SELECT id, tag_number, location FROM equipment
+            WHERE id IN ({placeholders}) AND status = 'Active'
+            ORDER BY tag_number
+        ''', list(equipment_ids))
+        targets = cursor.fetchall()
+        found = {row['id'] for row in targets}
+        summary['skipped'] = [equip_id for equip_id in equipment_ids if equip_id not in found]
+        if not targets:
+            conn.rollback()
+            return summary
+
+        if not due_date and template.due_in_days is not None:
+            due_date = (datetime.now() + timedelta(days=template.due_in_days)).strftime('%Y-%m-%d')
+
+        numbers = allocate_work_order_numbers(cursor, len(targets))
+        cursor.execute('SELECT COALESCE(MAX(id), 0) FROM work_orders')
+        last_id = cursor.fetchone()[0]
+
+        insert_rows = []
+        for number, target in zip(numbers, targets):
+            insert_rows.append((number, template.title, template.description, target['id'],
+                                target['location'], template.priority, template.assigned_to,
+                                user_id, due_date or None))
+            summary['created'].append({'work_order_number': number, 'tag_number': target['tag_number']})
+
+        cursor.executemany('''
+            INSERT INTO work_orders (work_order_number, title, description, equipment_id,
+                                     location_code, priority, status, assigned_to, created_by, due_date)
+            VALUES (?, ?, ?, ?, ?, ?, 'Open', ?, ?, ?)
+        ''', insert_rows)
+
+        if issue_parts and parts:
+            # The write lock is held, so every row above last_id is one of ours
+            cursor.execute('SELECT id FROM work_orders WHERE id > ? ORDER BY id', (last_id,))
+            wo_ids = [row['id'] for row in cursor.fetchall()]
+
+            issue_rows = []
+            for part in parts:
+                total = part['quantity'] * len(wo_ids)
+                cost_per_unit = issue_stock(cursor, part['spare_part_id'], total)
+                if cost_per_unit is None:
+                    raise ValueError(f'Insufficient stock of "{part["description"]}": {total} needed for '
+                                     f'{len(wo_ids)} work order(s), {part["quantity_available"] or 0} available.')
+                issue_rows.extend((wo_id, part['spare_part_id'], part['quantity'], user_id, cost_per_unit)
+                                  for wo_id in wo_ids)
+
+            cursor.executemany('''
+                INSERT INTO work_order_parts (work_order_id, spare_part_id, quantity,
+                                              transaction_type, transacted_by, cost_per_unit)
+                VALUES (?, ?, ?, 'issue', ?, ?)
+            ''', issue_rows)
+            summary['parts_issued'] = len(issue_rows)
+
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    escalation_engine.wake()
+    return summary
+
+
+@work_order_templates_bp.route('/')
+@login_required
+def index():
+    """List work order templates"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT t.*, u.username as assigned_to_name,
+               (SELECT COUNT(*) FROM work_order_template_parts tp WHERE tp.template_id = t.id) as parts_count
+        FROM work_order_templates t
+        LEFT JOIN users u ON t.assigned_to = u.id
+        ORDER BY t.name
+    ''')
+    templates = cursor.fetchall()
+    conn.close()
+    return render_template('modules/work_orders/templates/index.html', templates=templates)
+
+
+def render_template_form(template, parts):
+    """Render the add/change template form with blank rows for more parts"""
+    return render_template('modules/work_orders/templates/form.html',
+                           template=template, parts=parts, blank_rows=range(TEMPLATE_PART_ROWS),
+                           priorities=WorkOrder.PRIORITIES)
+
+
+@work_order_templates_bp.route('/add', methods=['GET', 'POST'])
+@login_required
+def add():
+    """Create a work order template"""
+    if request.method == 'POST':
+        template, parts, error = parse_template_form(request.form)
+        if error:
+            flash(error, 'error')
+            return render_template_form(None, [])
+
+        conn = get_connection()
+        cursor = conn.cursor()
+        try:
+            save_template(cursor, None, template, parts, current_user.id)
+            conn.commit()
+            flash(f'Template "{template["name"]}" created successfully.', 'success')
+            return redirect(url_for('work_order_templates.index'))
+        except Exception as e:
+            conn.rollback()
+            if 'UNIQUE constraint failed' in str(e):
+                flash('A template with this name already exists.', 'error')
+            else:
+                flash(f'Error creating template: {str(e)}', 'error')
+        finally:
+            conn.close()
+
+    return render_template_form(None, [])
+
+
+@work_order_templates_bp.route('/change/<int:template_id>', methods=['GET', 'POST'])
+@login_required
+def change(template_id):
+    """Edit a work order template and its default parts"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    template, parts = load_template(cursor, template_id)
+    if template is None:
+        conn.close()
+        flash('Template not found.', 'error')
+        return redirect(url_for('work_order_templates.index'))
+
+    if request.method == 'POST':
+        values, new_parts, error = parse_template_form(request.form)
+        if error:
+            flash(error, 'error')
+        else:
+            try:
+                save_template(cursor, template_id, values, new_parts, current_user.id)
+                conn.commit()
+                conn.close()
+                flash(f'Template "{values["name"]}" updated successfully.', 'success')
+                return redirect(url_for('work_order_templates.index'))
+            except Exception as e:
+                conn.rollback()
+                if 'UNIQUE constraint failed' in str(e):
+                    flash('A template with this name already exists.', 'error')
+                else:
+                    flash(f'Error updating template: {str(e)}', 'error')
+
+    conn.close()
+    return render_template_form(template, parts)
+
+
+@work_order_templates_bp.route('/delete/<int:template_id>', methods=['POST'])
+@login_required
+def delete(template_id):
+    """Delete a work order template; work orders created from it are kept"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM work_order_template_parts WHERE template_id = ?', (template_id,))
+    cursor.execute('DELETE FROM work_order_templates WHERE id = ?', (template_id,))
+    deleted = cursor.rowcount
+    conn.commit()
+    conn.close()
+
+    if deleted:
+        flash('Template deleted.', 'success')
+    else:
+        flash('Template not found.', 'error')
+    return redirect(url_for('work_order_templates.index'))
+
+
+@work_order_templates_bp.route('/instantiate/<int:template_id>', methods=['GET', 'POST'])
+@login_required
+def instantiate(template_id):
+    """Create work orders from a template for every equipment matching a filter"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    template, parts = load_template(cursor, template_id)
+    conn.close()
+    if template is None:
+        flash('Template not found.', 'error')
+        return redirect(url_for('work_order_templates.index'))
+
+    summary = None
+    if request.method == 'POST':
+        location = request.form.get('location', '').strip()
+        search = request.form.get('search', '').strip()
+        due_date = request.form.get('due_date', '').strip()
+        issue_parts = request.form.get('issue_parts') == 'on'
+
+        conn = get_connection()
+        cursor = conn.cursor()
+        equipment_rows = find_equipment_for_bulk(cursor, location, search)
+        conn.close()
+
+        if not equipment_rows:
+            flash('No active equipment matches the selected filter.', 'error')
+        else:
+            try:
+                summary = instantiate_template(template_id, [row['id'] for row in equipment_rows],
+                                               current_user.id, due_date, issue_parts)
+                msg = f'{len(summary["created"])} work order(s) created.'
+                if summary['parts_issued']:
+                    msg += f' {summary["parts_issued"]} part issue(s) posted.'
+                flash(msg, 'success')
+            except ValueError as e:
+                flash(str(e), 'error')
+            except Exception as e:
+                flash(f'Error creating work orders: {str(e)}', 'error')
+
+    return render_template('modules/work_orders/templates/instantiate.html',
+                           template=template, parts=parts, summary=summary,
+                           locations=get_active_locations())
+
+
+@work_order_templates_bp.route('/api/<int:template_id>/instantiate', methods=['POST'])
+@login_required
+def api_instantiate(template_id):
+    """API endpoint to create work orders from a template across many equipment"""
+    # Body: {"equipment_ids": [...]} or {"filter": {...}}, optional "due_date" and "issue_parts"
+    data = request.get_json(silent=True) or {}
+
+    conn = get_connection()
+    template, _ = load_template(conn.cursor(), template_id)
+    conn.close()
+    if template is None:
+        return jsonify({'error': 'Template not found'}), 404
+
+    due_date = str(data.get('due_date') or '').strip()
+    if due_date:
+        try:
+            datetime.strptime(due_date, '%Y-%m-%d')
+        except ValueError:
+            return jsonify({'error': 'due_date must be YYYY-MM-DD'}), 400
+
+    equipment_ids = data.get('equipment_ids')
+    if equipment_ids is None:
+        equipment_filter = data.get('filter') or {}
+        conn = get_connection()
+        cursor = conn.cursor()
+        equipment_rows = find_equipment_for_bulk(cursor,
+                                                 str(equipment_filter.get('location', '')).strip(),
+                                                 str(equipment_filter.get('search', '')).strip())
+        conn.close()
+        equipment_ids = [row['id'] for row in equipment_rows]
+    else:
+        try:
+            equipment_ids = [int(equip_id) for equip_id in equipment_ids]
+        except (TypeError, ValueError):
+            return jsonify({'error': 'equipment_ids must be a list of integers'}), 400
+
+    try:
+        summary = instantiate_template(template_id, equipment_ids, current_user.id, due_date,
+                                       bool(data.get('issue_parts')))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        return jsonify({'error': f'Error creating work orders: {str(e)}'}), 500
+
+    return jsonify({
+        'requested': summary['requested'],
+        'created_count': len(summary['created']),
+        'skipped_count': len(summary['skipped']),
+        'parts_issued': summary['parts_issued'],
+        'created': summary['created'],
+        'skipped': summary['skipped']
+    })
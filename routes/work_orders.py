@@ -1,12 +1,19 @@
+import base64
 import json
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required, current_user
-from database.init_db import get_connection
+from werkzeug.datastructures import MultiDict
+from database.init_db import get_connection, worklist_status_sql, worklist_due_sql
+from database.cache import cached_query
+from database.similarity import find_similar_work_orders, store_signature
+from database.backlog import build_backlog
+from database.escalation import escalation_engine
+from database.assignment import load_assignment_inputs, propose_assignments
+from database.concurrency import editable_values, parse_original_values, changed_fields, conflict_message
 from models.work_order import WorkOrder
 from models.work_order_part import WorkOrderPart
 from models.equipment import Equipment
 from models.location import Location
-from models.spare_part import SparePart
 from models.maintenance_schedule import MaintenanceSchedule
 from datetime import datetime
 
@@ -15,32 +22,26 @@ work_orders_bp = Blueprint('work_orders', __name__, url_prefix='/work-orders')
 
 def get_active_locations():
     """Fetch all active locations for dropdown"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM locations WHERE status = 'Active' ORDER BY location_code")
-    rows = cursor.fetchall()
-    conn.close()
-    return [Location.from_row(row) for row in rows]
+    def load(cursor):
+        cursor.execute("SELECT * FROM locations WHERE status = 'Active' ORDER BY location_code")
+        return [Location.from_row(row) for row in cursor.fetchall()]
+    return list(cached_query('locations:active', ['locations'], load))
 
 
 def get_all_equipment():
     """Fetch all equipment for dropdown"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM equipment ORDER BY tag_number")
-    rows = cursor.fetchall()
-    conn.close()
-    return [Equipment.from_row(row) for row in rows]
+    def load(cursor):
+        cursor.execute("SELECT * FROM equipment ORDER BY tag_number")
+        return [Equipment.from_row(row) for row in cursor.fetchall()]
+    return list(cached_query('equipment:all', ['equipment'], load))
 
 
 def get_all_users():
     """Fetch all users for assignment dropdown"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, username, role FROM users ORDER BY username")
-    rows = cursor.fetchall()
-    conn.close()
-    return [{'id': row['id'], 'username': row['username'], 'role': row['role']} for row in rows]
+    def load(cursor):
+        cursor.execute("SELECT id, username, role FROM users ORDER BY username")
+        return [{'id': row['id'], 'username': row['username'], 'role': row['role']} for row in cursor.fetchall()]
+    return list(cached_query('users:all', ['users'], load))
 
 
 def generate_work_order_number():
@@ -62,6 +63,326 @@ def generate_work_order_number():
         return f'WO-{datetime.now().strftime("%Y%m%d%H%M%S")}'
 
 
+def allocate_work_order_numbers(cursor, count):
+    """Reserve a block of consecutive work order numbers inside the caller's transaction"""
+    cursor.execute("SELECT work_order_number FROM work_orders WHERE work_order_number LIKE 'WO-%' "
+                   "ORDER BY id DESC LIMIT 1")
+    row = cursor.fetchone()
+
+    if row is None:
+        start = 1
+    else:
+        try:
+            start = int(row['work_order_number'].split('-')[1]) + 1
+        except:
+            stamp = datetime.now().strftime("%Y%m%d%H%M%S")
+            return [f'WO-{stamp}-{i + 1:04d}' for i in range(count)]
+
+    return [f'WO-{num:04d}' for num in range(start, start + count)]
+
+
+def issue_stock(cursor, spare_part_id, quantity):
+    """Take stock out with one conditional UPDATE; returns the MAP used, or None when stock is short"""
+    cursor.execute('''
+        UPDATE spare_parts
+        SET quantity_available = quantity_available - ?,
+            total_inventory_value = COALESCE(total_inventory_value, 0) - ? * COALESCE(moving_average_price, 0)
+        WHERE id = ? AND quantity_available >= ?
+    ''', (quantity, quantity, spare_part_id, quantity))
+    if cursor.rowcount == 0:
+        return None
+
+    # An issue leaves MAP unchanged, and this transaction now holds the write lock
+    cursor.execute('SELECT COALESCE(moving_average_price, 0) FROM spare_parts WHERE id = ?', (spare_part_id,))
+    return cursor.fetchone()[0]
+
+
+def return_stock(cursor, spare_part_id, quantity, cost_per_unit):
+    """Put a quantity back into stock at cost_per_unit, recomputing MAP in the same UPDATE"""
+    cursor.execute('''
+        UPDATE spare_parts
+        SET moving_average_price = CASE WHEN COALESCE(quantity_available, 0) + ? > 0
+                THEN (COALESCE(total_inventory_value, 0) + ? * ?) / (COALESCE(quantity_available, 0) + ?)
+                ELSE 0 END,
+            total_inventory_value = COALESCE(total_inventory_value, 0) + ? * ?,
+            quantity_available = COALESCE(quantity_available, 0) + ?
+        WHERE id = ?
+    ''', (quantity, quantity, cost_per_unit, quantity, quantity, cost_per_unit, quantity, spare_part_id))
+    return cursor.rowcount
+
+
+def advance_schedules_for_work_orders(cursor, wo_ids, completed_date):
+    """Advance the schedules linked to the given work orders with one UPDATE in the caller's transaction"""
+    if not wo_ids:
+        return 0
+
+    # Build the frequency -> days mapping from the model so SQL and Python agree
+    frequency_cases = ' '.join('WHEN ? THEN ?' for _ in MaintenanceSchedule.FREQUENCY_DAYS)
+    frequency_params = [value for item in MaintenanceSchedule.FREQUENCY_DAYS.items() for value in item]
+    placeholders = ','.join('?' * len(wo_ids))
+
+    cursor.execute(f'''
+        UPDATE maintenance_schedules
+        SET last_performed_date = ?,
+            next_due_date = CASE WHEN schedule_type = 'time-based'
+                THEN date(?, '+' || (CASE frequency {frequency_cases} ELSE 30 END) || ' days')
+                ELSE next_due_date END,
+            last_meter_reading = CASE WHEN schedule_type = 'time-based' THEN last_meter_reading
+                ELSE COALESCE((SELECT mr.reading_value FROM meter_readings mr
+                               WHERE mr.equipment_id = maintenance_schedules.equipment_id
+                               ORDER BY mr.recorded_at DESC LIMIT 1),
+                              last_meter_reading, 0) END,
+            next_due_meter = CASE WHEN schedule_type = 'time-based' THEN next_due_meter
+                ELSE COALESCE((SELECT mr.reading_value FROM meter_readings mr
+                               WHERE mr.equipment_id = maintenance_schedules.equipment_id
+                               ORDER BY mr.recorded_at DESC LIMIT 1),
+                              last_meter_reading, 0) + meter_interval END
+        WHERE id IN (SELECT maintenance_schedule_id FROM work_orders
+                     WHERE id IN ({placeholders}) AND maintenance_schedule_id IS NOT NULL)
+    ''', [completed_date, completed_date] + frequency_params + list(wo_ids))
+    return cursor.rowcount
+
+
+def transition_work_orders(target_status, wo_ids=None, filters=None):
+    """Move many work orders to target_status in one transaction, honouring STATUS_TRANSITIONS"""
+    summary = {'status': target_status, 'transitioned': [], 'unchanged': [], 'skipped': [],
+               'not_found': [], 'schedules_advanced': 0}
+    if wo_ids is not None:
+        if not wo_ids:
+            return summary
+        conditions = [f"wo.id IN ({','.join('?' * len(wo_ids))})"]
+        params = list(wo_ids)
+    else:
+        conditions, params = report_filter_conditions(filters)
+
+    completed_at = datetime.now()
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute(f'''
+            SELECT wo.id, wo.work_order_number, wo.status FROM work_orders wo
+            WHERE {' AND '.join(conditions)}
+            ORDER BY wo.work_order_number
+        ''', params)
+
+        movable = []
+        found = set()
+        for row in cursor.fetchall():
+            found.add(row['id'])
+            if row['status'] == target_status:
+                summary['unchanged'].append(row['work_order_number'])
+            elif target_status in WorkOrder.STATUS_TRANSITIONS.get(row['status'], []):
+                movable.append(row['id'])
+                summary['transitioned'].append(row['work_order_number'])
+            else:
+                summary['skipped'].append({'work_order_number': row['work_order_number'],
+                                           'status': row['status']})
+        if wo_ids is not None:
+            summary['not_found'] = sorted(set(wo_ids) - found)
+
+        if movable:
+            move_placeholders = ','.join('?' * len(movable))
+            if target_status == 'Completed':
+                cursor.execute(f'''
+                    UPDATE work_orders SET status = ?, completed_at = ?
+                    WHERE id IN ({move_placeholders})
+                ''', [target_status, completed_at] + movable)
+                summary['schedules_advanced'] = advance_schedules_for_work_orders(
+                    cursor, movable, completed_at.strftime('%Y-%m-%d'))
+            else:
+                cursor.execute(f'''
+                    UPDATE work_orders SET status = ?
+                    WHERE id IN ({move_placeholders})
+                ''', [target_status] + movable)
+
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    return summary
+
+
+def bulk_complete_work_orders(wo_ids):
+    """Complete many work orders in one transaction and advance their schedules"""
+    summary = transition_work_orders('Completed', wo_ids=wo_ids)
+    skipped = summary['unchanged'] + [item['work_order_number'] for item in summary['skipped']]
+    return {'completed': summary['transitioned'], 'skipped': sorted(skipped),
+            'schedules_advanced': summary['schedules_advanced']}
+
+
+# Report sort orders: label and (expression, direction) columns, always ending in wo.id
+REPORT_SORTS = {
+    'priority': ('Status, then priority', [
+        ('wo.status_rank', 'ASC'),
+        ('wo.priority_rank', 'ASC'),
+        ('wo.created_at', 'DESC'),
+        ('wo.id', 'DESC'),
+    ]),
+    'newest': ('Newest first', [
+        ('wo.created_at', 'DESC'),
+        ('wo.id', 'DESC'),
+    ]),
+    'oldest': ('Oldest first', [
+        ('wo.created_at', 'ASC'),
+        ('wo.id', 'ASC'),
+    ]),
+    'due_date': ('Due date', [
+        ("COALESCE(wo.due_date, '9999-12-31')", 'ASC'),
+        ('wo.id', 'ASC'),
+    ]),
+    'number': ('WO number', [
+        ('wo.work_order_number', 'ASC'),
+        ('wo.id', 'ASC'),
+    ]),
+}
+REPORT_PAGE_SIZE = 50
+REPORT_MAX_PAGE_SIZE = 200
+
+
+def encode_report_cursor(values):
+    """Encode the sort key of the last row on a page as an opaque cursor"""
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+
+def decode_report_cursor(cursor_value, sort_columns):
+    """Decode a cursor; returns None when it is missing or does not match the sort"""
+    if not cursor_value:
+        return None
+    try:
+        padded = cursor_value + '=' * (-len(cursor_value) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(values, list) or len(values) != len(sort_columns):
+        return None
+    return values
+
+
+def parse_report_filters(args):
+    """Read work order report filters from request args"""
+    # The filter form always submits 'filtered'; a bare visit shows active work orders
+    if args.get('filtered'):
+        statuses = [s for s in args.getlist('status') if s in WorkOrder.STATUSES]
+    else:
+        statuses = list(WorkOrder.ACTIVE_STATUSES)
+
+    per_page = args.get('per_page', REPORT_PAGE_SIZE, type=int)
+    sort = args.get('sort', 'priority')
+    return {
+        'status': statuses,
+        'priority': args.get('priority', '').strip() if args.get('priority') in WorkOrder.PRIORITIES else '',
+        'equipment_id': args.get('equipment_id', type=int),
+        'assigned_to': args.get('assigned_to', type=int),
+        'date_from': args.get('date_from', '').strip(),
+        'date_to': args.get('date_to', '').strip(),
+        'q': args.get('q', '').strip(),
+        'sort': sort if sort in REPORT_SORTS else 'priority',
+        'per_page': max(1, min(per_page, REPORT_MAX_PAGE_SIZE)),
+    }
+
+
+def add_keyset_conditions(conditions, params, sort_columns, after):
+    """Append the keyset condition: (k1, k2, ...) strictly after the cursor in the sort order"""
+    # Redundant bound on the leading key lets SQLite seek instead of skipping rows
+    lead_expr, lead_direction = sort_columns[0]
+    conditions.append(f"{lead_expr} {'<=' if lead_direction == 'DESC' else '>='} ?")
+    params.append(after[0])
+    alternatives = []
+    for i, (expr, direction) in enumerate(sort_columns):
+        terms = [f'{prev_expr} = ?' for prev_expr, _ in sort_columns[:i]]
+        terms.append(f"{expr} {'<' if direction == 'DESC' else '>'} ?")
+        alternatives.append('(' + ' AND '.join(terms) + ')')
+        params.extend(after[:i + 1])
+    conditions.append('(' + ' OR '.join(alternatives) + ')')
+
+
+def report_filter_conditions(filters):
+    """Build WHERE conditions and parameters (on alias wo) for work order report filters"""
+    conditions = []
+    params = []
+    # Filter on the stored rank so the report order index can be range-scanned
+    if filters['status']:
+        conditions.append(f"wo.status_rank IN ({','.join('?' * len(filters['status']))})")
+        params.extend(WorkOrder.STATUS_RANKS[status] for status in filters['status'])
+    else:
+        conditions.append('0')
+    if filters['priority']:
+        conditions.append('wo.priority = ?')
+        params.append(filters['priority'])
+    if filters['equipment_id']:
+        conditions.append('wo.equipment_id = ?')
+        params.append(filters['equipment_id'])
+    if filters['assigned_to']:
+        conditions.append('wo.assigned_to = ?')
+        params.append(filters['assigned_to'])
+    if filters['date_from']:
+        conditions.append('wo.created_at >= ?')
+        params.append(filters['date_from'])
+    if filters['date_to']:
+        conditions.append("wo.created_at < date(?, '+1 day')")
+        params.append(filters['date_to'])
+    if filters['q']:
+        conditions.append('(wo.work_order_number LIKE ? OR wo.title LIKE ?)')
+        params.extend([f"%{filters['q']}%", f"%{filters['q']}%"])
+    return conditions, params
+
+
+def fetch_work_order_page(filters, cursor_value=None):
+    """Fetch one keyset-paginated page of the work order report; returns (work_orders, next_cursor)"""
+    sort_columns = REPORT_SORTS[filters['sort']][1]
+    sort_select = ', '.join(f'{expr} as sort_{i}' for i, (expr, _) in enumerate(sort_columns))
+
+    conditions, params = report_filter_conditions(filters)
+
+    after = decode_report_cursor(cursor_value, sort_columns)
+    if after is not None:
+        add_keyset_conditions(conditions, params, sort_columns, after)
+
+    order_by = ', '.join(f'{expr} {direction}' for expr, direction in sort_columns)
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT wo.*,
+               e.tag_number as equipment_tag,
+               e.description as equipment_desc,
+               u1.username as assigned_to_name,
+               u2.username as created_by_name,
+               {sort_select}
+        FROM work_orders wo
+        LEFT JOIN equipment e ON wo.equipment_id = e.id
+        LEFT JOIN users u1 ON wo.assigned_to = u1.id
+        LEFT JOIN users u2 ON wo.created_by = u2.id
+        WHERE {' AND '.join(conditions)}
+        ORDER BY {order_by}
+        LIMIT ?
+    ''', params + [filters['per_page'] + 1])
+    rows = cursor.fetchall()
+    conn.close()
+
+    next_cursor = None
+    if len(rows) > filters['per_page']:
+        rows = rows[:filters['per_page']]
+        last = rows[-1]
+        next_cursor = encode_report_cursor([last[f'sort_{i}'] for i in range(len(sort_columns))])
+
+    work_orders = []
+    for row in rows:
+        wo = WorkOrder.from_row(row)
+        wo.equipment_tag = row['equipment_tag']
+        wo.equipment_desc = row['equipment_desc']
+        wo.assigned_to_name = row['assigned_to_name']
+        wo.created_by_name = row['created_by_name']
+        work_orders.append(wo)
+
+    return work_orders, next_cursor
+
+
 @work_orders_bp.route('/')
 @login_required
 def index():
@@ -72,48 +393,490 @@ def index():
 @work_orders_bp.route('/report')
 @login_required
 def work_order_report():
-    """Work Order Report - overview of all work orders"""
+    """Work Order Report - filtered, keyset-paginated overview of work orders"""
+    filters = parse_report_filters(request.args)
+    page_cursor = request.args.get('cursor', '')
+    work_orders, next_cursor = fetch_work_order_page(filters, page_cursor)
+
+    # Page links keep every filter argument and only swap the cursor
+    link_args = request.args.to_dict(flat=False)
+    link_args.pop('cursor', None)
+    next_url = url_for('work_orders.work_order_report', cursor=next_cursor, **link_args) if next_cursor else None
+    first_url = url_for('work_orders.work_order_report', **link_args) if page_cursor else None
+
+    return render_template('modules/work_orders/work_order_report.html',
+                           work_orders=work_orders,
+                           filters=filters,
+                           next_url=next_url,
+                           first_url=first_url,
+                           sorts=REPORT_SORTS,
+                           statuses=WorkOrder.STATUSES,
+                           priorities=WorkOrder.PRIORITIES,
+                           equipment_list=get_all_equipment(),
+                           users=get_all_users())
+
+
+@work_orders_bp.route('/api/report')
+@login_required
+def api_work_order_report():
+    """API endpoint for the work order report; pass next_cursor back as cursor for the next page"""
+    filters = parse_report_filters(request.args)
+    work_orders, next_cursor = fetch_work_order_page(filters, request.args.get('cursor', ''))
+
+    results = []
+    for wo in work_orders:
+        item = wo.to_dict()
+        item['equipment_tag'] = wo.equipment_tag
+        item['assigned_to_name'] = wo.assigned_to_name
+        item['created_by_name'] = wo.created_by_name
+        results.append(item)
+
+    return jsonify({
+        'work_orders': results,
+        'next_cursor': next_cursor,
+        'sort': filters['sort'],
+        'per_page': filters['per_page']
+    })
+
+
+# Worklist order matches idx_work_orders_worklist after its assigned_to column
+WORKLIST_SORT = [
+    ('wo.priority_rank', 'ASC'),
+    (worklist_due_sql('wo.'), 'ASC'),
+    ('wo.id', 'ASC'),
+]
+WORKLIST_PAGE_SIZE = 25
+
+
+def get_crew_member_ids(user_id):
+    """Ids of every user in the same crew as user_id (just user_id when they have no crew)"""
     conn = get_connection()
     cursor = conn.cursor()
     cursor.execute('''
+        SELECT member.id FROM users me
+        JOIN users member ON member.crew = me.crew
+        WHERE me.id = ? AND me.crew IS NOT NULL AND me.crew != ''
+        ORDER BY member.id
+    ''', (user_id,))
+    member_ids = [row['id'] for row in cursor.fetchall()]
+    conn.close()
+    return member_ids or [user_id]
+
+
+def fetch_worklist_page(assignee_ids, per_page, cursor_value=None):
+    """Fetch one keyset-paginated page of open work orders assigned to the given users"""
+    placeholders = ','.join('?' * len(assignee_ids))
+    conditions = [worklist_status_sql('wo.'), f'wo.assigned_to IN ({placeholders})']
+    params = list(assignee_ids)
+
+    after = decode_report_cursor(cursor_value, WORKLIST_SORT)
+    if after is not None:
+        add_keyset_conditions(conditions, params, WORKLIST_SORT, after)
+
+    sort_select = ', '.join(f'{expr} as sort_{i}' for i, (expr, _) in enumerate(WORKLIST_SORT))
+    order_by = ', '.join(f'{expr} {direction}' for expr, direction in WORKLIST_SORT)
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(f'''
         SELECT wo.*,
                e.tag_number as equipment_tag,
                e.description as equipment_desc,
-               u1.username as assigned_to_name,
-               u2.username as created_by_name
+               u.username as assigned_to_name,
+               {sort_select}
         FROM work_orders wo
         LEFT JOIN equipment e ON wo.equipment_id = e.id
-        LEFT JOIN users u1 ON wo.assigned_to = u1.id
-        LEFT JOIN users u2 ON wo.created_by = u2.id
-        ORDER BY
-            CASE wo.status
-                WHEN 'Open' THEN 1
-                WHEN 'In Progress' THEN 2
-                WHEN 'On Hold' THEN 3
-                WHEN 'Completed' THEN 4
-                WHEN 'Cancelled' THEN 5
-            END,
-            CASE wo.priority
-                WHEN 'Emergency' THEN 1
-                WHEN 'High' THEN 2
-                WHEN 'Medium' THEN 3
-                WHEN 'Low' THEN 4
-            END,
-            wo.created_at DESC
-    ''')
+        LEFT JOIN users u ON wo.assigned_to = u.id
+        WHERE {' AND '.join(conditions)}
+        ORDER BY {order_by}
+        LIMIT ?
+    ''', params + [per_page + 1])
     rows = cursor.fetchall()
     conn.close()
 
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last = rows[-1]
+        next_cursor = encode_report_cursor([last[f'sort_{i}'] for i in range(len(WORKLIST_SORT))])
+
+    today = datetime.now().strftime('%Y-%m-%d')
     work_orders = []
     for row in rows:
         wo = WorkOrder.from_row(row)
-        wo.equipment_tag = row['equipment_tag'] if 'equipment_tag' in row.keys() else None
-        wo.equipment_desc = row['equipment_desc'] if 'equipment_desc' in row.keys() else None
-        wo.assigned_to_name = row['assigned_to_name'] if 'assigned_to_name' in row.keys() else None
-        wo.created_by_name = row['created_by_name'] if 'created_by_name' in row.keys() else None
+        wo.equipment_tag = row['equipment_tag']
+        wo.equipment_desc = row['equipment_desc']
+        wo.assigned_to_name = row['assigned_to_name']
+        wo.is_overdue = bool(wo.due_date) and wo.due_date[:10] < today
         work_orders.append(wo)
 
-    return render_template('modules/work_orders/work_order_report.html', work_orders=work_orders)
+    return work_orders, next_cursor
+
+
+def parse_worklist_args(args):
+    """Read worklist scope and page size; returns (scope, assignee_ids, per_page)"""
+    scope = 'crew' if args.get('scope') == 'crew' else 'mine'
+    assignee_ids = get_crew_member_ids(current_user.id) if scope == 'crew' else [current_user.id]
+    per_page = max(1, min(args.get('per_page', WORKLIST_PAGE_SIZE, type=int), REPORT_MAX_PAGE_SIZE))
+    return scope, assignee_ids, per_page
+
+
+@work_orders_bp.route('/worklist')
+@login_required
+def worklist():
+    """Technician worklist - open work orders assigned to the current user or their crew"""
+    scope, assignee_ids, per_page = parse_worklist_args(request.args)
+    page_cursor = request.args.get('cursor', '')
+    work_orders, next_cursor = fetch_worklist_page(assignee_ids, per_page, page_cursor)
+
+    next_url = url_for('work_orders.worklist', scope=scope, per_page=per_page,
+                       cursor=next_cursor) if next_cursor else None
+    first_url = url_for('work_orders.worklist', scope=scope, per_page=per_page) if page_cursor else None
+
+    return render_template('modules/work_orders/worklist.html',
+                           work_orders=work_orders,
+                           scope=scope,
+                           crew_size=len(assignee_ids),
+                           next_url=next_url,
+                           first_url=first_url)
+
+
+@work_orders_bp.route('/api/worklist')
+@login_required
+def api_worklist():
+    """API endpoint for the current user's (or with scope=crew, their crew's) worklist"""
+    scope, assignee_ids, per_page = parse_worklist_args(request.args)
+    work_orders, next_cursor = fetch_worklist_page(assignee_ids, per_page, request.args.get('cursor', ''))
+
+    results = []
+    for wo in work_orders:
+        item = wo.to_dict()
+        item['equipment_tag'] = wo.equipment_tag
+        item['equipment_desc'] = wo.equipment_desc
+        item['assigned_to_name'] = wo.assigned_to_name
+        item['is_overdue'] = wo.is_overdue
+        results.append(item)
+
+    return jsonify({
+        'work_orders': results,
+        'next_cursor': next_cursor,
+        'scope': scope,
+        'per_page': per_page
+    })
+
+
+BACKLOG_CACHE_SECONDS = 180
+BACKLOG_LIMIT = 50
+BACKLOG_MAX_LIMIT = 500
+
+
+def get_ranked_backlog():
+    """Risk-ranked open work orders with aging histograms, rebuilt at most every few minutes"""
+    def load(cursor):
+        backlog = build_backlog(cursor)
+        backlog['generated_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        return backlog
+    return cached_query('work_orders:backlog', [], load, max_age=BACKLOG_CACHE_SECONDS)
+
+
+def filter_backlog(backlog, priority='', limit=BACKLOG_LIMIT):
+    """Top items of the cached ranking, optionally for one priority; ranks stay global"""
+    items = backlog['items']
+    if priority:
+        items = [item for item in items if item['priority'] == priority]
+    return items[:limit]
+
+
+@work_orders_bp.route('/backlog')
+@login_required
+def backlog():
+    """Top backlog: open work orders ranked by risk, with aging histograms"""
+    priority = request.args.get('priority', '').strip()
+    if priority not in WorkOrder.PRIORITIES:
+        priority = ''
+    limit = max(1, min(request.args.get('limit', BACKLOG_LIMIT, type=int), BACKLOG_MAX_LIMIT))
+
+    ranked = get_ranked_backlog()
+    return render_template('modules/work_orders/backlog.html',
+                           backlog=ranked, items=filter_backlog(ranked, priority, limit),
+                           priority=priority, limit=limit, priorities=WorkOrder.PRIORITIES,
+                           cache_minutes=BACKLOG_CACHE_SECONDS // 60)
+
+
+@work_orders_bp.route('/api/backlog')
+@login_required
+def api_backlog():
+    """API endpoint for the risk-ranked backlog (limit, priority)"""
+    priority = request.args.get('priority', '').strip()
+    if priority and priority not in WorkOrder.PRIORITIES:
+        return jsonify({'error': f'priority must be one of: {", ".join(WorkOrder.PRIORITIES)}'}), 400
+    limit = max(1, min(request.args.get('limit', BACKLOG_LIMIT, type=int), BACKLOG_MAX_LIMIT))
+
+    ranked = get_ranked_backlog()
+    return jsonify({
+        'generated_at': ranked['generated_at'],
+        'total': ranked['total'],
+        'overdue_count': ranked['overdue_count'],
+        'no_due_date_count': ranked['no_due_date_count'],
+        'age_histogram': ranked['age_histogram'],
+        'overdue_histogram': ranked['overdue_histogram'],
+        'items': filter_backlog(ranked, priority, limit)
+    })
+
+
+# Default shift capacity offered on the assignment page, in minutes
+ASSIGNMENT_CAPACITY = 480
+
+
+def get_crews():
+    """Distinct crew names for the assignment page filter"""
+    def load(cursor):
+        cursor.execute("SELECT DISTINCT crew FROM users WHERE crew IS NOT NULL AND crew != '' ORDER BY crew")
+        return [row['crew'] for row in cursor.fetchall()]
+    return list(cached_query('users:crews', ['users'], load))
+
+
+def build_assignment_proposal(crew='', capacity=None):
+    """Propose assignees for every open unassigned work order. Returns (proposals, unassigned, technicians)"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        technicians, jobs = load_assignment_inputs(cursor, crew)
+    finally:
+        conn.close()
+    return propose_assignments(technicians, jobs, capacity)
+
+
+def apply_assignments(assignments):
+    """Assign many work orders in one transaction, skipping any assigned or closed since the proposal"""
+    summary = {'applied': [], 'skipped': []}
+    if not assignments:
+        return summary
+    wo_ids = [wo_id for wo_id, _ in assignments]
+    user_ids = sorted({user_id for _, user_id in assignments})
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute(f"SELECT id FROM users WHERE id IN ({','.join('?' * len(user_ids))})", user_ids)
+        known_users = {row['id'] for row in cursor.fetchall()}
+        cursor.execute(f'''
+            SELECT wo.id FROM work_orders wo
+            WHERE wo.id IN ({','.join('?' * len(wo_ids))})
+              AND wo.assigned_to IS NULL AND {worklist_status_sql('wo.')}
+        ''', wo_ids)
+        open_ids = {row['id'] for row in cursor.fetchall()}
+
+        rows = []
+        for wo_id, user_id in assignments:
+            if wo_id in open_ids and user_id in known_users:
+                rows.append((user_id, wo_id))
+                summary['applied'].append(wo_id)
+            else:
+                summary['skipped'].append(wo_id)
+        cursor.executemany('UPDATE work_orders SET assigned_to = ? WHERE id = ?', rows)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    return summary
+
+
+def parse_capacity(value):
+    """Capacity in minutes from a form or query value; None (unlimited) when blank, ValueError when invalid"""
+    if value in (None, ''):
+        return None
+    capacity = int(value)
+    if capacity <= 0:
+        raise ValueError
+    return capacity
+
+
+@work_orders_bp.route('/assign', methods=['GET', 'POST'])
+@login_required
+def assign():
+    """Assignment optimizer: propose assignees for unassigned open work orders, then apply them"""
+    crew = request.values.get('crew', '').strip()
+    capacity_value = request.values.get('capacity', str(ASSIGNMENT_CAPACITY)).strip()
+    proposal = None
+
+    if request.method == 'POST' and request.form.get('action') == 'apply':
+        assignments = []
+        for value in request.form.getlist('assign'):
+            wo_id, _, user_id = value.partition(':')
+            if wo_id.isdigit() and user_id.isdigit():
+                assignments.append((int(wo_id), int(user_id)))
+        if not assignments:
+            flash('Select at least one proposed assignment to apply.', 'error')
+        else:
+            try:
+                summary = apply_assignments(assignments)
+                msg = f'{len(summary["applied"])} work order(s) assigned.'
+                if summary['skipped']:
+                    msg += f' {len(summary["skipped"])} skipped (already assigned or closed).'
+                flash(msg, 'success')
+                return redirect(url_for('work_orders.assign', crew=crew, capacity=capacity_value))
+            except Exception as e:
+                flash(f'Error applying assignments: {str(e)}', 'error')
+
+    try:
+        capacity = parse_capacity(capacity_value)
+    except ValueError:
+        flash('Capacity must be a positive number of minutes.', 'error')
+        capacity = ASSIGNMENT_CAPACITY
+        capacity_value = str(ASSIGNMENT_CAPACITY)
+
+    if request.method == 'POST' or request.args.get('propose'):
+        proposals, unassigned, technicians = build_assignment_proposal(crew, capacity)
+        proposal = {'proposals': proposals, 'unassigned': unassigned, 'technicians': technicians}
+
+    return render_template('modules/work_orders/assign.html', proposal=proposal,
+                           crews=get_crews(), crew=crew, capacity=capacity_value)
+
+
+@work_orders_bp.route('/api/assignments/proposal')
+@login_required
+def api_assignment_proposal():
+    """API endpoint proposing assignees for open unassigned work orders (optional crew and capacity)"""
+    crew = request.args.get('crew', '').strip()
+    try:
+        capacity = parse_capacity(request.args.get('capacity', '').strip())
+    except ValueError:
+        return jsonify({'error': 'capacity must be a positive integer (minutes)'}), 400
+
+    proposals, unassigned, technicians = build_assignment_proposal(crew, capacity)
+    return jsonify({
+        'proposals': proposals,
+        'unassigned': unassigned,
+        'technicians': technicians
+    })
+
+
+@work_orders_bp.route('/api/assignments/apply', methods=['POST'])
+@login_required
+def api_apply_assignments():
+    """API endpoint to apply assignments in bulk"""
+    # Body: {"assignments": [{"work_order_id": 1, "user_id": 3}, ...]}
+    data = request.get_json(silent=True) or {}
+    raw = data.get('assignments')
+    if not isinstance(raw, list) or not raw:
+        return jsonify({'error': 'assignments must be a non-empty list'}), 400
+    try:
+        assignments = [(int(item['work_order_id']), int(item['user_id'])) for item in raw]
+    except (TypeError, ValueError, KeyError):
+        return jsonify({'error': 'each assignment needs integer work_order_id and user_id'}), 400
+
+    try:
+        summary = apply_assignments(assignments)
+    except Exception as e:
+        return jsonify({'error': f'Error applying assignments: {str(e)}'}), 500
+
+    return jsonify({
+        'applied_count': len(summary['applied']),
+        'skipped_count': len(summary['skipped']),
+        'applied': summary['applied'],
+        'skipped': summary['skipped']
+    })
+
+
+SIMILAR_LIMIT = 5
+SIMILAR_MAX_LIMIT = 20
+
+
+def similar_work_orders_payload(equipment_id, title, description, exclude_id=None, limit=SIMILAR_LIMIT):
+    """Similar past work orders on one equipment with their parts and a combined parts list"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        matches = find_similar_work_orders(cursor, equipment_id, title, description,
+                                           exclude_id=exclude_id, limit=limit)
+        parts_by_wo = {row['id']: [] for row, _ in matches}
+        if matches:
+            placeholders = ','.join('?' * len(parts_by_wo))
+            cursor.execute(f'''
+                SELECT wop.work_order_id, sp.id as spare_part_id, sp.description,
+                       SUM(CASE WHEN wop.transaction_type = 'issue' THEN wop.quantity
+                                ELSE -wop.quantity END) as net_quantity
+                FROM work_order_parts wop
+                JOIN spare_parts sp ON wop.spare_part_id = sp.id
+                WHERE wop.work_order_id IN ({placeholders})
+                GROUP BY wop.work_order_id, sp.id
+                HAVING net_quantity > 0
+                ORDER BY sp.description
+            ''', list(parts_by_wo))
+            for row in cursor.fetchall():
+                parts_by_wo[row['work_order_id']].append({
+                    'spare_part_id': row['spare_part_id'],
+                    'description': row['description'],
+                    'quantity': row['net_quantity']
+                })
+    finally:
+        conn.close()
+
+    results = []
+    summary = {}
+    for row, similarity in matches:
+        parts = parts_by_wo[row['id']]
+        results.append({
+            'id': row['id'],
+            'work_order_number': row['work_order_number'],
+            'title': row['title'],
+            'status': row['status'],
+            'priority': row['priority'],
+            'created_at': row['created_at'],
+            'completed_at': row['completed_at'],
+            'similarity': round(similarity, 2),
+            'url': url_for('work_orders.view_detail', wo_id=row['id']),
+            'parts': parts
+        })
+        for part in parts:
+            entry = summary.setdefault(part['spare_part_id'], {
+                'spare_part_id': part['spare_part_id'],
+                'description': part['description'],
+                'work_order_count': 0,
+                'total_quantity': 0
+            })
+            entry['work_order_count'] += 1
+            entry['total_quantity'] += part['quantity']
+
+    parts_summary = sorted(summary.values(), key=lambda p: (-p['work_order_count'], p['description']))
+    return {'work_orders': results, 'parts_summary': parts_summary}
+
+
+@work_orders_bp.route('/api/<int:wo_id>/similar')
+@login_required
+def api_similar_work_orders(wo_id):
+    """API endpoint for past work orders on the same equipment similar to this one"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT id, equipment_id, title, description FROM work_orders WHERE id = ?', (wo_id,))
+    row = cursor.fetchone()
+    conn.close()
+
+    if row is None:
+        return jsonify({'error': 'Work Order not found.'}), 404
+
+    limit = max(1, min(request.args.get('limit', SIMILAR_LIMIT, type=int), SIMILAR_MAX_LIMIT))
+    return jsonify(similar_work_orders_payload(row['equipment_id'], row['title'], row['description'],
+                                               exclude_id=wo_id, limit=limit))
+
+
+@work_orders_bp.route('/api/similar')
+@login_required
+def api_similar_for_draft():
+    """API endpoint for similar work orders to a draft (equipment_id, title, description)"""
+    equipment_id = request.args.get('equipment_id', type=int)
+    title = request.args.get('title', '').strip()
+    if not equipment_id or not title:
+        return jsonify({'work_orders': [], 'parts_summary': []})
+
+    limit = max(1, min(request.args.get('limit', SIMILAR_LIMIT, type=int), SIMILAR_MAX_LIMIT))
+    return jsonify(similar_work_orders_payload(equipment_id, title, request.args.get('description', '').strip(),
+                                               limit=limit))
 
 
 @work_orders_bp.route('/create', methods=['GET', 'POST'])
@@ -121,9 +884,6 @@ def work_order_report():
 def add():
     """Create new work order"""
     locations = get_active_locations()
-    equipment_list = get_all_equipment()
-    users = get_all_users()
-    spare_parts = get_all_spare_parts()
     wo_number = generate_work_order_number()
 
     if request.method == 'POST':
@@ -136,6 +896,7 @@ def add():
         status = request.form.get('status', 'Open').strip()
         assigned_to = request.form.get('assigned_to', '').strip()
         due_date = request.form.get('due_date', '').strip()
+        required_skill = request.form.get('required_skill', '').strip().lower()
         parts_to_consume = request.form.get('parts_to_consume', '[]')
 
         # Convert to proper types
@@ -152,17 +913,13 @@ def add():
         if not work_order_number:
             flash('Work Order Number is required.', 'error')
             return render_template('modules/work_orders/add.html',
-                                   locations=locations, equipment_list=equipment_list,
-                                   users=users, priorities=WorkOrder.PRIORITIES,
-                                   statuses=WorkOrder.STATUSES, wo_number=wo_number,
-                                   spare_parts=spare_parts)
+                                   locations=locations, priorities=WorkOrder.PRIORITIES,
+                                   statuses=WorkOrder.STATUSES, wo_number=wo_number)
         if not title:
             flash('Title is required.', 'error')
             return render_template('modules/work_orders/add.html',
-                                   locations=locations, equipment_list=equipment_list,
-                                   users=users, priorities=WorkOrder.PRIORITIES,
-                                   statuses=WorkOrder.STATUSES, wo_number=wo_number,
-                                   spare_parts=spare_parts)
+                                   locations=locations, priorities=WorkOrder.PRIORITIES,
+                                   statuses=WorkOrder.STATUSES, wo_number=wo_number)
 
         try:
             conn = get_connection()
@@ -171,12 +928,14 @@ def add():
             # Create work order
             cursor.execute('''
                 INSERT INTO work_orders (work_order_number, title, description, equipment_id,
-                                         location_code, priority, status, assigned_to, created_by, due_date)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                                         location_code, priority, status, assigned_to, created_by, due_date,
+                                         required_skill)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             ''', (work_order_number, title, description or None, equipment_id,
                   location_code or None, priority, status, assigned_to, current_user.id,
-                  due_date or None))
+                  due_date or None, required_skill or None))
             wo_id = cursor.lastrowid
+            store_signature(cursor, wo_id, title, description)
 
             # Issue parts if any
             parts_issued = 0
@@ -184,28 +943,10 @@ def add():
                 part_id = int(part.get('id', 0))
                 qty = int(part.get('quantity', 0))
                 if part_id > 0 and qty > 0:
-                    # Get current MAP and inventory data
-                    cursor.execute('''
-                        SELECT quantity_available, moving_average_price, total_inventory_value
-                        FROM spare_parts WHERE id = ?
-                    ''', (part_id,))
-                    sp_row = cursor.fetchone()
-
-                    if sp_row and sp_row['quantity_available'] >= qty:
-                        current_MAP = sp_row['moving_average_price'] or 0
-                        current_inv_value = sp_row['total_inventory_value'] or 0
-
-                        # Calculate new inventory value after issue (MAP stays same)
-                        new_inv_value = current_inv_value - (qty * current_MAP)
-
-                        # Deduct from inventory and update value
-                        cursor.execute('''
-                            UPDATE spare_parts
-                            SET quantity_available = quantity_available - ?,
-                                total_inventory_value = ?
-                            WHERE id = ?
-                        ''', (qty, new_inv_value, part_id))
+                    # Deduct from inventory only if enough stock remains
+                    current_MAP = issue_stock(cursor, part_id, qty)
 
+                    if current_MAP is not None:
                         # Insert transaction record WITH cost_per_unit
                         cursor.execute('''
                             INSERT INTO work_order_parts (work_order_id, spare_part_id, quantity,
@@ -216,6 +957,7 @@ def add():
 
             conn.commit()
             conn.close()
+            escalation_engine.wake()
 
             msg = f'Work Order "{work_order_number}" created successfully.'
             if parts_issued > 0:
@@ -228,16 +970,12 @@ def add():
             else:
                 flash(f'Error creating work order: {str(e)}', 'error')
             return render_template('modules/work_orders/add.html',
-                                   locations=locations, equipment_list=equipment_list,
-                                   users=users, priorities=WorkOrder.PRIORITIES,
-                                   statuses=WorkOrder.STATUSES, wo_number=wo_number,
-                                   spare_parts=spare_parts)
+                                   locations=locations, priorities=WorkOrder.PRIORITIES,
+                                   statuses=WorkOrder.STATUSES, wo_number=wo_number)
 
     return render_template('modules/work_orders/add.html',
-                           locations=locations, equipment_list=equipment_list,
-                           users=users, priorities=WorkOrder.PRIORITIES,
-                           statuses=WorkOrder.STATUSES, wo_number=wo_number,
-                           spare_parts=spare_parts)
+                           locations=locations, priorities=WorkOrder.PRIORITIES,
+                           statuses=WorkOrder.STATUSES, wo_number=wo_number)
 
 
 @work_orders_bp.route('/view/<int:wo_id>')
@@ -246,39 +984,14 @@ def view_detail(wo_id):
     """View a single work order's details"""
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute('''
-        SELECT wo.*,
-               e.tag_number as equipment_tag,
-               e.description as equipment_desc,
-               u1.username as assigned_to_name,
-               u2.username as created_by_name,
-               ms.schedule_id as schedule_id,
-               ms.name as schedule_name
-        FROM work_orders wo
-        LEFT JOIN equipment e ON wo.equipment_id = e.id
-        LEFT JOIN users u1 ON wo.assigned_to = u1.id
-        LEFT JOIN users u2 ON wo.created_by = u2.id
-        LEFT JOIN maintenance_schedules ms ON wo.maintenance_schedule_id = ms.id
-        WHERE wo.id = ?
-    ''', (wo_id,))
-    row = cursor.fetchone()
+    detail = fetch_work_order_detail(cursor, wo_id)
     conn.close()
 
-    if row is None:
+    if detail is None:
         flash('Work Order not found.', 'error')
         return redirect(url_for('work_orders.work_order_report'))
 
-    wo = WorkOrder.from_row(row)
-    wo.equipment_tag = row['equipment_tag'] if 'equipment_tag' in row.keys() else None
-    wo.equipment_desc = row['equipment_desc'] if 'equipment_desc' in row.keys() else None
-    wo.assigned_to_name = row['assigned_to_name'] if 'assigned_to_name' in row.keys() else None
-    wo.created_by_name = row['created_by_name'] if 'created_by_name' in row.keys() else None
-    wo.schedule_id = row['schedule_id'] if 'schedule_id' in row.keys() else None
-    wo.schedule_name = row['schedule_name'] if 'schedule_name' in row.keys() else None
-
-    # Get issued parts summary
-    issued_parts = get_issued_parts_for_work_order(wo_id)
-
+    wo, issued_parts, _ = detail
     return render_template('modules/work_orders/view_detail.html', work_order=wo, issued_parts=issued_parts)
 
 
@@ -311,22 +1024,17 @@ def change_select():
 def change(wo_id):
     """Change/edit work order"""
     locations = get_active_locations()
-    equipment_list = get_all_equipment()
-    users = get_all_users()
-    spare_parts = get_all_spare_parts()
-    issued_parts = get_issued_parts_for_work_order(wo_id)
 
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute('SELECT * FROM work_orders WHERE id = ?', (wo_id,))
-    row = cursor.fetchone()
+    detail = fetch_work_order_detail(cursor, wo_id)
 
-    if row is None:
+    if detail is None:
         conn.close()
         flash('Work Order not found.', 'error')
         return redirect(url_for('work_orders.change_select'))
 
-    wo = WorkOrder.from_row(row)
+    wo, issued_parts, _ = detail
 
     if request.method == 'POST':
         work_order_number = request.form.get('work_order_number', '').strip()
@@ -338,7 +1046,10 @@ def change(wo_id):
         status = request.form.get('status', 'Open').strip()
         assigned_to = request.form.get('assigned_to', '').strip()
         due_date = request.form.get('due_date', '').strip()
+        required_skill = request.form.get('required_skill', '').strip().lower()
         parts_to_consume = request.form.get('parts_to_consume', '[]')
+        row_version = request.form.get('row_version', type=int)
+        original_values = parse_original_values(request.form.get('original_values'))
 
         # Convert to proper types
         equipment_id = int(equipment_id) if equipment_id else None
@@ -360,39 +1071,47 @@ def change(wo_id):
             flash('Work Order Number is required.', 'error')
             conn.close()
             return render_template('modules/work_orders/change.html', work_order=wo,
-                                   locations=locations, equipment_list=equipment_list,
-                                   users=users, priorities=WorkOrder.PRIORITIES,
-                                   statuses=WorkOrder.STATUSES, spare_parts=spare_parts,
-                                   issued_parts=issued_parts)
+                                   locations=locations, priorities=WorkOrder.PRIORITIES,
+                                   statuses=WorkOrder.STATUSES, issued_parts=issued_parts,
+                                   original_values=editable_values('work_orders', wo))
         if not title:
             flash('Title is required.', 'error')
             conn.close()
             return render_template('modules/work_orders/change.html', work_order=wo,
-                                   locations=locations, equipment_list=equipment_list,
-                                   users=users, priorities=WorkOrder.PRIORITIES,
-                                   statuses=WorkOrder.STATUSES, spare_parts=spare_parts,
-                                   issued_parts=issued_parts)
+                                   locations=locations, priorities=WorkOrder.PRIORITIES,
+                                   statuses=WorkOrder.STATUSES, issued_parts=issued_parts,
+                                   original_values=editable_values('work_orders', wo))
 
         try:
+            # Only write over the version the editor loaded; the trigger bumps it
             if completed_at:
                 cursor.execute('''
                     UPDATE work_orders
                     SET work_order_number = ?, title = ?, description = ?, equipment_id = ?,
                         location_code = ?, priority = ?, status = ?, assigned_to = ?,
-                        due_date = ?, completed_at = ?
-                    WHERE id = ?
+                        due_date = ?, required_skill = ?, completed_at = ?
+                    WHERE id = ? AND row_version = ?
                 ''', (work_order_number, title, description or None, equipment_id,
                       location_code or None, priority, status, assigned_to,
-                      due_date or None, completed_at, wo_id))
+                      due_date or None, required_skill or None, completed_at, wo_id, row_version))
             else:
                 cursor.execute('''
                     UPDATE work_orders
                     SET work_order_number = ?, title = ?, description = ?, equipment_id = ?,
-                        location_code = ?, priority = ?, status = ?, assigned_to = ?, due_date = ?
-                    WHERE id = ?
+                        location_code = ?, priority = ?, status = ?, assigned_to = ?, due_date = ?,
+                        required_skill = ?
+                    WHERE id = ? AND row_version = ?
                 ''', (work_order_number, title, description or None, equipment_id,
                       location_code or None, priority, status, assigned_to,
-                      due_date or None, wo_id))
+                      due_date or None, required_skill or None, wo_id, row_version))
+
+            if cursor.rowcount == 0:
+                conn.rollback()
+                _, fields = changed_fields(cursor, 'work_orders', wo_id, original_values)
+                conn.close()
+                flash(conflict_message(f'Work Order "{wo.work_order_number}"', fields), 'error')
+                return redirect(url_for('work_orders.change', wo_id=wo_id))
+            store_signature(cursor, wo_id, title, description)
 
             # Issue parts if any (only if work order is not Completed/Cancelled)
             parts_issued = 0
@@ -401,28 +1120,10 @@ def change(wo_id):
                     part_id = int(part.get('id', 0))
                     qty = int(part.get('quantity', 0))
                     if part_id > 0 and qty > 0:
-                        # Get current MAP and inventory data
-                        cursor.execute('''
-                            SELECT quantity_available, moving_average_price, total_inventory_value
-                            FROM spare_parts WHERE id = ?
-                        ''', (part_id,))
-                        sp_row = cursor.fetchone()
-
-                        if sp_row and sp_row['quantity_available'] >= qty:
-                            current_MAP = sp_row['moving_average_price'] or 0
-                            current_inv_value = sp_row['total_inventory_value'] or 0
-
-                            # Calculate new inventory value after issue (MAP stays same)
-                            new_inv_value = current_inv_value - (qty * current_MAP)
-
-                            # Deduct from inventory and update value
-                            cursor.execute('''
-                                UPDATE spare_parts
-                                SET quantity_available = quantity_available - ?,
-                                    total_inventory_value = ?
-                                WHERE id = ?
-                            ''', (qty, new_inv_value, part_id))
+                        # Deduct from inventory only if enough stock remains
+                        current_MAP = issue_stock(cursor, part_id, qty)
 
+                        if current_MAP is not None:
                             # Insert transaction record WITH cost_per_unit
                             cursor.execute('''
                                 INSERT INTO work_order_parts (work_order_id, spare_part_id, quantity,
@@ -432,39 +1133,12 @@ def change(wo_id):
                             parts_issued += 1
 
             # If work order completed and linked to a maintenance schedule, advance the schedule
-            if status == 'Completed' and wo.status != 'Completed' and row['maintenance_schedule_id']:
-                schedule_id = row['maintenance_schedule_id']
-                cursor.execute('SELECT * FROM maintenance_schedules WHERE id = ?', (schedule_id,))
-                schedule_row = cursor.fetchone()
-
-                if schedule_row:
-                    schedule = MaintenanceSchedule.from_row(schedule_row)
-                    completed_date = datetime.now().strftime('%Y-%m-%d')
-
-                    if schedule.is_time_based():
-                        next_due = MaintenanceSchedule.calculate_next_due_date(schedule.frequency, completed_date)
-                        cursor.execute('''
-                            UPDATE maintenance_schedules
-                            SET last_performed_date = ?, next_due_date = ?
-                            WHERE id = ?
-                        ''', (completed_date, next_due, schedule_id))
-                    else:  # meter-based
-                        cursor.execute('''
-                            SELECT reading_value FROM meter_readings
-                            WHERE equipment_id = ?
-                            ORDER BY recorded_at DESC LIMIT 1
-                        ''', (schedule.equipment_id,))
-                        meter_row = cursor.fetchone()
-                        current_reading = meter_row['reading_value'] if meter_row else schedule.last_meter_reading or 0
-                        next_meter = MaintenanceSchedule.calculate_next_due_meter(current_reading, schedule.meter_interval)
-                        cursor.execute('''
-                            UPDATE maintenance_schedules
-                            SET last_performed_date = ?, last_meter_reading = ?, next_due_meter = ?
-                            WHERE id = ?
-                        ''', (completed_date, current_reading, next_meter, schedule_id))
+            if status == 'Completed' and wo.status != 'Completed' and wo.maintenance_schedule_id:
+                advance_schedules_for_work_orders(cursor, [wo_id], datetime.now().strftime('%Y-%m-%d'))
 
             conn.commit()
             conn.close()
+            escalation_engine.wake()
 
             msg = f'Work Order "{work_order_number}" updated successfully.'
             if parts_issued > 0:
@@ -475,82 +1149,319 @@ def change(wo_id):
             conn.close()
             flash(f'Error updating work order: {str(e)}', 'error')
             return render_template('modules/work_orders/change.html', work_order=wo,
-                                   locations=locations, equipment_list=equipment_list,
-                                   users=users, priorities=WorkOrder.PRIORITIES,
-                                   statuses=WorkOrder.STATUSES, spare_parts=spare_parts,
-                                   issued_parts=issued_parts)
+                                   locations=locations, priorities=WorkOrder.PRIORITIES,
+                                   statuses=WorkOrder.STATUSES, issued_parts=issued_parts,
+                                   original_values=editable_values('work_orders', wo))
 
     conn.close()
     return render_template('modules/work_orders/change.html', work_order=wo,
-                           locations=locations, equipment_list=equipment_list,
-                           users=users, priorities=WorkOrder.PRIORITIES,
-                           statuses=WorkOrder.STATUSES, spare_parts=spare_parts,
-                           issued_parts=issued_parts)
+                           locations=locations, priorities=WorkOrder.PRIORITIES,
+                           statuses=WorkOrder.STATUSES, issued_parts=issued_parts,
+                           original_values=editable_values('work_orders', wo))
 
 
-@work_orders_bp.route('/api/equipment/<int:equip_id>/location')
+# Fields the work order update API may change
+API_UPDATE_FIELDS = ['work_order_number', 'title', 'description', 'equipment_id', 'location_code',
+                     'priority', 'status', 'assigned_to', 'due_date', 'required_skill']
+
+
+@work_orders_bp.route('/api/<int:wo_id>/update', methods=['POST'])
 @login_required
-def get_equipment_location(equip_id):
-    """API endpoint to get equipment location for auto-fill"""
+def api_update_work_order(wo_id):
+    """API endpoint to update a work order with optimistic concurrency"""
+    # Body: {"row_version": 3, "fields": {...}, "original": {...}}; a stale row_version gets a 409
+    data = request.get_json(silent=True) or {}
+    fields = data.get('fields')
+    row_version = data.get('row_version')
+    if not isinstance(fields, dict) or not fields:
+        return jsonify({'error': 'fields must be a non-empty object'}), 400
+    if not isinstance(row_version, int):
+        return jsonify({'error': 'row_version must be an integer'}), 400
+    unknown = sorted(set(fields) - set(API_UPDATE_FIELDS))
+    if unknown:
+        return jsonify({'error': f'Unknown or read-only fields: {", ".join(unknown)}'}), 400
+    if 'priority' in fields and fields['priority'] not in WorkOrder.PRIORITIES:
+        return jsonify({'error': f'priority must be one of: {", ".join(WorkOrder.PRIORITIES)}'}), 400
+    if 'status' in fields and fields['status'] not in WorkOrder.STATUSES:
+        return jsonify({'error': f'status must be one of: {", ".join(WorkOrder.STATUSES)}'}), 400
+    for required in ('work_order_number', 'title'):
+        if required in fields and not str(fields[required] or '').strip():
+            return jsonify({'error': f'{required} cannot be empty'}), 400
+
+    values = {}
+    for field, value in fields.items():
+        if field in ('equipment_id', 'assigned_to'):
+            try:
+                values[field] = int(value) if value not in (None, '') else None
+            except (TypeError, ValueError):
+                return jsonify({'error': f'{field} must be an integer or null'}), 400
+        else:
+            values[field] = (str(value).strip() or None) if value is not None else None
+    if values.get('required_skill'):
+        values['required_skill'] = values['required_skill'].lower()
+
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute('SELECT location FROM equipment WHERE id = ?', (equip_id,))
-    row = cursor.fetchone()
-    conn.close()
+    try:
+        cursor.execute('SELECT status, maintenance_schedule_id FROM work_orders WHERE id = ?', (wo_id,))
+        row = cursor.fetchone()
+        if row is None:
+            return jsonify({'error': 'Work Order not found.'}), 404
+
+        completing = values.get('status') == 'Completed' and row['status'] != 'Completed'
+        if completing:
+            values['completed_at'] = datetime.now()
+
+        assignments = ', '.join(f'{field} = ?' for field in values)
+        cursor.execute(f'''
+            UPDATE work_orders SET {assignments}
+            WHERE id = ? AND row_version = ?
+        ''', list(values.values()) + [wo_id, row_version])
+
+        if cursor.rowcount == 0:
+            conn.rollback()
+            original = parse_original_values(data.get('original')) or fields
+            current, changed = changed_fields(cursor, 'work_orders', wo_id, original)
+            if current is None:
+                return jsonify({'error': 'Work Order not found.'}), 404
+            return jsonify({
+                'error': 'This work order was changed by someone else.',
+                'row_version': current['row_version'],
+                'changed_fields': changed,
+                'current': {column: current[column] for column in current.keys()}
+            }), 409
+
+        if completing and row['maintenance_schedule_id']:
+            advance_schedules_for_work_orders(cursor, [wo_id], datetime.now().strftime('%Y-%m-%d'))
+
+        conn.commit()
+        escalation_engine.wake()
+        cursor.execute('SELECT * FROM work_orders WHERE id = ?', (wo_id,))
+        return jsonify({'work_order': WorkOrder.from_row(cursor.fetchone()).to_dict()})
+    except Exception as e:
+        conn.rollback()
+        return jsonify({'error': f'Error updating work order: {str(e)}'}), 500
+    finally:
+        conn.close()
 
-    if row and row['location']:
-        return jsonify({'location_code': row['location']})
-    return jsonify({'location_code': ''})
 
+@work_orders_bp.route('/bulk-complete', methods=['GET', 'POST'])
+@login_required
+def bulk_complete():
+    """Complete many open PM work orders at once (e.g. after a turnaround)"""
+    if request.method == 'POST':
+        wo_ids = [int(wo_id) for wo_id in request.form.getlist('work_order_ids') if wo_id.isdigit()]
+        if not wo_ids:
+            flash('Please select at least one work order.', 'error')
+        else:
+            try:
+                summary = bulk_complete_work_orders(wo_ids)
+                flash(f'{len(summary["completed"])} work order(s) completed, '
+                      f'{summary["schedules_advanced"]} schedule(s) advanced.', 'success')
+                if summary['skipped']:
+                    flash(f'Skipped (already closed): {", ".join(summary["skipped"])}', 'info')
+            except Exception as e:
+                flash(f'Error completing work orders: {str(e)}', 'error')
+        return redirect(url_for('work_orders.bulk_complete'))
 
-def get_all_spare_parts():
-    """Fetch all spare parts for dropdown"""
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute("SELECT * FROM spare_parts ORDER BY description")
+    cursor.execute('''
+        SELECT wo.*, e.tag_number as equipment_tag, ms.schedule_id as schedule_code
+        FROM work_orders wo
+        LEFT JOIN equipment e ON wo.equipment_id = e.id
+        JOIN maintenance_schedules ms ON wo.maintenance_schedule_id = ms.id
+        WHERE wo.status IN ('Open', 'In Progress', 'On Hold')
+        ORDER BY wo.due_date, wo.work_order_number
+    ''')
     rows = cursor.fetchall()
     conn.close()
-    return [SparePart.from_row(row) for row in rows]
 
+    work_orders = []
+    for row in rows:
+        wo = WorkOrder.from_row(row)
+        wo.equipment_tag = row['equipment_tag']
+        wo.schedule_code = row['schedule_code']
+        work_orders.append(wo)
+
+    return render_template('modules/work_orders/bulk_complete.html', work_orders=work_orders)
+
+
+@work_orders_bp.route('/api/bulk-complete', methods=['POST'])
+@login_required
+def api_bulk_complete():
+    """API endpoint to complete many work orders. Body: {"work_order_ids": [...]}"""
+    data = request.get_json(silent=True) or {}
+    try:
+        wo_ids = [int(wo_id) for wo_id in data.get('work_order_ids', [])]
+    except (TypeError, ValueError):
+        return jsonify({'error': 'work_order_ids must be a list of integers'}), 400
+
+    if not wo_ids:
+        return jsonify({'error': 'No work orders given'}), 400
+
+    try:
+        summary = bulk_complete_work_orders(wo_ids)
+    except Exception as e:
+        return jsonify({'error': f'Error completing work orders: {str(e)}'}), 500
+
+    return jsonify(summary)
+
+
+# Report filter arguments carried through a mass status change
+REPORT_FILTER_ARGS = ['filtered', 'status', 'priority', 'equipment_id', 'assigned_to',
+                      'date_from', 'date_to', 'q', 'sort']
+
+
+@work_orders_bp.route('/bulk-status', methods=['POST'])
+@login_required
+def bulk_status():
+    """Move the selected work orders, or all matching the report filters, to a new status"""
+    target_status = request.form.get('target_status', '').strip()
+    report_args = {key: request.form.getlist(key) for key in REPORT_FILTER_ARGS if key in request.form}
+    redirect_url = url_for('work_orders.work_order_report', **report_args)
 
-def get_issued_parts_for_work_order(wo_id):
-    """Get all issued parts for a work order with net quantities and costs"""
+    if target_status not in WorkOrder.STATUSES:
+        flash('Please select a target status.', 'error')
+        return redirect(redirect_url)
+
+    try:
+        if request.form.get('scope') == 'filter':
+            summary = transition_work_orders(target_status, filters=parse_report_filters(request.form))
+        else:
+            wo_ids = [int(wo_id) for wo_id in request.form.getlist('work_order_ids') if wo_id.isdigit()]
+            if not wo_ids:
+                flash('Please select at least one work order.', 'error')
+                return redirect(redirect_url)
+            summary = transition_work_orders(target_status, wo_ids=wo_ids)
+    except Exception as e:
+        flash(f'Error changing work order status: {str(e)}', 'error')
+        return redirect(redirect_url)
+
+    msg = f'{len(summary["transitioned"])} work order(s) moved to {target_status}.'
+    if summary['schedules_advanced']:
+        msg += f' {summary["schedules_advanced"]} schedule(s) advanced.'
+    flash(msg, 'success')
+    if summary['skipped']:
+        flash(f'Skipped (cannot move to {target_status}): '
+              f'{", ".join(item["work_order_number"] + " (" + item["status"] + ")" for item in summary["skipped"])}',
+              'info')
+    return redirect(redirect_url)
+
+
+@work_orders_bp.route('/api/bulk-status', methods=['POST'])
+@login_required
+def api_bulk_status():
+    """API endpoint for mass status changes"""
+    # Body: {"status": "Cancelled", "work_order_ids": [...]} or {"status": ..., "filters": {...}}
+    data = request.get_json(silent=True) or {}
+    target_status = data.get('status')
+    if target_status not in WorkOrder.STATUSES:
+        return jsonify({'error': f'status must be one of: {", ".join(WorkOrder.STATUSES)}'}), 400
+
+    try:
+        if 'filters' in data:
+            if not isinstance(data['filters'], dict):
+                return jsonify({'error': 'filters must be an object'}), 400
+            args = MultiDict(data['filters'])
+            if 'status' in data['filters']:
+                args['filtered'] = '1'
+            summary = transition_work_orders(target_status, filters=parse_report_filters(args))
+        else:
+            try:
+                wo_ids = [int(wo_id) for wo_id in data.get('work_order_ids', [])]
+            except (TypeError, ValueError):
+                return jsonify({'error': 'work_order_ids must be a list of integers'}), 400
+            if not wo_ids:
+                return jsonify({'error': 'No work orders given'}), 400
+            summary = transition_work_orders(target_status, wo_ids=wo_ids)
+    except Exception as e:
+        return jsonify({'error': f'Error changing work order status: {str(e)}'}), 500
+
+    return jsonify(summary)
+
+
+@work_orders_bp.route('/api/equipment/<int:equip_id>/location')
+@login_required
+def get_equipment_location(equip_id):
+    """API endpoint to get equipment location for auto-fill"""
     conn = get_connection()
     cursor = conn.cursor()
-    # Get net quantity per spare part (issues minus returns) with weighted average cost
-    cursor.execute('''
-        SELECT sp.id as spare_part_id, sp.description, sp.storage_location, sp.storage_bin,
-               SUM(CASE WHEN wop.transaction_type = 'issue' THEN wop.quantity ELSE -wop.quantity END) as net_quantity,
-               AVG(CASE WHEN wop.transaction_type = 'issue' THEN wop.cost_per_unit END) as avg_cost_per_unit,
-               SUM(CASE WHEN wop.transaction_type = 'issue' THEN wop.quantity * wop.cost_per_unit
-                        ELSE -wop.quantity * wop.cost_per_unit END) as total_cost
-        FROM work_order_parts wop
-        JOIN spare_parts sp ON wop.spare_part_id = sp.id
-        WHERE wop.work_order_id = ?
-        GROUP BY sp.id
-        HAVING net_quantity > 0
-        ORDER BY sp.description
-    ''', (wo_id,))
-    rows = cursor.fetchall()
+    cursor.execute('SELECT location FROM equipment WHERE id = ?', (equip_id,))
+    row = cursor.fetchone()
     conn.close()
-    return [dict(row) for row in rows]
 
+    if row and row['location']:
+        return jsonify({'location_code': row['location']})
+    return jsonify({'location_code': ''})
 
-def get_parts_transaction_history(wo_id):
-    """Get full transaction history for a work order"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT wop.*, sp.description as spare_part_desc, u.username as transacted_by_name
-        FROM work_order_parts wop
-        JOIN spare_parts sp ON wop.spare_part_id = sp.id
-        LEFT JOIN users u ON wop.transacted_by = u.id
-        WHERE wop.work_order_id = ?
-        ORDER BY wop.transacted_at DESC
+
+def fetch_work_order_detail(cursor, wo_id, with_history=False):
+    """Load a work order with its issued parts (and history) in one query, or None"""
+    history_sql = '''
+               (SELECT json_group_array(json_object(
+                           'id', wop.id, 'work_order_id', wop.work_order_id,
+                           'spare_part_id', wop.spare_part_id, 'quantity', wop.quantity,
+                           'transaction_type', wop.transaction_type, 'transacted_by', wop.transacted_by,
+                           'transacted_at', wop.transacted_at, 'notes', wop.notes,
+                           'cost_per_unit', wop.cost_per_unit,
+                           'spare_part_desc', sp.description, 'transacted_by_name', u.username))
+                FROM work_order_parts wop
+                JOIN spare_parts sp ON wop.spare_part_id = sp.id
+                LEFT JOIN users u ON wop.transacted_by = u.id
+                WHERE wop.work_order_id = wo.id) as history_json
+    ''' if with_history else "'[]' as history_json"
+
+    cursor.execute(f'''
+        SELECT wo.*,
+               e.tag_number as equipment_tag,
+               e.description as equipment_desc,
+               e.location as equipment_location,
+               u1.username as assigned_to_name,
+               u1.role as assigned_to_role,
+               u2.username as created_by_name,
+               ms.schedule_id as schedule_id,
+               ms.name as schedule_name,
+               (SELECT json_group_array(json_object(
+                           'spare_part_id', p.spare_part_id, 'description', p.description,
+                           'storage_location', p.storage_location, 'storage_bin', p.storage_bin,
+                           'net_quantity', p.net_quantity, 'avg_cost_per_unit', p.avg_cost_per_unit,
+                           'total_cost', p.total_cost))
+                FROM (
+                    SELECT sp.id as spare_part_id, sp.description, sp.storage_location, sp.storage_bin,
+                           SUM(CASE WHEN wop.transaction_type = 'issue' THEN wop.quantity ELSE -wop.quantity END) as net_quantity,
+                           AVG(CASE WHEN wop.transaction_type = 'issue' THEN wop.cost_per_unit END) as avg_cost_per_unit,
+                           SUM(CASE WHEN wop.transaction_type = 'issue' THEN wop.quantity * wop.cost_per_unit
+                                    ELSE -wop.quantity * wop.cost_per_unit END) as total_cost
+                    FROM work_order_parts wop
+                    JOIN spare_parts sp ON wop.spare_part_id = sp.id
+                    WHERE wop.work_order_id = wo.id
+                    GROUP BY sp.id
+                    HAVING net_quantity > 0
+                ) p) as issued_parts_json,
+               {history_sql}
+        FROM work_orders wo
+        LEFT JOIN equipment e ON wo.equipment_id = e.id
+        LEFT JOIN users u1 ON wo.assigned_to = u1.id
+        LEFT JOIN users u2 ON wo.created_by = u2.id
+        LEFT JOIN maintenance_schedules ms ON wo.maintenance_schedule_id = ms.id
+        WHERE wo.id = ?
     ''', (wo_id,))
-    rows = cursor.fetchall()
-    conn.close()
-    return [dict(row) for row in rows]
+    row = cursor.fetchone()
+    if row is None:
+        return None
+
+    wo = WorkOrder.from_row(row)
+    for field in ['equipment_tag', 'equipment_desc', 'equipment_location', 'assigned_to_name',
+                  'assigned_to_role', 'created_by_name', 'schedule_id', 'schedule_name']:
+        setattr(wo, field, row[field])
+    wo.maintenance_schedule_id = row['maintenance_schedule_id']
+
+    # json_group_array does not guarantee element order, so sort here
+    issued_parts = sorted(json.loads(row['issued_parts_json']), key=lambda part: part['description'])
+    history = sorted(json.loads(row['history_json']),
+                     key=lambda entry: (entry['transacted_at'] or '', entry['id']), reverse=True)
+    return wo, issued_parts, history
 
 
 @work_orders_bp.route('/view/<int:wo_id>/goods-issue', methods=['GET', 'POST'])
@@ -559,24 +1470,14 @@ def goods_issue(wo_id):
     """Goods issue page - issue spare parts to work order"""
     conn = get_connection()
     cursor = conn.cursor()
+    detail = fetch_work_order_detail(cursor, wo_id, with_history=True)
 
-    # Get work order
-    cursor.execute('''
-        SELECT wo.*, e.tag_number as equipment_tag, e.description as equipment_desc
-        FROM work_orders wo
-        LEFT JOIN equipment e ON wo.equipment_id = e.id
-        WHERE wo.id = ?
-    ''', (wo_id,))
-    row = cursor.fetchone()
-
-    if row is None:
+    if detail is None:
         conn.close()
         flash('Work Order not found.', 'error')
         return redirect(url_for('work_orders.work_order_report'))
 
-    wo = WorkOrder.from_row(row)
-    wo.equipment_tag = row['equipment_tag'] if 'equipment_tag' in row.keys() else None
-    wo.equipment_desc = row['equipment_desc'] if 'equipment_desc' in row.keys() else None
+    wo, issued_parts, transaction_history = detail
 
     # Check if work order allows issuing parts
     if wo.status in ['Completed', 'Cancelled']:
@@ -598,31 +1499,19 @@ def goods_issue(wo_id):
             spare_part_id = int(spare_part_id)
             quantity = int(quantity)
 
-            # Check spare part stock
-            cursor.execute('SELECT * FROM spare_parts WHERE id = ?', (spare_part_id,))
-            sp_row = cursor.fetchone()
-
-            if sp_row is None:
-                flash('Spare part not found.', 'error')
-            elif sp_row['quantity_available'] < quantity:
-                flash(f'Insufficient stock. Only {sp_row["quantity_available"]} available.', 'error')
-            else:
-                try:
-                    # Get current MAP and inventory value
-                    current_MAP = sp_row['moving_average_price'] or 0
-                    current_inv_value = sp_row['total_inventory_value'] or 0
-
-                    # Calculate new inventory value after issue (MAP stays same)
-                    new_inv_value = current_inv_value - (quantity * current_MAP)
-
-                    # Deduct from inventory and update value
-                    cursor.execute('''
-                        UPDATE spare_parts
-                        SET quantity_available = quantity_available - ?,
-                            total_inventory_value = ?
-                        WHERE id = ?
-                    ''', (quantity, new_inv_value, spare_part_id))
+            try:
+                # Deduct from inventory only if enough stock remains
+                current_MAP = issue_stock(cursor, spare_part_id, quantity)
 
+                if current_MAP is None:
+                    conn.rollback()
+                    cursor.execute('SELECT quantity_available FROM spare_parts WHERE id = ?', (spare_part_id,))
+                    sp_row = cursor.fetchone()
+                    if sp_row is None:
+                        flash('Spare part not found.', 'error')
+                    else:
+                        flash(f'Insufficient stock. Only {sp_row["quantity_available"]} available.', 'error')
+                else:
                     # Insert transaction record WITH cost_per_unit
                     cursor.execute('''
                         INSERT INTO work_order_parts (work_order_id, spare_part_id, quantity,
@@ -630,122 +1519,342 @@ def goods_issue(wo_id):
                         VALUES (?, ?, ?, 'issue', ?, ?, ?)
                     ''', (wo_id, spare_part_id, quantity, current_user.id, notes or None, current_MAP))
 
+                    cursor.execute('SELECT description FROM spare_parts WHERE id = ?', (spare_part_id,))
+                    sp_desc = cursor.fetchone()['description']
                     conn.commit()
-                    flash(f'Successfully issued {quantity} units of "{sp_row["description"]}".', 'success')
-                except Exception as e:
-                    conn.rollback()
-                    flash(f'Error issuing parts: {str(e)}', 'error')
+                    flash(f'Successfully issued {quantity} units of "{sp_desc}".', 'success')
 
-    conn.close()
+                    # Reload so the page shows the new issue
+                    wo, issued_parts, transaction_history = fetch_work_order_detail(
+                        cursor, wo_id, with_history=True)
+            except Exception as e:
+                conn.rollback()
+                flash(f'Error issuing parts: {str(e)}', 'error')
 
-    # Get data for display
-    spare_parts = get_all_spare_parts()
-    issued_parts = get_issued_parts_for_work_order(wo_id)
-    transaction_history = get_parts_transaction_history(wo_id)
+    conn.close()
 
     return render_template('modules/work_orders/goods_issue.html',
-                           work_order=wo, spare_parts=spare_parts,
+                           work_order=wo,
                            issued_parts=issued_parts, transaction_history=transaction_history)
 
 
-@work_orders_bp.route('/view/<int:wo_id>/goods-return/<int:part_id>', methods=['POST'])
-@login_required
-def goods_return(wo_id, part_id):
-    """Return spare parts from work order back to inventory"""
+def bulk_issue_parts(wo_id, lines, user_id):
+    """Issue many spare parts to a work order in one transaction; returns one result per line"""
+    results = []
+    part_ids = sorted({line['spare_part_id'] for line in lines})
+
     conn = get_connection()
     cursor = conn.cursor()
+    try:
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute('SELECT status FROM work_orders WHERE id = ?', (wo_id,))
+        row = cursor.fetchone()
+        if row is None:
+            raise ValueError('Work Order not found.')
+        if row['status'] in ['Completed', 'Cancelled']:
+            raise ValueError(f'Cannot issue parts to a {row["status"]} work order.')
+
+        placeholders = ','.join('?' * len(part_ids))
+        cursor.execute(f'''
+            SELECT id, description, quantity_available
+            FROM spare_parts WHERE id IN ({placeholders})
+        ''', part_ids)
+        parts = {row['id']: row for row in cursor.fetchall()}
+
+        remaining = {part_id: row['quantity_available'] or 0 for part_id, row in parts.items()}
+        issued = {}
+        for index, line in enumerate(lines):
+            part = parts.get(line['spare_part_id'])
+            result = {'line': index, 'spare_part_id': line['spare_part_id'], 'quantity': line['quantity']}
+            if part is None:
+                result.update(status='error', error='Spare part not found.')
+            elif remaining[part['id']] < line['quantity']:
+                result.update(status='error',
+                              error=f'Insufficient stock. Only {remaining[part["id"]]} available.')
+            else:
+                remaining[part['id']] -= line['quantity']
+                issued[part['id']] = issued.get(part['id'], 0) + line['quantity']
+                result.update(status='issued', description=part['description'])
+            results.append(result)
+
+        # One conditional stock movement per part, valued at MAP in SQL
+        costs = {part_id: issue_stock(cursor, part_id, quantity) for part_id, quantity in issued.items()}
+
+        transactions = []
+        for line, result in zip(lines, results):
+            if result['status'] != 'issued':
+                continue
+            cost_per_unit = costs[line['spare_part_id']]
+            if cost_per_unit is None:
+                result.update(status='error', error='Insufficient stock. Stock changed while posting.')
+                result.pop('description', None)
+                continue
+            result['cost_per_unit'] = cost_per_unit
+            transactions.append((wo_id, line['spare_part_id'], line['quantity'], user_id,
+                                 line['notes'] or None, cost_per_unit))
+
+        if transactions:
+            cursor.executemany('''
+                INSERT INTO work_order_parts (work_order_id, spare_part_id, quantity,
+                                              transaction_type, transacted_by, notes, cost_per_unit)
+                VALUES (?, ?, ?, 'issue', ?, ?, ?)
+            ''', transactions)
 
-    # Get work order
-    cursor.execute('SELECT * FROM work_orders WHERE id = ?', (wo_id,))
-    wo_row = cursor.fetchone()
-
-    if wo_row is None:
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
         conn.close()
-        flash('Work Order not found.', 'error')
-        return redirect(url_for('work_orders.work_order_report'))
 
-    wo = WorkOrder.from_row(wo_row)
+    return results
 
-    # Check if work order allows returning parts
-    if wo.status in ['Completed', 'Cancelled']:
-        conn.close()
-        flash(f'Cannot return parts from a {wo.status} work order.', 'error')
-        return redirect(url_for('work_orders.view_detail', wo_id=wo_id))
 
-    # Get the net issued quantity for this part
-    cursor.execute('''
-        SELECT SUM(CASE WHEN transaction_type = 'issue' THEN quantity ELSE -quantity END) as net_qty
-        FROM work_order_parts
-        WHERE work_order_id = ? AND spare_part_id = ?
-    ''', (wo_id, part_id))
-    net_row = cursor.fetchone()
-    net_issued = net_row['net_qty'] if net_row and net_row['net_qty'] else 0
+@work_orders_bp.route('/api/<int:wo_id>/goods-issue', methods=['POST'])
+@login_required
+def api_goods_issue(wo_id):
+    """API endpoint to issue several spare parts to a work order at once"""
+    # Body: {"lines": [{"spare_part_id": 1, "quantity": 2, "notes": "..."}, ...]}
+    data = request.get_json(silent=True) or {}
+    raw_lines = data.get('lines')
+    if not isinstance(raw_lines, list) or not raw_lines:
+        return jsonify({'error': 'lines must be a non-empty list'}), 400
+
+    lines = []
+    for index, raw in enumerate(raw_lines):
+        try:
+            spare_part_id = int(raw.get('spare_part_id'))
+            quantity = int(raw.get('quantity'))
+        except (AttributeError, TypeError, ValueError):
+            return jsonify({'error': f'Line {index}: spare_part_id and quantity must be integers'}), 400
+        if quantity <= 0:
+            return jsonify({'error': f'Line {index}: quantity must be a positive integer'}), 400
+        lines.append({'spare_part_id': spare_part_id, 'quantity': quantity,
+                      'notes': str(raw.get('notes') or '').strip()})
 
-    quantity = request.form.get('quantity', '').strip()
-    notes = request.form.get('notes', '').strip()
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT status FROM work_orders WHERE id = ?', (wo_id,))
+    row = cursor.fetchone()
+    conn.close()
 
-    if not quantity or not quantity.isdigit() or int(quantity) <= 0:
-        conn.close()
-        flash('Please enter a valid quantity (positive integer).', 'error')
-        return redirect(url_for('work_orders.goods_issue', wo_id=wo_id))
+    if row is None:
+        return jsonify({'error': 'Work Order not found.'}), 404
+    if row['status'] in ['Completed', 'Cancelled']:
+        return jsonify({'error': f'Cannot issue parts to a {row["status"]} work order.'}), 400
 
-    quantity = int(quantity)
+    try:
+        results = bulk_issue_parts(wo_id, lines, current_user.id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        return jsonify({'error': f'Error issuing parts: {str(e)}'}), 500
+
+    return jsonify({
+        'work_order_id': wo_id,
+        'issued_count': sum(1 for result in results if result['status'] == 'issued'),
+        'error_count': sum(1 for result in results if result['status'] == 'error'),
+        'lines': results
+    })
 
-    if quantity > net_issued:
-        conn.close()
-        flash(f'Cannot return more than issued. Maximum returnable: {net_issued}.', 'error')
-        return redirect(url_for('work_orders.goods_issue', wo_id=wo_id))
 
-    # Get spare part for message
-    cursor.execute('SELECT description FROM spare_parts WHERE id = ?', (part_id,))
-    sp_row = cursor.fetchone()
-    sp_desc = sp_row['description'] if sp_row else 'Unknown'
+def bulk_return_parts(wo_id, lines, user_id, kit_notes=''):
+    """Return issued spare parts (all of them when lines is None) from a work order in one transaction"""
+    # Raises LookupError for a missing work order, ValueError for a closed one
+    results = []
 
+    conn = get_connection()
+    cursor = conn.cursor()
     try:
-        # Calculate weighted average cost from all issues
-        cursor.execute('''
-            SELECT AVG(cost_per_unit) as avg_cost, SUM(quantity) as total_issued
-            FROM work_order_parts
-            WHERE work_order_id = ? AND spare_part_id = ? AND transaction_type = 'issue'
-        ''', (wo_id, part_id))
-        issue_summary = cursor.fetchone()
-        weighted_avg_cost = issue_summary['avg_cost'] if issue_summary and issue_summary['avg_cost'] else 0
-
-        # Get current inventory data
-        cursor.execute('''
-            SELECT quantity_available, moving_average_price, total_inventory_value
-            FROM spare_parts WHERE id = ?
-        ''', (part_id,))
-        sp_inv_row = cursor.fetchone()
-        current_qty = sp_inv_row['quantity_available'] or 0
-        current_inv_value = sp_inv_row['total_inventory_value'] or 0
-
-        # Calculate new values after return
-        new_qty = current_qty + quantity
-        new_inv_value = current_inv_value + (quantity * weighted_avg_cost)
-        new_MAP = new_inv_value / new_qty if new_qty > 0 else 0
-
-        # Add back to inventory
-        cursor.execute('''
-            UPDATE spare_parts
-            SET quantity_available = ?,
-                total_inventory_value = ?,
-                moving_average_price = ?
-            WHERE id = ?
-        ''', (new_qty, new_inv_value, new_MAP, part_id))
-
-        # Insert return transaction record WITH cost_per_unit
-        cursor.execute('''
-            INSERT INTO work_order_parts (work_order_id, spare_part_id, quantity,
-                                          transaction_type, transacted_by, notes, cost_per_unit)
-            VALUES (?, ?, ?, 'return', ?, ?, ?)
-        ''', (wo_id, part_id, quantity, current_user.id, notes or None, weighted_avg_cost))
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute('SELECT status FROM work_orders WHERE id = ?', (wo_id,))
+        row = cursor.fetchone()
+        if row is None:
+            raise LookupError('Work Order not found.')
+        if row['status'] in ['Completed', 'Cancelled']:
+            raise ValueError(f'Cannot return parts from a {row["status"]} work order.')
+
+        # Returns are valued at the average cost of the part's issues to this work order
+        net_columns = '''
+                   COALESCE(SUM(CASE WHEN wop.transaction_type = 'issue' THEN wop.quantity
+                                     ELSE -wop.quantity END), 0) as net_qty,
+                   AVG(CASE WHEN wop.transaction_type = 'issue' THEN wop.cost_per_unit END) as avg_cost
+        '''
+        if lines is None:
+            # Whole kit: aggregate only this work order's transactions
+            cursor.execute(f'''
+                SELECT sp.id, sp.description, {net_columns}
+                FROM work_order_parts wop
+                JOIN spare_parts sp ON wop.spare_part_id = sp.id
+                WHERE wop.work_order_id = ?
+                GROUP BY sp.id
+            ''', (wo_id,))
+        else:
+            part_ids = sorted({line['spare_part_id'] for line in lines})
+            cursor.execute(f'''
+                SELECT sp.id, sp.description, {net_columns}
+                FROM spare_parts sp
+                LEFT JOIN work_order_parts wop ON wop.spare_part_id = sp.id AND wop.work_order_id = ?
+                WHERE sp.id IN ({','.join('?' * len(part_ids))})
+                GROUP BY sp.id
+            ''', [wo_id] + part_ids)
+        parts = {row['id']: row for row in cursor.fetchall()}
+
+        if lines is None:
+            lines = [{'spare_part_id': part_id, 'quantity': None, 'notes': kit_notes}
+                     for part_id, row in sorted(parts.items()) if row['net_qty'] > 0]
+
+        remaining = {part_id: row['net_qty'] for part_id, row in parts.items()}
+        returned = {}
+        transactions = []
+        for index, line in enumerate(lines):
+            part = parts.get(line['spare_part_id'])
+            quantity = line['quantity']
+            if part is not None and quantity is None:
+                quantity = remaining[part['id']]
+            result = {'line': index, 'spare_part_id': line['spare_part_id'], 'quantity': quantity}
+            if part is None:
+                result.update(status='error', error='Spare part not found.')
+            elif remaining[part['id']] <= 0:
+                result.update(status='error', error='Nothing left to return for this part.')
+            elif quantity > remaining[part['id']]:
+                result.update(status='error',
+                              error=f'Cannot return more than issued. Maximum returnable: {remaining[part["id"]]}.')
+            else:
+                cost_per_unit = part['avg_cost'] or 0
+                remaining[part['id']] -= quantity
+                returned[part['id']] = returned.get(part['id'], 0) + quantity
+                result.update(status='returned', description=part['description'], cost_per_unit=cost_per_unit)
+                transactions.append((wo_id, part['id'], quantity, user_id, line['notes'] or None, cost_per_unit))
+            results.append(result)
+
+        # One stock movement per part, revaluing MAP in the same statement
+        for part_id, quantity in returned.items():
+            return_stock(cursor, part_id, quantity, parts[part_id]['avg_cost'] or 0)
+
+        if transactions:
+            cursor.executemany('''
+                INSERT INTO work_order_parts (work_order_id, spare_part_id, quantity,
+                                              transaction_type, transacted_by, notes, cost_per_unit)
+                VALUES (?, ?, ?, 'return', ?, ?, ?)
+            ''', transactions)
 
         conn.commit()
-        flash(f'Successfully returned {quantity} units of "{sp_desc}".', 'success')
-    except Exception as e:
+    except Exception:
         conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    return results
+
+
+@work_orders_bp.route('/api/<int:wo_id>/goods-return', methods=['POST'])
+@login_required
+def api_goods_return(wo_id):
+    """API endpoint to return several issued spare parts from a work order at once"""
+    # Body: {"lines": [{"spare_part_id": 1, "quantity": 2}, ...]} (no quantity: all of that part) or {"all": true}
+    data = request.get_json(silent=True) or {}
+    lines = None
+    if not data.get('all'):
+        raw_lines = data.get('lines')
+        if not isinstance(raw_lines, list) or not raw_lines:
+            return jsonify({'error': 'lines must be a non-empty list, or set "all": true'}), 400
+
+        lines = []
+        for index, raw in enumerate(raw_lines):
+            try:
+                spare_part_id = int(raw.get('spare_part_id'))
+                quantity = raw.get('quantity')
+                quantity = None if quantity is None else int(quantity)
+            except (AttributeError, TypeError, ValueError):
+                return jsonify({'error': f'Line {index}: spare_part_id and quantity must be integers'}), 400
+            if quantity is not None and quantity <= 0:
+                return jsonify({'error': f'Line {index}: quantity must be a positive integer'}), 400
+            lines.append({'spare_part_id': spare_part_id, 'quantity': quantity,
+                          'notes': str(raw.get('notes') or '').strip()})
+
+    try:
+        results = bulk_return_parts(wo_id, lines, current_user.id)
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': f'Error returning parts: {str(e)}'}), 500
+
+    return jsonify({
+        'work_order_id': wo_id,
+        'returned_count': sum(1 for result in results if result['status'] == 'returned'),
+        'error_count': sum(1 for result in results if result['status'] == 'error'),
+        'lines': results
+    })
+
+
+def flash_return_results(results):
+    """Flash one summary message for a goods return form submission"""
+    returned = [result for result in results if result['status'] == 'returned']
+    errors = [result for result in results if result['status'] == 'error']
+    if len(returned) == 1 and not errors:
+        flash(f'Successfully returned {returned[0]["quantity"]} units of "{returned[0]["description"]}".', 'success')
+    elif returned:
+        flash(f'Successfully returned {sum(result["quantity"] for result in returned)} units '
+              f'across {len(returned)} parts.', 'success')
+    for result in errors:
+        flash(result['error'], 'error')
+    if not results:
+        flash('There are no issued parts left to return.', 'error')
+
+
+def return_parts_from_form(wo_id, lines, notes=''):
+    """Post a goods return form submission, flash the outcome and redirect"""
+    try:
+        results = bulk_return_parts(wo_id, lines, current_user.id, kit_notes=notes)
+        flash_return_results(results)
+    except LookupError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('work_orders.work_order_report'))
+    except ValueError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('work_orders.view_detail', wo_id=wo_id))
+    except Exception as e:
         flash(f'Error returning parts: {str(e)}', 'error')
 
-    conn.close()
     return redirect(url_for('work_orders.goods_issue', wo_id=wo_id))
+
+
+@work_orders_bp.route('/view/<int:wo_id>/goods-return', methods=['POST'])
+@login_required
+def goods_return_batch(wo_id):
+    """Return several spare parts (or the whole unused kit) from a work order"""
+    notes = request.form.get('notes', '').strip()
+    lines = None
+    if 'return_all' not in request.form:
+        lines = []
+        for key, value in request.form.items():
+            if not key.startswith('return_qty_') or not value.strip():
+                continue
+            part_id = key[len('return_qty_'):]
+            value = value.strip()
+            if not part_id.isdigit() or not value.isdigit() or int(value) <= 0:
+                flash('Please enter valid return quantities (positive integers).', 'error')
+                return redirect(url_for('work_orders.goods_issue', wo_id=wo_id))
+            lines.append({'spare_part_id': int(part_id), 'quantity': int(value), 'notes': notes})
+        if not lines:
+            flash('Enter a quantity for at least one part to return.', 'error')
+            return redirect(url_for('work_orders.goods_issue', wo_id=wo_id))
+    return return_parts_from_form(wo_id, lines, notes)
+
+
+@work_orders_bp.route('/view/<int:wo_id>/goods-return/<int:part_id>', methods=['POST'])
+@login_required
+def goods_return(wo_id, part_id):
+    """Return spare parts from work order back to inventory"""
+    quantity = request.form.get('quantity', '').strip()
+    notes = request.form.get('notes', '').strip()
+
+    if not quantity or not quantity.isdigit() or int(quantity) <= 0:
+        flash('Please enter a valid quantity (positive integer).', 'error')
+        return redirect(url_for('work_orders.goods_issue', wo_id=wo_id))
+
+    return return_parts_from_form(wo_id, [{'spare_part_id': part_id, 'quantity': int(quantity), 'notes': notes}])
@@ -0,0 +1,49 @@
+// Plant Maintenance App - Similar past work orders
+//
+// Fills a panel with past work orders on the same equipment whose title and
+// description resemble the current one, plus the parts those jobs used.
+
+function loadSimilarWorkOrders(container, url) {
+    const request = (container._similarRequest || 0) + 1;
+    container._similarRequest = request;
+
+    fetch(url)
+        .then(response => response.json())
+        .then(data => {
+            // Ignore responses that arrive after a newer request
+            if (request !== container._similarRequest) {
+                return;
+            }
+            renderSimilarWorkOrders(container, data);
+        });
+}
+
+function renderSimilarWorkOrders(container, data) {
+    const list = container.querySelector('.similar-list');
+    list.innerHTML = '';
+    const workOrders = data.work_orders || [];
+    container.style.display = workOrders.length ? 'block' : 'none';
+
+    workOrders.forEach(wo => {
+        const item = document.createElement('li');
+        const link = document.createElement('a');
+        link.href = wo.url;
+        link.target = '_blank';
+        link.textContent = wo.work_order_number + ' - ' + wo.title;
+        item.appendChild(link);
+
+        const detail = document.createElement('small');
+        const parts = wo.parts.map(p => p.quantity + ' x ' + p.description).join(', ');
+        detail.textContent = wo.status + ', ' + Math.round(wo.similarity * 100) + '% similar'
+            + (parts ? ' - parts: ' + parts : '');
+        item.appendChild(detail);
+        list.appendChild(item);
+    });
+
+    const summary = container.querySelector('.similar-parts');
+    const parts = data.parts_summary || [];
+    summary.textContent = parts.length
+        ? 'Parts used on these jobs: ' + parts.map(p =>
+            p.description + ' (' + p.work_order_count + ' job(s), ' + p.total_quantity + ' total)').join('; ')
+        : '';
+}
@@ -0,0 +1,145 @@
+// Plant Maintenance App - Typeahead selects
+//
+// A <select data-typeahead="/search/api/..."> is replaced on screen by a text box
+// that fetches matching options from the server as the user types. The select
+// stays in the form (hidden): picking a result adds it as the selected <option>,
+// with the result's data as data-* attributes, and fires "change" so page
+// scripts reading the select keep working.
+
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('select[data-typeahead]').forEach(initTypeahead);
+});
+
+function initTypeahead(select) {
+    const wrapper = document.createElement('div');
+    wrapper.className = 'typeahead';
+    const input = document.createElement('input');
+    input.type = 'text';
+    input.autocomplete = 'off';
+    input.placeholder = select.dataset.placeholder || 'Type to search...';
+    const list = document.createElement('ul');
+    list.className = 'typeahead-results';
+
+    select.parentNode.insertBefore(wrapper, select);
+    wrapper.appendChild(input);
+    wrapper.appendChild(list);
+    wrapper.appendChild(select);
+    select.style.display = 'none';
+    if (select.required) {
+        select.required = false;
+        input.required = true;
+    }
+
+    let results = [];
+    let active = -1;
+    let timer = null;
+    let request = 0;
+
+    function syncInput() {
+        input.value = select.value ? select.options[select.selectedIndex].text.trim() : '';
+    }
+
+    function close() {
+        list.innerHTML = '';
+        list.style.display = 'none';
+        results = [];
+        active = -1;
+    }
+
+    function render() {
+        list.innerHTML = '';
+        if (results.length === 0) {
+            list.style.display = 'none';
+            return;
+        }
+        results.forEach((result, index) => {
+            const item = document.createElement('li');
+            item.textContent = result.label;
+            if (result.detail) {
+                const detail = document.createElement('small');
+                detail.textContent = result.detail;
+                item.appendChild(detail);
+            }
+            if (index === active) {
+                item.className = 'active';
+            }
+            item.addEventListener('mousedown', function(e) {
+                e.preventDefault();
+                pick(result);
+            });
+            list.appendChild(item);
+        });
+        list.style.display = 'block';
+    }
+
+    function pick(result) {
+        let option = Array.from(select.options).find(o => o.value == result.id);
+        if (!option) {
+            option = document.createElement('option');
+            option.value = result.id;
+            select.appendChild(option);
+        }
+        option.textContent = result.label;
+        Object.entries(result.data || {}).forEach(([key, value]) => {
+            option.dataset[key] = value;
+        });
+        select.value = result.id;
+        close();
+        syncInput();
+        select.dispatchEvent(new Event('change'));
+    }
+
+    function search() {
+        const term = input.value.trim();
+        if (!term) {
+            close();
+            return;
+        }
+        const current = ++request;
+        const separator = select.dataset.typeahead.includes('?') ? '&' : '?';
+        fetch(select.dataset.typeahead + separator + 'q=' + encodeURIComponent(term))
+            .then(response => response.json())
+            .then(data => {
+                // Ignore responses that arrive after a newer keystroke
+                if (current !== request) {
+                    return;
+                }
+                results = data.results || [];
+                active = results.length ? 0 : -1;
+                render();
+            });
+    }
+
+    input.addEventListener('input', function() {
+        // Typing discards the previous pick until a new result is chosen
+        select.value = '';
+        clearTimeout(timer);
+        timer = setTimeout(search, 200);
+    });
+
+    input.addEventListener('keydown', function(e) {
+        if (e.key === 'ArrowDown' && results.length) {
+            e.preventDefault();
+            active = (active + 1) % results.length;
+            render();
+        } else if (e.key === 'ArrowUp' && results.length) {
+            e.preventDefault();
+            active = (active - 1 + results.length) % results.length;
+            render();
+        } else if (e.key === 'Enter' && active >= 0) {
+            e.preventDefault();
+            pick(results[active]);
+        } else if (e.key === 'Escape') {
+            close();
+        }
+    });
+
+    input.addEventListener('blur', function() {
+        close();
+        syncInput();
+    });
+
+    // Page scripts that reset the select dispatch "change" so the text box follows
+    select.addEventListener('change', syncInput);
+    syncInput();
+}
@@ -0,0 +1,31 @@
+"""Verify the parts cost rollup stored on work orders against work_order_parts.
+
+total_parts_cost, parts_count and parts_quantity on work_orders are maintained by
+triggers. This lists any work order whose stored values disagree with its parts
+transactions; run with --repair to correct them.
+
+Usage: python verify_parts_rollup.py [--repair]
+"""
+
+import sys
+from database.init_db import init_database, get_connection, verify_parts_rollup
+
+if __name__ == '__main__':
+    repair = '--repair' in sys.argv[1:]
+    init_database()
+    conn = get_connection()
+    cursor = conn.cursor()
+    mismatches = verify_parts_rollup(cursor, repair=repair)
+    conn.commit()
+    conn.close()
+
+    for m in mismatches:
+        print(f"  {m['work_order_number']}: cost {m['stored_cost']} -> {m['actual_cost']}, "
+              f"parts {m['stored_count']} -> {m['actual_count']}, "
+              f"quantity {m['stored_quantity']} -> {m['actual_quantity']}")
+    if not mismatches:
+        print('Parts rollup is consistent.')
+    elif repair:
+        print(f'\nRepaired {len(mismatches)} work order(s).')
+    else:
+        print(f'\n{len(mismatches)} work order(s) out of step. Run with --repair to fix.')